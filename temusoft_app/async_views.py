@@ -0,0 +1,155 @@
+from datetime import datetime
+from decimal import Decimal
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import APIException, Throttled
+from rest_framework.fields import DateTimeField
+from rest_framework.pagination import Cursor
+from rest_framework.request import Request
+
+from .authentication import CachedJWTAuthentication
+from .db_router import replica_reads
+from .mixins import is_super_admin
+from .models import Inventory, Product, User
+from .pagination import DefaultCursorPagination
+from .throttling import PlanRateThrottle
+
+# -----------------------------
+# LECTURAS ASYNC (ASGI)
+# -----------------------------
+# Vistas Django nativas async (no DRF, que es síncrono) para los GET más
+# pesados. Usan el ORM async, así que bajo ASGI un solo worker puede atender
+# muchos clientes lentos mientras espera a la base de datos. Devuelven los
+# mismos campos y la misma paginación (cursor) que los listados DRF.
+
+PRODUCT_FIELDS = ('id', 'sku', 'name', 'description', 'price', 'cost', 'category', 'updated_at', 'company_id')
+INVENTORY_FIELDS = ('id', 'stock', 'reorder_point', 'updated_at', 'product_id', 'branch_id')
+USER_FIELDS = ('id', 'username', 'email', 'role', 'rut', 'company_id', 'is_active', 'first_name', 'last_name')
+
+_authenticator = CachedJWTAuthentication()
+_datetime_field = DateTimeField()
+
+
+def _error_response(exc):
+    data = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+    response = JsonResponse(data, status=exc.status_code)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = '%d' % exc.wait  # como el exception handler de DRF
+    return response
+
+
+def async_jwt_required(view):
+    """
+    Autentica con el mismo JWT (y la misma caché de usuarios) que la API DRF
+    y aplica el mismo límite por plan (PlanRateThrottle, bucket 'read').
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            user = await _authenticator.aauthenticate(request)
+        except APIException as exc:
+            return _error_response(exc)
+        if user is None:
+            return JsonResponse({'detail': "Las credenciales de autenticación no se proveyeron."}, status=401)
+        request.user = user
+        throttle = PlanRateThrottle()
+        # el plan puede venir de la base de datos: se consulta fuera del event loop
+        if not await sync_to_async(throttle.allow_request)(request, None):
+            return _error_response(Throttled(throttle.wait()))
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def _rename(row):
+    """company_id -> company, etc., igual que los PrimaryKeyRelatedField de los serializers."""
+    return {key[:-3] if key.endswith('_id') and key != 'id' else key: value for key, value in row.items()}
+
+
+def _as_serializer(row):
+    """Decimales y fechas con el mismo formato que los serializers DRF."""
+    for field, value in row.items():
+        if isinstance(value, Decimal):
+            row[field] = str(value)
+        elif isinstance(value, datetime):
+            row[field] = _datetime_field.to_representation(value)
+    return _rename(row)
+
+
+async def _cursor_page(request, queryset, fields, transform):
+    """
+    Misma paginación que DefaultCursorPagination en la API DRF: respuesta
+    {next, previous, results}, ?cursor= (los mismos cursores opacos, ordenados
+    por id) y ?page_size=. Un cliente puede pasar de un listado al otro.
+    """
+    paginator = DefaultCursorPagination()
+    paginator.base_url = request.build_absolute_uri()
+    drf_request = Request(request)
+    try:
+        cursor = paginator.decode_cursor(drf_request)
+        position = int(cursor.position) if cursor and cursor.position is not None else None
+    except (APIException, ValueError):
+        return JsonResponse({'detail': paginator.invalid_cursor_message}, status=404)
+    reverse = bool(cursor and cursor.reverse)
+    page_size = paginator.get_page_size(drf_request)
+
+    if position is not None:
+        queryset = queryset.filter(pk__lt=position) if reverse else queryset.filter(pk__gt=position)
+    queryset = queryset.order_by('-pk' if reverse else 'pk').values(*fields)[:page_size + 1]
+    results = [transform(row) async for row in queryset]
+    has_more = len(results) > page_size
+    results = results[:page_size]
+    if reverse:
+        results.reverse()
+    first = results[0]['id'] if results else position
+    last = results[-1]['id'] if results else position
+    # igual que DRF: hacia adelante hay página anterior si se partió de un
+    # cursor; hacia atrás, siempre hay siguiente
+    has_next, has_previous = (position is not None, has_more) if reverse else (has_more, position is not None)
+    return JsonResponse({
+        'next': paginator.encode_cursor(Cursor(offset=0, reverse=False, position=last)) if has_next else None,
+        'previous': paginator.encode_cursor(Cursor(offset=0, reverse=True, position=first)) if has_previous else None,
+        'results': results,
+    })
+
+
+def _scope(user, queryset, tenant_field):
+    if is_super_admin(user):
+        return queryset
+    if not user.company_id:
+        return queryset.none()
+    return queryset.filter(**{tenant_field: user.company_id})
+
+
+@require_GET
+@async_jwt_required
+@replica_reads
+async def products(request):
+    """GET /api/async/products/?cursor=&page_size= — catálogo de la company (como GET /api/products/)."""
+    queryset = _scope(request.user, Product.objects.all(), 'company_id')
+    return await _cursor_page(request, queryset, PRODUCT_FIELDS, _as_serializer)
+
+
+@require_GET
+@async_jwt_required
+@replica_reads
+async def inventory(request):
+    """GET /api/async/inventory/?branch=<id>&cursor=&page_size= — inventario (como GET /api/inventory/)."""
+    queryset = _scope(request.user, Inventory.objects.all(), 'branch__company_id')
+    branch = request.GET.get('branch')
+    if branch:
+        if not branch.isdigit():
+            return JsonResponse({'branch': ["Debe ser un id numérico."]}, status=400)
+        queryset = queryset.filter(branch_id=branch)
+    return await _cursor_page(request, queryset, INVENTORY_FIELDS, _as_serializer)
+
+
+@require_GET
+@async_jwt_required
+async def me(request):
+    """GET /api/async/users/me/ — mismo contenido que /api/users/me/."""
+    # el usuario de la caché de autenticación solo trae los campos de permisos
+    row = await User.objects.filter(pk=request.user.pk).values(*USER_FIELDS).aget()
+    return JsonResponse(_rename(row))
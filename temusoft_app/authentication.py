@@ -0,0 +1,81 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import auth_user_cache, auth_user_key
+
+
+# Lo único que se guarda del usuario: lo que leen los permisos y el scoping
+# por company. Ni el hash de la contraseña ni datos personales pasan por la caché.
+CACHED_USER_FIELDS = ('role', 'company_id', 'is_active', 'is_superuser')
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que guarda en caché, por AUTH_USER_CACHE_TIMEOUT
+    segundos, los campos de CACHED_USER_FIELDS del usuario resuelto, así el
+    camino normal de un request no hace el SELECT del usuario. En un acierto
+    se arma un User con solo esos campos cargados; el resto se lee de la base
+    al primer acceso (campos diferidos).
+
+    La primera resolución pasa por SimpleJWT (existencia, is_active y, si
+    CHECK_REVOKE_TOKEN está activo, la revocación por cambio de contraseña).
+    La entrada se borra al guardar o eliminar el User (signals.py): un cambio
+    de contraseña, rol o is_active se aplica de inmediato en el proceso que lo
+    hizo y, como máximo, tras AUTH_USER_CACHE_TIMEOUT en los demás (con una
+    caché compartida, de inmediato en todos). En cada acierto se vuelve a
+    comprobar is_active.
+    """
+
+    def get_user(self, validated_token):
+        key = auth_user_key(self.get_user_id(validated_token))
+        entry = auth_user_cache().get(key)
+        if entry is None:
+            user = super().get_user(validated_token)
+            auth_user_cache().set(key, self.cache_entry(user), timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+            return user
+        return self.user_from_entry(entry)
+
+    async def aauthenticate(self, request):
+        """
+        Versión async para las vistas nativas de async_views.py (fuera de DRF).
+        Devuelve el usuario o None si no viene token; lanza las mismas
+        excepciones que authenticate() si el token o el usuario no son válidos.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        key = auth_user_key(self.get_user_id(validated_token))
+        entry = await auth_user_cache().aget(key)
+        if entry is None:
+            user = await sync_to_async(super().get_user)(validated_token)
+            await auth_user_cache().aset(key, self.cache_entry(user), timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+            return user
+        return self.user_from_entry(entry)
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def cache_entry(self, user):
+        return {field: getattr(user, field) for field in (api_settings.USER_ID_FIELD, *CACHED_USER_FIELDS)}
+
+    def user_from_entry(self, entry):
+        if api_settings.CHECK_USER_IS_ACTIVE and not entry['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        # from_db espera los valores en el orden de los campos del modelo
+        fields = [field.attname for field in self.user_model._meta.concrete_fields if field.attname in entry]
+        return self.user_model.from_db(
+            router.db_for_read(self.user_model), fields, [entry[field] for field in fields],
+        )
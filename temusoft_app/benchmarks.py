@@ -0,0 +1,157 @@
+import asyncio
+import itertools
+import threading
+import time
+
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+
+# -----------------------------
+# BENCHMARKS HTTP EN PROCESO
+# -----------------------------
+# Los requests pasan por toda la pila de Django (middlewares, auth, vistas,
+# ORM) usando el cliente de pruebas, sin servidor ni red de por medio: mide
+# el costo de la aplicación y de la base de datos, no el del servidor HTTP.
+# Los clientes usan el host 'testserver'; quien llama debe permitirlo en
+# ALLOWED_HOSTS (ver bench_read_path).
+
+
+def percentile(samples, pct):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not samples:
+        return 0.0
+    index = max(0, min(len(samples) - 1, round(pct / 100 * len(samples)) - 1))
+    return samples[index]
+
+
+def summarize(latencies, elapsed, statuses):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'statuses': {str(code): statuses.count(code) for code in sorted(set(statuses))},
+    }
+
+
+def run_threaded(path, headers, requests, concurrency):
+    """
+    `requests` GET a `path` por la pila síncrona (WSGIHandler del cliente de
+    pruebas) desde `concurrency` hilos. No hay un servidor WSGI de por medio
+    (gunicorn, uWSGI): mide la vista DRF bajo concurrencia de hilos.
+    """
+    counter = itertools.count()
+    results = []
+
+    def worker():
+        client = Client()
+        try:
+            while next(counter) < requests:
+                start = time.perf_counter()
+                response = client.get(path, headers=headers)
+                results.append((time.perf_counter() - start, response.status_code))
+        finally:
+            # cada hilo abrió su propia conexión a la base
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return summarize([r[0] for r in results], elapsed, [r[1] for r in results])
+
+
+def run_async(path, headers, requests, concurrency):
+    """
+    `requests` GET a `path` por la pila async (ASGIHandler del cliente de
+    pruebas) con `concurrency` tareas a la vez en un solo event loop. Tampoco
+    hay servidor ASGI (uvicorn, daphne) de por medio.
+    """
+    async def main():
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                return time.perf_counter() - start, response.status_code
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(requests)))
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(main())
+    return summarize([r[0] for r in results], elapsed, [r[1] for r in results])
+
+
+class QueryCounter:
+    """execute_wrapper que solo cuenta (sin registrar el SQL, a diferencia de CaptureQueriesContext)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_scenario(client, method, path, headers=None, data=None, repeat=100, warmup=5):
+    """
+    Ejecuta `repeat` requests secuenciales (más `warmup` que no se miden) y
+    devuelve latencias, consultas por request y tamaño de respuesta.
+    """
+    send = getattr(client, method.lower())
+    kwargs = {'headers': headers or {}}
+    if data is not None:
+        kwargs.update(data=data, content_type='application/json')
+    for _ in range(warmup):
+        send(path, **kwargs)
+
+    latencies, statuses, queries, sizes = [], [], [], []
+    for _ in range(repeat):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            response = send(path, **kwargs)
+            latencies.append(time.perf_counter() - start)
+        statuses.append(response.status_code)
+        queries.append(counter.count)
+        sizes.append(len(response.content))
+    elapsed = sum(latencies)
+    stats = summarize(latencies, elapsed, statuses)
+    stats.update({
+        'queries_min': min(queries),
+        'queries_max': max(queries),
+        'queries_mean': round(sum(queries) / len(queries), 2),
+        'bytes_mean': round(sum(sizes) / len(sizes)),
+    })
+    return stats
+
+
+def compare(baseline, current, tolerance):
+    """
+    Compara dos resultados de benchmark_api escenario por escenario. Marca
+    regresión si p95 empeora más de `tolerance` (fracción) o si sube el
+    máximo de consultas.
+    """
+    rows = []
+    for name, stats in current['scenarios'].items():
+        old = baseline.get('scenarios', {}).get(name)
+        if old is None:
+            continue
+        p95_delta = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] else 0.0
+        rows.append({
+            'scenario': name,
+            'p95_ms': (old['p95_ms'], stats['p95_ms']),
+            'p95_delta': round(p95_delta, 3),
+            'queries_max': (old['queries_max'], stats['queries_max']),
+            'regression': p95_delta > tolerance or stats['queries_max'] > old['queries_max'],
+        })
+    return rows
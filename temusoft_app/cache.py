@@ -0,0 +1,89 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+# -----------------------------
+# CACHÉ DEL CATÁLOGO
+# -----------------------------
+# Cada company tiene un número de versión de catálogo guardado en la misma
+# caché. Las respuestas serializadas se guardan bajo una clave que incluye esa
+# versión, así que invalidar es solo incrementar la versión: las entradas
+# viejas dejan de leerse y la caché las expulsa por LRU (LocMemCache con
+# MAX_ENTRIES, o la política de memoria del backend compartido).
+
+
+def catalog_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def _version_key(company_id):
+    return f'catalog:version:{company_id}'
+
+
+def catalog_version(company_id):
+    """
+    Versión actual del catálogo de la company. Si la clave no existe (primera
+    lectura o fue expulsada) se inicializa con un valor nuevo basado en el
+    reloj, para no volver a servir respuestas de una versión anterior.
+    """
+    cache = catalog_cache()
+    key = _version_key(company_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_catalog_version(company_id):
+    """Invalida el catálogo cacheado de la company."""
+    cache = catalog_cache()
+    try:
+        cache.incr(_version_key(company_id))
+    except ValueError:
+        cache.set(_version_key(company_id), time.time_ns(), timeout=None)
+
+
+def catalog_key(company_id, variant):
+    """
+    Clave de una respuesta cacheada. `variant` distingue páginas y parámetros
+    (por ejemplo la URL completa del request).
+    """
+    digest = hashlib.md5(variant.encode('utf-8')).hexdigest()
+    return f'catalog:{company_id}:{catalog_version(company_id)}:{digest}'
+
+
+# -----------------------------
+# CACHÉ DE USUARIOS AUTENTICADOS
+# -----------------------------
+def auth_user_cache():
+    return caches[settings.AUTH_USER_CACHE_ALIAS]
+
+
+def auth_user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def invalidate_auth_user(user_id):
+    auth_user_cache().delete(auth_user_key(user_id))
+
+
+# -----------------------------
+# PLAN DE SUSCRIPCIÓN Y THROTTLING
+# -----------------------------
+def plan_cache():
+    return caches[settings.PLAN_CACHE_ALIAS]
+
+
+def plan_key(company_id):
+    return f'plan:company:{company_id}'
+
+
+def invalidate_company_plan(company_id):
+    plan_cache().delete(plan_key(company_id))
+
+
+def throttle_cache():
+    return caches[settings.THROTTLE_CACHE_ALIAS]
@@ -0,0 +1,80 @@
+from django.db import migrations
+
+# -----------------------------
+# OPERACIONES DE MIGRACIÓN SIN BLOQUEOS LARGOS
+# -----------------------------
+# En PostgreSQL crean los índices con CONCURRENTLY (la migración debe declarar
+# atomic = False). En otros motores (SQLite en desarrollo/tests) se comportan
+# como AddIndex / AddConstraint normales.
+#
+# Un CREATE INDEX CONCURRENTLY que falla (duplicados, deadlock, cancelación)
+# deja el índice creado pero INVALID. Por eso, antes de construirlo, se borra
+# un índice inválido con el mismo nombre y se reutiliza uno válido: volver a
+# correr migrate después de una falla termina el trabajo.
+
+
+def _is_postgres(schema_editor):
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+def _index_is_valid(schema_editor, name):
+    """True/False según pg_index.indisvalid, o None si el índice no existe."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)', [name])
+        row = cursor.fetchone()
+    return None if row is None else row[0]
+
+
+def _prepare_index(schema_editor, name):
+    """Borra un índice inválido que dejó un intento anterior; devuelve True si ya hay uno válido."""
+    valid = _index_is_valid(schema_editor, name)
+    if valid is False:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(name)}')
+    return bool(valid)
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgres(schema_editor):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model) and not _prepare_index(
+            schema_editor, self.index.name,
+        ):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgres(schema_editor):
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class AddUniqueConstraintConcurrently(migrations.AddConstraint):
+    """
+    UniqueConstraint sobre columnas simples: CREATE UNIQUE INDEX CONCURRENTLY
+    y luego ADD CONSTRAINT ... USING INDEX, que solo toma un lock breve.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgres(schema_editor):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        quote = schema_editor.quote_name
+        table = quote(model._meta.db_table)
+        name = quote(self.constraint.name)
+        columns = ', '.join(quote(model._meta.get_field(field).column) for field in self.constraint.fields)
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT 1 FROM pg_constraint WHERE conname = %s AND conrelid = to_regclass(%s)',
+                [self.constraint.name, model._meta.db_table],
+            )
+            if cursor.fetchone():
+                return  # un intento anterior alcanzó a adjuntarla
+        if not _prepare_index(schema_editor, self.constraint.name):
+            schema_editor.execute(f'CREATE UNIQUE INDEX CONCURRENTLY {name} ON {table} ({columns})')
+        schema_editor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}')
@@ -0,0 +1,106 @@
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# -----------------------------
+# RÉPLICAS DE LECTURA
+# -----------------------------
+# Las lecturas van a una réplica (settings.REPLICA_DATABASES) solo dentro de
+# una vista que lo pide (mixins.ReplicaReadMixin o el decorador
+# replica_reads) y solo si la request no está "fijada" al primario. Queda
+# fijada si escribe algo (db_for_write) o si trae la cookie que deja
+# middleware.ReplicaPinningMiddleware después de una escritura, así el cliente
+# lee lo que acaba de escribir mientras la réplica se pone al día. El estado
+# vive en contextvars: es por request tanto en hilos (WSGI) como en tareas
+# async (ASGI), y sync_to_async lo propaga al hilo del ORM.
+
+_replica_reads = ContextVar('replica_reads', default=False)
+# False, 'cookie' (escritura en una request anterior) o 'write' (en esta)
+_primary_pinned = ContextVar('primary_pinned', default=False)
+
+
+def replica_aliases():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def start_replica_reads():
+    """Habilita las lecturas desde réplicas; devuelve el token para end_replica_reads()."""
+    return _replica_reads.set(True)
+
+
+def end_replica_reads(token):
+    _replica_reads.reset(token)
+
+
+def pin_primary():
+    """Manda el resto de las lecturas de la request al primario."""
+    _primary_pinned.set('write')
+
+
+def start_request(pinned=False):
+    """Estado inicial de una request (ver ReplicaPinningMiddleware); devuelve el token."""
+    return _primary_pinned.set('cookie' if pinned else False)
+
+
+def end_request(token):
+    """Devuelve si la request escribió en la base de datos y restaura el estado anterior."""
+    wrote = _primary_pinned.get() == 'write'
+    _primary_pinned.reset(token)
+    return wrote
+
+
+def replica_reads(view):
+    """Opt-in de una vista función (sync o async) a leer desde réplicas."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            token = start_replica_reads()
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                end_replica_reads(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = start_replica_reads()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            end_replica_reads(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    - db_for_read: una réplica al azar si la vista lo pidió y la request no
+      está fijada; si no, el primario.
+    - db_for_write: siempre el primario, y fija la request (las lecturas
+      posteriores ven lo escrito).
+    - Las réplicas no se migran: son copias del primario.
+    """
+
+    def db_for_read(self, model, **hints):
+        aliases = replica_aliases()
+        if aliases and _replica_reads.get() and not _primary_pinned.get():
+            return random.choice(aliases)
+        return None
+
+    def db_for_write(self, model, **hints):
+        pin_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
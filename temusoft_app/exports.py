@@ -0,0 +1,106 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+# -----------------------------
+# EXPORTACIÓN EN STREAMING
+# -----------------------------
+# Las exportaciones recorren la base de datos con iterator(chunk_size=...)
+# (cursor del lado del servidor en PostgreSQL) y van escribiendo cada fila a
+# la respuesta, así que la memoria del worker no depende del tamaño del
+# archivo. Cada fila es una línea de venta/compra ya "aplanada".
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+SALE_COLUMNS = (
+    ('sale_id', 'sale_id'),
+    ('created_at', 'created_at'),
+    ('branch_id', 'branch_id'),
+    ('user_id', 'sale__user_id'),
+    ('payment_method', 'sale__payment_method'),
+    ('sale_total', 'sale__total'),
+    ('voided_at', 'sale__voided_at'),
+    ('product_id', 'product_id'),
+    ('sku', 'sku'),
+    ('qty', 'quantity'),
+    ('price', 'unit_price'),
+    ('cost', 'unit_cost'),
+)
+
+PURCHASE_COLUMNS = (
+    ('purchase_id', 'purchase_id'),
+    ('date', 'purchase__date'),
+    ('supplier_id', 'purchase__supplier_id'),
+    ('supplier_name', 'purchase__supplier__name'),
+    ('product_id', 'product_id'),
+    ('sku', 'sku'),
+    ('qty', 'quantity'),
+    ('price', 'unit_cost'),
+)
+
+
+class Echo:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, value):
+        return value
+
+
+def _plain(value):
+    if hasattr(value, 'tzinfo') and value.tzinfo is not None:
+        return timezone.localtime(value).isoformat()
+    return value
+
+
+def date_bounds(date_from, date_to):
+    """Límites [lower, upper) en hora local para un rango de días (cualquiera puede ser None)."""
+    lower = timezone.make_aware(datetime.combine(date_from, time.min)) if date_from else None
+    upper = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min)) if date_to else None
+    return lower, upper
+
+
+def filter_export_lines(lines, lower=None, upper=None, **filters):
+    """Aplica el rango de fechas y los filtros opcionales (los None se ignoran) a las líneas."""
+    if lower:
+        lines = lines.filter(created_at__gte=lower)
+    if upper:
+        lines = lines.filter(created_at__lt=upper)
+    lines = lines.filter(**{field: value for field, value in filters.items() if value})
+    return lines.order_by('created_at', 'id')
+
+
+def iter_rows(queryset, columns):
+    """Filas como tuplas, leídas en bloques con un cursor del servidor."""
+    lookups = [lookup for _, lookup in columns]
+    for row in queryset.values_list(*lookups).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield tuple(_plain(value) for value in row)
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in columns])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(columns, rows):
+    names = [name for name, _ in columns]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def export_response(queryset, columns, output, filename):
+    """StreamingHttpResponse en CSV o NDJSON para el queryset de líneas."""
+    # el cuerpo se genera después de que la vista retorna: se fija ya la base
+    # de datos que eligió el router (réplica, si la vista lee de réplicas)
+    rows = iter_rows(queryset.using(queryset.db), columns)
+    if output == 'ndjson':
+        response = StreamingHttpResponse(stream_ndjson(columns, rows), content_type='application/x-ndjson')
+    else:
+        response = StreamingHttpResponse(stream_csv(columns, rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{output}"'
+    return response
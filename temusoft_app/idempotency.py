@@ -0,0 +1,120 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+# -----------------------------
+# IDEMPOTENCY-KEY EN LOS POST
+# -----------------------------
+# Una caja con conexión inestable reintenta el mismo POST con el mismo header
+# Idempotency-Key. La clave (por usuario) se inserta en la misma transacción
+# que procesa la request y guarda su respuesta, así que solo se confirma junto
+# con los datos que creó. Un reintento simultáneo queda esperando en el INSERT
+# (restricción única) hasta que esa transacción termina: si se confirmó,
+# recibe la respuesta guardada tal cual, sin volver a validar ni escribir; si
+# se deshizo (error, o el worker murió y la base de datos cerró la
+# transacción), procesa él. Nunca hay dos requests procesando la misma clave.
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(request):
+    payload = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(f'{request.method}\n{request.path}\n{payload}'.encode('utf-8')).hexdigest()
+
+
+def _error(detail, status_code):
+    return Response({'detail': detail}, status=status_code)
+
+
+def claim_key(user, key, fingerprint):
+    """
+    Inserta la clave para esta request; se llama dentro de la transacción que
+    la procesa (ver run_idempotent). Devuelve (fila, None) si hay que
+    procesarla, o (None, respuesta) con la respuesta guardada (replay) o 422
+    si la clave ya se usó con otro cuerpo.
+    """
+    now = timezone.now()
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user, key=key, request_hash=fingerprint, locked_at=now,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                ), None
+        except IntegrityError:
+            pass
+
+        existing = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if existing is None:
+            continue  # la transacción que la tenía se deshizo
+        if existing.expires_at <= now:
+            IdempotencyKey.objects.filter(pk=existing.pk, expires_at__lte=now).delete()
+            continue
+        if existing.request_hash != fingerprint:
+            return None, _error(
+                f"La {HEADER} ya se usó con otra solicitud.", status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if existing.status_code is not None:
+            return None, Response(
+                existing.response_body, status=existing.status_code, headers={'Idempotent-Replayed': 'true'},
+            )
+        # sin respuesta: la insertó una versión anterior, que confirmaba la
+        # clave antes de procesar; no se retoma, vence con la clave
+        break
+    return None, _error(f"Hay una solicitud con la misma {HEADER} en proceso; reintenta más tarde.",
+                        status.HTTP_409_CONFLICT)
+
+
+def run_idempotent(request, handler):
+    """Ejecuta `handler()` (que devuelve un Response) respetando el header Idempotency-Key."""
+    key = request.headers.get(HEADER, '').strip()
+    if not key:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValidationError({HEADER: [f"Máximo {MAX_KEY_LENGTH} caracteres."]})
+
+    # si handler() lanza una excepción, la clave se deshace con todo lo demás
+    with transaction.atomic():
+        record, response = claim_key(request.user, key, request_fingerprint(request))
+        if response is not None:
+            return response
+        response = handler()
+        if status.is_success(response.status_code):
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=response.status_code, response_body=response.data,
+            )
+        else:
+            # los errores no se guardan: el cliente puede corregir y reintentar
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+        return response
+
+
+def idempotent(view_method):
+    """Decorador para métodos de viewset (create o acciones POST)."""
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        return run_idempotent(request, lambda: view_method(self, request, *args, **kwargs))
+    return wrapper
+
+
+def purge_expired(chunk_size=5000):
+    """Borra las claves vencidas en bloques (índice por expires_at); devuelve cuántas."""
+    now = timezone.now()
+    deleted = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,197 @@
+import csv
+import io
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .cache import bump_catalog_version
+from .models import Branch, Company, Inventory, Product
+from .services import record_initial_stock
+
+# -----------------------------
+# IMPORTACIÓN MASIVA DE PRODUCTOS
+# -----------------------------
+# Las filas se leen en streaming (CSV o NDJSON), se validan por bloques sin
+# consultas y cada bloque se escribe con un bulk_create(update_conflicts=True)
+# sobre (company, sku): los SKU existentes se actualizan y los nuevos se crean.
+# Luego se crea el Inventory que falte de cada producto en cada sucursal, con
+# su movimiento 'initial' en el libro (el stock de filas existentes no se toca).
+# Si el archivo no se puede leer a mitad de camino, los bloques anteriores ya
+# quedaron confirmados: el reporte lo indica en `error`.
+
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_FORMATS = ('csv', 'ndjson', 'json')
+MAX_INT = 2 ** 31 - 1  # IntegerField
+UPDATE_FIELDS = ['name', 'description', 'price', 'cost', 'category', 'updated_at']
+
+
+def read_rows(fileobj, fmt):
+    """Itera las filas (dicts) de un archivo binario o de texto sin cargarlo entero."""
+    if fmt == 'json':
+        # un arreglo JSON no se puede leer por partes: se carga completo
+        yield from json.load(fileobj)
+        return
+    if isinstance(fileobj.read(0), bytes):
+        fileobj = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        yield from csv.DictReader(fileobj)
+        return
+    for line in fileobj:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _decimal(value, name, errors):
+    try:
+        number = Decimal(str(value).strip())
+    except (InvalidOperation, TypeError):
+        errors[name] = ["Debe ser un número."]
+        return None
+    if not number.is_finite() or number < 0:
+        errors[name] = ["Debe ser un número mayor o igual a 0."]
+        return None
+    if number.as_tuple().exponent < -2 or abs(number) >= Decimal('1e10'):
+        errors[name] = ["Máximo 10 dígitos enteros y 2 decimales."]
+        return None
+    return number
+
+
+def _int(value, name, errors):
+    if value in (None, ''):
+        return 0
+    try:
+        number = Decimal(str(value).strip())
+    except (InvalidOperation, TypeError):
+        errors[name] = ["Debe ser un número entero."]
+        return None
+    # 2.7 no se trunca a 2: es un error de la fila
+    if not number.is_finite() or number != number.to_integral_value():
+        errors[name] = ["Debe ser un número entero."]
+        return None
+    if number < 0 or number > MAX_INT:
+        errors[name] = [f"Debe ser un entero entre 0 y {MAX_INT}."]
+        return None
+    return int(number)
+
+
+def validate_row(row):
+    """Devuelve (datos, errores) para una fila; no hace consultas."""
+    if not isinstance(row, dict):
+        return None, {'non_field_errors': ["Se espera un objeto."]}
+    errors = {}
+    sku = str(row.get('sku') or '').strip()
+    name = str(row.get('name') or '').strip()
+    if not sku:
+        errors['sku'] = ["Este campo es requerido."]
+    elif len(sku) > 100:
+        errors['sku'] = ["Máximo 100 caracteres."]
+    if not name:
+        errors['name'] = ["Este campo es requerido."]
+    elif len(name) > 200:
+        errors['name'] = ["Máximo 200 caracteres."]
+    category = str(row.get('category') or '').strip()
+    if len(category) > 100:
+        errors['category'] = ["Máximo 100 caracteres."]
+    data = {
+        'sku': sku,
+        'name': name,
+        'description': str(row.get('description') or ''),
+        'category': category,
+        'price': _decimal(row.get('price'), 'price', errors),
+        'cost': _decimal(row.get('cost'), 'cost', errors),
+        'stock': _int(row.get('stock'), 'stock', errors),
+        'reorder_point': _int(row.get('reorder_point'), 'reorder_point', errors),
+    }
+    return (None, errors) if errors else (data, None)
+
+
+def _import_chunk(company_id, branch_ids, chunk, report):
+    valid = {}
+    for number, row in chunk:
+        data, errors = validate_row(row)
+        if errors:
+            report['errors'].append({'row': number, 'errors': errors})
+        else:
+            # si un SKU se repite en el archivo gana la última fila
+            valid[data['sku']] = data
+    if not valid:
+        return
+
+    with transaction.atomic():
+        # las importaciones de una misma company se serializan bloque a bloque:
+        # los productos e inventarios leídos aquí no cambian por otra
+        # importación antes del upsert, así created/updated y los movimientos
+        # iniciales salen exactos
+        list(Company.objects.select_for_update().filter(pk=company_id).values_list('pk'))
+        existing = set(
+            Product.objects.filter(company_id=company_id, sku__in=valid.keys()).values_list('sku', flat=True)
+        )
+        Product.objects.bulk_create(
+            [
+                Product(company_id=company_id, **{k: v for k, v in data.items() if k not in ('stock', 'reorder_point')})
+                for data in valid.values()
+            ],
+            update_conflicts=True,
+            unique_fields=['company', 'sku'],
+            update_fields=UPDATE_FIELDS,
+        )
+        ids = dict(Product.objects.filter(company_id=company_id, sku__in=valid.keys()).values_list('sku', 'pk'))
+        present = set(
+            Inventory.objects.filter(product_id__in=ids.values()).values_list('product_id', 'branch_id')
+        )
+        # productos nuevos, o existentes en sucursales que aún no los tenían
+        created = [
+            Inventory(product_id=ids[sku], branch_id=branch_id, stock=data['stock'], reorder_point=data['reorder_point'])
+            for sku, data in valid.items()
+            for branch_id in branch_ids
+            if (ids[sku], branch_id) not in present
+        ]
+        Inventory.objects.bulk_create(created, ignore_conflicts=True, batch_size=IMPORT_CHUNK_SIZE)
+        record_initial_stock(created)
+    report['created'] += len(valid.keys() - existing)
+    report['updated'] += len(valid.keys() & existing)
+
+
+def import_products(company_id, rows, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    Importa productos de la company desde un iterable de dicts
+    {sku, name, description?, price, cost, category?, stock?, reorder_point?}.
+
+    Cada bloque se confirma por separado, así que un error en una fila solo
+    la descarta a ella. Devuelve un reporte con los errores por número de fila
+    (empezando en 1) y el rendimiento obtenido. Si `rows` falla al leer
+    (archivo mal formado) se importa lo leído hasta ahí y el reporte trae el
+    motivo en `error`. `progress(procesadas)`, si se pasa, se llama después de
+    cada bloque.
+    """
+    started = time.monotonic()
+    report = {'processed': 0, 'created': 0, 'updated': 0, 'errors': []}
+    branch_ids = list(Branch.objects.filter(company_id=company_id).values_list('pk', flat=True))
+
+    chunk = []
+    read = 0
+    try:
+        for read, row in enumerate(rows, start=1):
+            chunk.append((read, row))
+            if len(chunk) >= chunk_size:
+                _import_chunk(company_id, branch_ids, chunk, report)
+                report['processed'] += len(chunk)
+                chunk = []
+                if progress:
+                    progress(report['processed'])
+    except (ValueError, csv.Error) as exc:
+        report['error'] = f"No se pudo leer el archivo después de la fila {read}: {exc}"
+    if chunk:
+        _import_chunk(company_id, branch_ids, chunk, report)
+        report['processed'] += len(chunk)
+        if progress:
+            progress(report['processed'])
+
+    # bulk_create no dispara post_save: se invalida el catálogo explícitamente
+    transaction.on_commit(lambda: bump_catalog_version(company_id))
+    elapsed = time.monotonic() - started
+    report['seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(report['processed'] / elapsed) if elapsed else report['processed']
+    return report
@@ -0,0 +1,334 @@
+import io
+import json
+import os
+import traceback
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connections
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from .audit import AUDIT_CHUNK_SIZE, AUDIT_WORKERS, run_audit
+from .exports import (
+    EXPORT_CHUNK_SIZE, PURCHASE_COLUMNS, SALE_COLUMNS, date_bounds, filter_export_lines, iter_rows, stream_csv,
+    stream_ndjson,
+)
+from .imports import import_products, read_rows
+from .mixins import is_super_admin
+from .models import Job, PurchaseLine, SaleLine
+from .permissions import IsManagerOrAbove, IsSuperAdmin, IsSuperAdminOrAdminCliente
+from .serializers import (
+    AuditJobParamsSerializer, ProductImportJobParamsSerializer, PurchaseExportJobParamsSerializer,
+    SaleExportJobParamsSerializer, SalesRollupJobParamsSerializer,
+)
+
+# -----------------------------
+# TRABAJOS EN SEGUNDO PLANO
+# -----------------------------
+# La cola es la tabla Job: la API inserta filas 'queued' y manage.py
+# run_workers las toma con un UPDATE condicional (status='queued' -> 'running'),
+# así dos workers nunca ejecutan el mismo trabajo, sin broker externo. Cada
+# tipo de trabajo se registra con @register: su handler recibe un JobContext y
+# los params ya validados, y devuelve el resultado (JSON). Los archivos que
+# genera quedan en settings.JOB_FILES_DIR y se descargan por
+# /api/jobs/{id}/result/. La company del trabajo se toma del usuario que lo
+# encoló (Job.company), nunca de los params.
+
+JobType = namedtuple('JobType', 'name handler params_serializer permission max_attempts')
+REGISTRY = {}
+
+
+def register(name, params_serializer, permission=IsManagerOrAbove, max_attempts=3):
+    """Registra un handler `handler(ctx, **params)` como tipo de trabajo `name`."""
+    def decorator(handler):
+        REGISTRY[name] = JobType(name, handler, params_serializer, permission, max_attempts)
+        return handler
+    return decorator
+
+
+class JobCancelled(Exception):
+    """La lanza JobContext.progress() cuando se pidió cancelar el trabajo."""
+
+
+class JobContext:
+    def __init__(self, job):
+        self.job = job
+        self.result_file = ''
+
+    def progress(self, percent=None, message=''):
+        """
+        Informa el avance (0-100, None para no cambiarlo) y renueva el
+        heartbeat. Es también el punto de cancelación: si se pidió cancelar,
+        lanza JobCancelled.
+        """
+        fields = {'heartbeat_at': timezone.now(), 'progress_message': message[:200]}
+        if percent is not None:
+            fields['progress'] = max(0, min(100, int(percent)))
+        if not Job.objects.filter(pk=self.job.pk, status='running', cancel_requested=False).update(**fields):
+            raise JobCancelled()
+
+    def file_path(self, extension):
+        """Ruta del archivo de resultado del trabajo (uno por trabajo)."""
+        os.makedirs(settings.JOB_FILES_DIR, exist_ok=True)
+        self.result_file = f'job-{self.job.pk}.{extension}'
+        return os.path.join(settings.JOB_FILES_DIR, self.result_file)
+
+
+# -------------------------
+# Encolar y cancelar (API)
+# -------------------------
+def save_upload(upload, extension):
+    """Guarda un archivo subido en JOB_FILES_DIR para que lo lea el worker; devuelve su nombre."""
+    os.makedirs(settings.JOB_FILES_DIR, exist_ok=True)
+    name = f'upload-{uuid.uuid4().hex}.{extension}'
+    with open(os.path.join(settings.JOB_FILES_DIR, name), 'wb') as fh:
+        for chunk in upload.chunks():
+            fh.write(chunk)
+    return name
+
+
+def enqueue(kind, params, user=None, company_id=None):
+    return Job.objects.create(
+        kind=kind, params=params, user=user, company_id=company_id, max_attempts=REGISTRY[kind].max_attempts,
+    )
+
+
+def submit_job(request, kind, params, view=None, **context):
+    """
+    Valida un trabajo pedido por la API (tipo, permiso del tipo y params) y lo
+    encola a nombre del usuario y su company. `context` llega al serializer de
+    params: datos que el cliente no puede fijar (el archivo ya subido).
+    """
+    job_type = REGISTRY.get(kind)
+    if job_type is None:
+        raise ValidationError({'kind': [f"Valores permitidos: {', '.join(sorted(REGISTRY))}."]})
+    user = request.user
+    if not job_type.permission().has_permission(request, view):
+        raise PermissionDenied("No tienes permiso para este tipo de trabajo.")
+    if not is_super_admin(user) and not user.company_id:
+        raise PermissionDenied("El usuario no tiene company asignada.")
+    serializer = job_type.params_serializer(data=params, context={'request': request, **context})
+    serializer.is_valid(raise_exception=True)
+    return enqueue(kind, serializer.data, user=user, company_id=None if is_super_admin(user) else user.company_id)
+
+
+def cancel_job(job):
+    """
+    Un trabajo en cola se cancela de inmediato; uno en ejecución queda
+    marcado y se detiene en su próximo progress().
+    """
+    cancelled = Job.objects.filter(pk=job.pk, status='queued').update(status='cancelled', finished_at=timezone.now())
+    if not cancelled and not Job.objects.filter(pk=job.pk, status='running').update(cancel_requested=True):
+        raise ValidationError("El trabajo ya terminó.")
+    job.refresh_from_db()
+    return job
+
+
+# -------------------------
+# Ejecución (manage.py run_workers)
+# -------------------------
+def claim_jobs(worker, limit):
+    """Toma hasta `limit` trabajos pendientes para `worker`; devuelve sus ids."""
+    now = timezone.now()
+    candidates = list(
+        Job.objects.filter(status='queued', run_after__lte=now).order_by('run_after', 'id')
+        .values_list('pk', flat=True)[:limit * 2]
+    )
+    claimed = []
+    for job_id in candidates:
+        # otro worker pudo tomarlo entre la lectura y el UPDATE: gana uno solo
+        if Job.objects.filter(pk=job_id, status='queued').update(
+            status='running', worker=worker, attempts=F('attempts') + 1,
+            started_at=now, heartbeat_at=now,
+        ):
+            claimed.append(job_id)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def heartbeat(job_ids):
+    if job_ids:
+        Job.objects.filter(pk__in=list(job_ids), status='running').update(heartbeat_at=timezone.now())
+
+
+def retry_or_fail(job, error):
+    """Vuelve a encolar el trabajo con espera exponencial o, sin intentos restantes, lo marca fallido."""
+    now = timezone.now()
+    running = Job.objects.filter(pk=job.pk, status='running')
+    if job.attempts < job.max_attempts and not job.cancel_requested:
+        delay = settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+        running.update(
+            status='queued', run_after=now + timedelta(seconds=delay), error=error,
+            progress=0, progress_message='', worker='', heartbeat_at=None,
+        )
+    else:
+        running.update(status='cancelled' if job.cancel_requested else 'failed', error=error, finished_at=now)
+
+
+def recover_stale():
+    """Reencola (o da por fallidos) los trabajos cuyo worker dejó de enviar heartbeat."""
+    limit = timezone.now() - timedelta(seconds=settings.JOB_STALE_TIMEOUT)
+    stale = list(Job.objects.filter(status='running', heartbeat_at__lt=limit))
+    for job in stale:
+        retry_or_fail(job, f"El worker {job.worker} dejó de responder.")
+    return len(stale)
+
+
+def release_job(job_id, error):
+    """Para el proceso padre cuando el proceso que ejecutaba el trabajo murió."""
+    job = Job.objects.filter(pk=job_id).first()
+    if job is not None:
+        retry_or_fail(job, error)
+
+
+def run_job(job_id):
+    """Ejecuta un trabajo ya tomado (status 'running'); se llama en un proceso del pool."""
+    close_old_connections()
+    job = Job.objects.get(pk=job_id)
+    ctx = JobContext(job)
+    try:
+        result = REGISTRY[job.kind].handler(ctx, **job.params)
+    except JobCancelled:
+        remove_job_file(ctx.result_file)
+        Job.objects.filter(pk=job.pk, status='running').update(status='cancelled', finished_at=timezone.now())
+    except Exception:
+        remove_job_file(ctx.result_file)
+        job.refresh_from_db(fields=['cancel_requested'])
+        retry_or_fail(job, traceback.format_exc())
+    else:
+        Job.objects.filter(pk=job.pk, status='running').update(
+            status='succeeded', result=result, result_file=ctx.result_file, progress=100, error='',
+            finished_at=timezone.now(),
+        )
+    finally:
+        # el proceso sigue vivo para el próximo trabajo: no deja conexiones abiertas
+        connections.close_all()
+
+
+def remove_job_file(name):
+    if name:
+        try:
+            os.remove(os.path.join(settings.JOB_FILES_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+def purge_finished(days, chunk_size=1000):
+    """
+    Borra los trabajos terminados hace más de `days` días junto con sus
+    archivos (resultado y, si quedó, el archivo subido para importar).
+    """
+    limit = timezone.now() - timedelta(days=days)
+    finished = Job.objects.filter(status__in=('succeeded', 'failed', 'cancelled'), finished_at__lt=limit)
+    deleted = 0
+    while True:
+        jobs = list(finished.only('pk', 'result_file', 'params')[:chunk_size])
+        if not jobs:
+            return deleted
+        for job in jobs:
+            remove_job_file(job.result_file)
+            remove_job_file(job.params.get('upload'))
+        deleted += Job.objects.filter(pk__in=[job.pk for job in jobs]).delete()[0]
+
+
+# -------------------------
+# Tipos de trabajo
+# -------------------------
+def _date(value):
+    return parse_date(value) if value else None
+
+
+def _write_export(ctx, lines, columns, output):
+    total = lines.count()
+    ctx.progress(0, f"0/{total} filas")
+    written = 0
+
+    def rows():
+        nonlocal written
+        for row in iter_rows(lines, columns):
+            yield row
+            written += 1
+            if written % EXPORT_CHUNK_SIZE == 0:
+                ctx.progress(written * 100 // total, f"{written}/{total} filas")
+
+    stream = stream_ndjson if output == 'ndjson' else stream_csv
+    with open(ctx.file_path(output), 'w', encoding='utf-8', newline='') as fh:
+        fh.writelines(stream(columns, rows()))
+    return {'rows': written}
+
+
+@register('export_sales', SaleExportJobParamsSerializer)
+def export_sales(ctx, output='csv', date_from=None, date_to=None, branch=None):
+    lines = SaleLine.objects.all()
+    if ctx.job.company_id:
+        lines = lines.filter(branch__company_id=ctx.job.company_id)
+    lines = filter_export_lines(lines, *date_bounds(_date(date_from), _date(date_to)), branch_id=branch)
+    return {**_write_export(ctx, lines, SALE_COLUMNS, output), 'filename': f'ventas.{output}'}
+
+
+@register('export_purchases', PurchaseExportJobParamsSerializer)
+def export_purchases(ctx, output='csv', date_from=None, date_to=None, supplier=None):
+    lines = PurchaseLine.objects.all()
+    if ctx.job.company_id:
+        lines = lines.filter(company_id=ctx.job.company_id)
+    lines = filter_export_lines(
+        lines, *date_bounds(_date(date_from), _date(date_to)), purchase__supplier_id=supplier,
+    )
+    return {**_write_export(ctx, lines, PURCHASE_COLUMNS, output), 'filename': f'compras.{output}'}
+
+
+@register('import_products', ProductImportJobParamsSerializer, permission=IsSuperAdminOrAdminCliente)
+def import_products_job(ctx, company=None, products=None, upload=None, fmt='json'):
+    """`products` viene de la API; `upload` es un archivo que guardó /api/products/import/?background=1."""
+    company_id = ctx.job.company_id or company
+    total = len(products) if products is not None else None
+
+    def progress(processed):
+        ctx.progress(processed * 100 // total if total else None, f"{processed} filas procesadas")
+
+    if upload is None:
+        return import_products(company_id, products, chunk_size=settings.PRODUCT_IMPORT_CHUNK_SIZE, progress=progress)
+    path = os.path.join(settings.JOB_FILES_DIR, upload)
+    with open(path, 'rb') as fh:
+        report = import_products(
+            company_id, read_rows(fh, fmt), chunk_size=settings.PRODUCT_IMPORT_CHUNK_SIZE, progress=progress,
+        )
+    os.remove(path)
+    return report
+
+
+@register('audit', AuditJobParamsSerializer, permission=IsSuperAdmin, max_attempts=1)
+def audit_job(ctx, checks=None, chunk_size=AUDIT_CHUNK_SIZE, workers=AUDIT_WORKERS):
+    """Los hallazgos van al archivo (NDJSON); el resultado es el resumen."""
+    summary = None
+    found = 0
+    with open(ctx.file_path('ndjson'), 'w', encoding='utf-8') as fh:
+        for record in run_audit(checks or None, chunk_size, workers):
+            if 'summary' in record:
+                summary = record
+                continue
+            fh.write(json.dumps(record, ensure_ascii=False, cls=DjangoJSONEncoder) + '\n')
+            found += 1
+            if found % 1000 == 0:
+                ctx.progress(None, f"{found} hallazgos")
+    return {**summary, 'filename': 'auditoria.ndjson'}
+
+
+@register('rebuild_sales_rollup', SalesRollupJobParamsSerializer, permission=IsSuperAdmin)
+def rebuild_sales_rollup_job(ctx, date_from=None, date_to=None, window_days=7):
+    options = {'window_days': window_days}
+    if date_from:
+        options['date_from'] = date_from
+    if date_to:
+        options['date_to'] = date_to
+    out = io.StringIO()
+    call_command('rebuild_sales_rollup', stdout=out, **options)
+    return {'output': out.getvalue().splitlines()}
@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from temusoft_app.audit import AUDIT_CHUNK_SIZE, AUDIT_WORKERS, CHECK_CODES, run_audit
+
+
+class Command(BaseCommand):
+    help = 'Audita la integridad de los datos (RUT, roles, inventario, suscripciones) y emite NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', dest='checks', action='append', choices=CHECK_CODES,
+                            help='Regla a ejecutar (repetible). Por defecto, todas.')
+        parser.add_argument('--chunk-size', type=int, default=AUDIT_CHUNK_SIZE, help='Rango de pk por tarea')
+        parser.add_argument('--workers', type=int, default=AUDIT_WORKERS, help='Hilos del pool')
+        parser.add_argument('--output', help='Archivo de salida (NDJSON). Por defecto, stdout.')
+        parser.add_argument('--fail-on-findings', action='store_true',
+                            help='Termina con código 1 si hay hallazgos')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1 or options['workers'] < 1:
+            raise CommandError("--chunk-size y --workers deben ser mayores que 0.")
+
+        out = open(options['output'], 'w', encoding='utf-8') if options['output'] else self.stdout
+        try:
+            for record in run_audit(options['checks'], options['chunk_size'], options['workers']):
+                out.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        finally:
+            if options['output']:
+                out.close()
+
+        # el último registro es el resumen
+        if options['fail_on_findings'] and record['findings']:
+            # CommandError termina con código 1 al correr desde manage.py
+            raise CommandError(f"La auditoría encontró {record['findings']} problemas.")
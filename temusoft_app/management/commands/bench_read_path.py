@@ -0,0 +1,65 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from temusoft_app.benchmarks import run_async, run_threaded
+from temusoft_app.models import User
+
+# endpoint -> (vista DRF síncrona, vista async de async_views.py)
+ENDPOINTS = {
+    'products': ('/api/products/', '/api/async/products/'),
+    'inventory': ('/api/inventory/', '/api/async/inventory/'),
+    'me': ('/api/users/me/', '/api/async/users/me/'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el throughput de los GET de lectura DRF (síncronos, en hilos) y de async_views (en un event '
+        'loop) sobre los mismos datos. Corre en proceso con el cliente de pruebas: compara las vistas, no un '
+        'servidor WSGI/ASGI real'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='username con el que se autentican los requests')
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), action='append',
+                            help='Endpoint a medir (repetible). Por defecto, todos.')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--query', default='', help='Query string común, por ejemplo "branch=3&page_size=100"')
+        parser.add_argument('--json', action='store_true', help='Imprime el resultado como JSON')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['user']}.")
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests y --concurrency deben ser mayores que 0.")
+
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        query = f"?{options['query']}" if options['query'] else ''
+        results = {}
+        # se mide la API, no los límites del plan (PlanRateThrottle)
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], PLAN_THROTTLE_ENABLED=False):
+            for name in options['endpoint'] or sorted(ENDPOINTS):
+                sync_path, async_path = ENDPOINTS[name]
+                results[name] = {
+                    'drf_threads': run_threaded(
+                        sync_path + query, headers, options['requests'], options['concurrency'],
+                    ),
+                    'async_tasks': run_async(async_path + query, headers, options['requests'], options['concurrency']),
+                }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for name, modes in results.items():
+            for mode, stats in modes.items():
+                self.stdout.write(
+                    f"{name:<10} {mode:<11}: {stats['rps']:>8} req/s  p50 {stats['p50_ms']}ms  "
+                    f"p95 {stats['p95_ms']}ms  p99 {stats['p99_ms']}ms  status {stats['statuses']}"
+                )
@@ -0,0 +1,128 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from temusoft_app.benchmarks import compare, run_scenario
+from temusoft_app.models import Branch, Inventory, Product, Sale, SaleLine, User
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide latencia (p50/p95/p99) y consultas por request de los endpoints DRF principales '
+        'y guarda el resultado en JSON para comparar entre versiones'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True,
+                            help='username admin_cliente con el que se miden los endpoints (p. ej. bench_c1_admin)')
+        parser.add_argument('--password', default='bench1234', help='Contraseña del usuario (escenario token)')
+        parser.add_argument('--repeat', type=int, default=100, help='Requests medidos por escenario')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--scenario', action='append', help='Escenario a ejecutar (repetible). Por defecto, todos.')
+        parser.add_argument('--output', help='Guarda el resultado en este archivo JSON')
+        parser.add_argument('--compare', help='Resultado JSON anterior contra el cual comparar')
+        parser.add_argument('--tolerance', type=float, default=0.15,
+                            help='Empeoramiento de p95 tolerado al comparar (fracción)')
+
+    def scenarios(self, user, password):
+        branch = Branch.objects.filter(company_id=user.company_id).order_by('pk').first()
+        branch_id = branch.pk if branch else 0
+        return {
+            'products_list': ('GET', '/api/products/', None),
+            'products_search': ('GET', '/api/products/search/?q=pre', None),
+            'inventory_branch': ('GET', f'/api/inventory/?branch={branch_id}', None),
+            'inventory_low_stock': ('GET', f'/api/inventory/low-stock/?branch={branch_id}', None),
+            'sales_list': ('GET', '/api/sales/', None),
+            'users_list': ('GET', '/api/users/', None),
+            'users_me': ('GET', '/api/users/me/', None),
+            'reports_sales': ('GET', '/api/reports/sales/?group_by=day', None),
+            'token_obtain': ('POST', '/api/token/', {'username': user.username, 'password': password}),
+        }
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['user']}; genera datos con generate_dataset.")
+        if options['repeat'] < 1:
+            raise CommandError("--repeat debe ser mayor que 0.")
+        scenarios = self.scenarios(user, options['password'])
+        selected = options['scenario'] or list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(f"Escenarios desconocidos: {', '.join(sorted(unknown))}. Opciones: {', '.join(scenarios)}.")
+
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        client = Client()
+        results = {}
+        # se mide la API, no los límites del plan (PlanRateThrottle)
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], PLAN_THROTTLE_ENABLED=False):
+            for name in selected:
+                method, path, data = scenarios[name]
+                results[name] = run_scenario(
+                    client, method, path, headers=None if name == 'token_obtain' else headers,
+                    data=json.dumps(data) if data else None,
+                    repeat=options['repeat'], warmup=options['warmup'],
+                )
+                stats = results[name]
+                self.stdout.write(
+                    f"{name:<20} p50 {stats['p50_ms']:>8}ms  p95 {stats['p95_ms']:>8}ms  "
+                    f"p99 {stats['p99_ms']:>8}ms  consultas {stats['queries_min']}-{stats['queries_max']}  "
+                    f"status {stats['statuses']}"
+                )
+
+        report = {
+            'meta': {
+                'timestamp': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+                'git_revision': _git_revision(),
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'user': user.username,
+                'repeat': options['repeat'],
+                'dataset': {
+                    'products': Product.objects.count(),
+                    'inventory': Inventory.objects.count(),
+                    'sales': Sale.objects.count(),
+                    'sale_lines': SaleLine.objects.count(),
+                    'users': User.objects.count(),
+                },
+            },
+            'scenarios': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fileobj:
+                json.dump(report, fileobj, indent=2)
+            self.stdout.write(f"Resultado guardado en {options['output']}")
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as fileobj:
+                baseline = json.load(fileobj)
+            rows = compare(baseline, report, options['tolerance'])
+            for row in rows:
+                style = self.style.ERROR if row['regression'] else self.style.SUCCESS
+                self.stdout.write(style(
+                    f"{row['scenario']:<20} p95 {row['p95_ms'][0]} -> {row['p95_ms'][1]}ms "
+                    f"({row['p95_delta']:+.1%})  consultas máx {row['queries_max'][0]} -> {row['queries_max'][1]}"
+                ))
+            if any(row['regression'] for row in rows):
+                raise CommandError("Hay regresiones respecto del resultado anterior.")
@@ -0,0 +1,65 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from temusoft_app.models import Inventory, StockMovement, StockSnapshot
+from temusoft_app.services import LEDGER_EPOCH, annotate_stock_at
+
+
+class Command(BaseCommand):
+    help = (
+        'Crea fotos (StockSnapshot) por producto y sucursal a partir del libro de movimientos, '
+        'para acotar el cálculo de stock histórico'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lag-minutes', type=int, default=60,
+                            help='La foto se toma a now - lag, para no dejar fuera transacciones aún abiertas')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Filas de Inventory por bloque')
+        parser.add_argument('--verify', action='store_true',
+                            help='Informa las filas cuyo stock no coincide con el total del libro')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1 or options['lag_minutes'] < 0:
+            raise CommandError("--chunk-size debe ser mayor que 0 y --lag-minutes no puede ser negativo.")
+        taken_at = timezone.now() - timedelta(minutes=options['lag_minutes'])
+        created = 0
+        mismatches = 0
+        last_pk = 0
+        while True:
+            chunk = Inventory.objects.filter(pk__gt=last_pk).order_by('pk')
+            ids = list(chunk.values_list('pk', flat=True)[:options['chunk_size']])
+            if not ids:
+                break
+            last_pk = ids[-1]
+            # solo las filas con movimientos desde su última foto necesitan una nueva
+            rows = (
+                annotate_stock_at(Inventory.objects.filter(pk__in=ids), taken_at)
+                .filter(Exists(StockMovement.objects.filter(
+                    product_id=OuterRef('product_id'), branch_id=OuterRef('branch_id'),
+                    created_at__gt=Coalesce(OuterRef('snapshot_at'), LEDGER_EPOCH), created_at__lte=taken_at,
+                )))
+                .values_list('product_id', 'branch_id', 'stock_at')
+            )
+            snapshots = StockSnapshot.objects.bulk_create(
+                [StockSnapshot(product_id=p, branch_id=b, taken_at=taken_at, stock=stock) for p, b, stock in rows],
+                ignore_conflicts=True,
+            )
+            created += len(snapshots)
+
+            if options['verify']:
+                # total del libro hasta ahora contra la columna stock
+                for pk, stock, ledger in (
+                    annotate_stock_at(Inventory.objects.filter(pk__in=ids), timezone.now())
+                    .exclude(stock=F('stock_at'))
+                    .values_list('pk', 'stock', 'stock_at')
+                ):
+                    mismatches += 1
+                    self.stderr.write(f"inventory {pk}: stock {stock}, libro {ledger}")
+
+        self.stdout.write(self.style.SUCCESS(f"{created} fotos de stock al {taken_at.isoformat()}."))
+        if options['verify']:
+            self.stdout.write(f"{mismatches} filas con diferencias entre stock y libro.")
@@ -0,0 +1,305 @@
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from time import monotonic
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from temusoft_app.cache import bump_catalog_version
+from temusoft_app.models import (
+    Branch, Company, Inventory, Product, Purchase, PurchaseLine, Sale, SaleLine, StockMovement, Subscription,
+    Supplier, User,
+)
+
+CATEGORIES = ('Abarrotes', 'Bebidas', 'Lácteos', 'Limpieza', 'Panadería', 'Ferretería', 'Librería', 'Mascotas')
+WORDS = ('Premium', 'Clásico', 'Familiar', 'Light', 'Extra', 'Mini', 'Pack', 'Natural', 'Integral', 'Original')
+PAYMENT_METHODS = ('efectivo', 'debito', 'credito', 'transferencia')
+
+
+def rut_with_dv(number):
+    """RUT chileno con dígito verificador válido (ver validators.valid_rut)."""
+    factors = (2, 3, 4, 5, 6, 7)
+    total = sum(int(d) * factors[i % 6] for i, d in enumerate(reversed(str(number))))
+    mod = 11 - total % 11
+    dv = 'K' if mod == 10 else '0' if mod == 11 else str(mod)
+    return f'{number}-{dv}'
+
+
+@contextmanager
+def keep_created_at(*models):
+    """
+    bulk_create respeta auto_now_add y pisaría las fechas históricas generadas;
+    se desactiva solo mientras dura la carga.
+    """
+    fields = [model._meta.get_field('created_at') for model in models]
+    previous = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, previous):
+            field.auto_now_add = value
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera un dataset sintético (companies con suscripción, sucursales, usuarios, productos, inventario, '
+        'compras y ventas históricas) con inserciones masivas, para pruebas de carga'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=3)
+        parser.add_argument('--branches', type=int, default=4, help='Sucursales por company')
+        parser.add_argument('--products', type=int, default=2000, help='Productos por company')
+        parser.add_argument('--sales', type=int, default=100000, help='Ventas en total')
+        parser.add_argument('--max-lines', type=int, default=6, help='Máximo de líneas por venta')
+        parser.add_argument('--purchases', type=int, default=200, help='Compras por company')
+        parser.add_argument('--days', type=int, default=365, help='Las ventas se reparten en los últimos N días')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='bench', help='Prefijo de usernames y nombres')
+        parser.add_argument('--password', default='bench1234', help='Contraseña de todos los usuarios generados')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--skip-rollup', action='store_true', help='No reconstruye DailySalesRollup al final')
+
+    def handle(self, *args, **options):
+        for name in ('companies', 'branches', 'products', 'max_lines', 'days', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} debe ser mayor que 0.")
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f"Ya existen usuarios con el prefijo '{prefix}_'; usa otro --prefix.")
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = monotonic()
+
+        with transaction.atomic():
+            companies = self._companies(options)
+            branches = self._branches(companies, options)
+            sellers = self._users(companies, branches, options)
+            catalog = self._products(companies, options)
+            self._inventory(branches, catalog)
+            self._purchases(companies, catalog, options)
+        sold = self._sales(branches, catalog, sellers, options)
+        self._ledger(branches, sold, options)
+
+        for company in companies:
+            bump_catalog_version(company.pk)
+        if options['sales'] and not options['skip_rollup']:
+            call_command(
+                'rebuild_sales_rollup',
+                date_from=str(timezone.localdate() - timedelta(days=options['days'])),
+                window_days=30, stdout=self.stdout,
+            )
+        self.stdout.write(self.style.SUCCESS(f"Dataset generado en {monotonic() - started:.1f}s."))
+
+    # --- catálogo y maestros -------------------------------------------------
+
+    def _companies(self, options):
+        prefix = options['prefix']
+        base = 70_000_000 + self.rng.randrange(1_000_000)
+        companies = Company.objects.bulk_create([
+            Company(name=f'{prefix.title()} Company {i}', rut=rut_with_dv(base + i))
+            for i in range(1, options['companies'] + 1)
+        ])
+        # un plan de cada tipo en rotación, vigente durante todo el rango de fechas
+        today = timezone.localdate()
+        plans = [plan for plan, _ in Subscription.PLAN_CHOICES]
+        Subscription.objects.bulk_create([
+            Subscription(company=company, plan_name=plans[i % len(plans)],
+                         start_date=today - timedelta(days=options['days']), end_date=today + timedelta(days=365))
+            for i, company in enumerate(companies)
+        ])
+        self.stdout.write(f"companies: {len(companies)}")
+        return companies
+
+    def _branches(self, companies, options):
+        branches = Branch.objects.bulk_create([
+            Branch(company=company, name=f'Sucursal {i}', address=f'Calle {self.rng.randrange(100, 9999)}')
+            for company in companies for i in range(1, options['branches'] + 1)
+        ])
+        self.stdout.write(f"sucursales: {len(branches)}")
+        return branches
+
+    def _users(self, companies, branches, options):
+        """Devuelve {branch_id: [ids de vendedores]}."""
+        prefix = options['prefix']
+        password = make_password(options['password'])  # un solo hash para todos
+        base = 10_000_000 + self.rng.randrange(1_000_000)
+        users = [User(username=f'{prefix}_admin', role='super_admin', password=password, is_staff=True)]
+        sellers = {}
+        for company in companies:
+            users.append(User(
+                username=f'{prefix}_c{company.pk}_admin', role='admin_cliente', company=company, password=password,
+            ))
+        for branch in branches:
+            users.append(User(
+                username=f'{prefix}_b{branch.pk}_gerente', role='gerente', company_id=branch.company_id,
+                password=password,
+            ))
+            sellers[branch.pk] = [
+                User(username=f'{prefix}_b{branch.pk}_vendedor{i}', role='vendedor', company_id=branch.company_id,
+                     password=password)
+                for i in (1, 2)
+            ]
+            users.extend(sellers[branch.pk])
+        for i, user in enumerate(users):
+            user.rut = rut_with_dv(base + i)
+        User.objects.bulk_create(users, batch_size=self.batch_size)
+        self.stdout.write(f"usuarios: {len(users)} (contraseña: {options['password']})")
+        return {branch_id: [user.pk for user in branch_sellers] for branch_id, branch_sellers in sellers.items()}
+
+    def _products(self, companies, options):
+        """Devuelve {company_id: [(product_id, sku, price, cost), ...]}."""
+        catalog = {}
+        for company in companies:
+            products = []
+            for i in range(1, options['products'] + 1):
+                cost = Decimal(self.rng.randrange(300, 20000)).quantize(Decimal('1'))
+                products.append(Product(
+                    company=company,
+                    sku=f'SKU-{i:06d}',
+                    name=f'{self.rng.choice(CATEGORIES)} {self.rng.choice(WORDS)} {i}',
+                    description=f'Producto sintético {i}',
+                    price=(cost * Decimal(self.rng.uniform(1.15, 1.8))).quantize(Decimal('1')),
+                    cost=cost,
+                    category=self.rng.choice(CATEGORIES),
+                ))
+            created = Product.objects.bulk_create(products, batch_size=self.batch_size)
+            catalog[company.pk] = [(p.pk, p.sku, p.price, p.cost) for p in created]
+        self.stdout.write(f"productos: {sum(len(items) for items in catalog.values())}")
+        return catalog
+
+    def _inventory(self, branches, catalog):
+        total = 0
+        for branch in branches:
+            rows = []
+            for product_id, _, _, _ in catalog[branch.company_id]:
+                reorder_point = self.rng.randrange(5, 30)
+                # ~5 % bajo el punto de reorden, para que /low-stock/ tenga datos
+                stock = self.rng.randrange(0, reorder_point) if self.rng.random() < 0.05 else self.rng.randrange(50, 5000)
+                rows.append(Inventory(product_id=product_id, branch=branch, stock=stock, reorder_point=reorder_point))
+            Inventory.objects.bulk_create(rows, batch_size=self.batch_size)
+            total += len(rows)
+        self.stdout.write(f"inventario: {total}")
+
+    def _purchases(self, companies, catalog, options):
+        if not options['purchases']:
+            return
+        today = timezone.localdate()
+        total = 0
+        for company in companies:
+            suppliers = Supplier.objects.bulk_create([
+                Supplier(company=company, name=f'Proveedor {i}', rut=rut_with_dv(76_000_000 + company.pk * 100 + i))
+                for i in range(1, 6)
+            ])
+            purchases = Purchase.objects.bulk_create([
+                Purchase(company=company, supplier=self.rng.choice(suppliers),
+                         date=today - timedelta(days=self.rng.randrange(options['days'])))
+                for _ in range(options['purchases'])
+            ], batch_size=self.batch_size)
+            lines = []
+            for purchase in purchases:
+                created_at = timezone.make_aware(datetime.combine(purchase.date, time.min))
+                for product_id, sku, _, cost in self.rng.sample(catalog[company.pk], min(10, len(catalog[company.pk]))):
+                    lines.append(PurchaseLine(
+                        purchase=purchase, company=company, product_id=product_id, sku=sku,
+                        quantity=self.rng.randrange(10, 200), unit_cost=cost, created_at=created_at,
+                    ))
+            PurchaseLine.objects.bulk_create(lines, batch_size=self.batch_size)
+            total += len(purchases)
+        self.stdout.write(f"compras: {total}")
+
+    # --- ventas --------------------------------------------------------------
+
+    def _sales(self, branches, catalog, sellers, options):
+        """
+        Ventas en bloques de batch_size, cada bloque en su transacción. Las fechas
+        se generan en orden creciente, como llegarían en producción. No se
+        descuenta stock: el inventario inicial ya es el "actual". Cada línea
+        deja su movimiento 'sale' en el libro; devuelve lo vendido por
+        (product_id, branch_id).
+        """
+        sold = {}
+        total = options['sales']
+        if not total:
+            return sold
+        span = options['days'] * 86400
+        start = timezone.now() - timedelta(seconds=span)
+        step = span / total
+        done = 0
+        with keep_created_at(Sale):
+            while done < total:
+                size = min(self.batch_size, total - done)
+                sales, pending_lines = [], []
+                for i in range(done, done + size):
+                    branch = self.rng.choice(branches)
+                    products = catalog[branch.company_id]
+                    created_at = start + timedelta(seconds=i * step + self.rng.random() * step)
+                    lines = []
+                    for product_id, sku, price, cost in self.rng.sample(
+                        products, min(len(products), self.rng.randint(1, options['max_lines']))
+                    ):
+                        lines.append((product_id, sku, self.rng.randint(1, 3), price, cost))
+                    sales.append(Sale(
+                        branch=branch,
+                        user_id=self.rng.choice(sellers[branch.pk]),
+                        total=sum(qty * price for _, _, qty, price, _ in lines),
+                        payment_method=self.rng.choice(PAYMENT_METHODS),
+                        created_at=created_at,
+                    ))
+                    pending_lines.append(lines)
+                with transaction.atomic():
+                    Sale.objects.bulk_create(sales)
+                    SaleLine.objects.bulk_create([
+                        SaleLine(
+                            sale=sale, branch_id=sale.branch_id, product_id=product_id, sku=sku, quantity=qty,
+                            unit_price=price, unit_cost=cost, created_at=sale.created_at,
+                        )
+                        for sale, lines in zip(sales, pending_lines)
+                        for product_id, sku, qty, price, cost in lines
+                    ], batch_size=self.batch_size)
+                    movements = []
+                    for sale, lines in zip(sales, pending_lines):
+                        for product_id, _, qty, _, _ in lines:
+                            key = (product_id, sale.branch_id)
+                            sold[key] = sold.get(key, 0) + qty
+                            movements.append(StockMovement(
+                                product_id=product_id, branch_id=sale.branch_id, kind='sale', quantity=-qty,
+                                sale=sale, user_id=sale.user_id, created_at=sale.created_at,
+                            ))
+                    StockMovement.objects.bulk_create(movements, batch_size=self.batch_size)
+                done += size
+                self.stdout.write(f"ventas: {done}/{total}")
+        return sold
+
+    def _ledger(self, branches, sold, options):
+        """
+        Movimiento 'initial' anterior a la primera venta con el stock actual más
+        lo vendido, para que el libro sume exactamente Inventory.stock.
+        """
+        created_at = timezone.now() - timedelta(days=options['days'] + 1)
+        total = 0
+        last_pk = 0
+        while True:
+            rows = list(
+                Inventory.objects.filter(pk__gt=last_pk, branch__in=branches)
+                .order_by('pk').values_list('pk', 'product_id', 'branch_id', 'stock')[:self.batch_size]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            movements = [
+                StockMovement(product_id=product_id, branch_id=branch_id, kind='initial',
+                              quantity=stock + sold.get((product_id, branch_id), 0), created_at=created_at)
+                for _, product_id, branch_id, stock in rows
+            ]
+            StockMovement.objects.bulk_create([m for m in movements if m.quantity], batch_size=self.batch_size)
+            total += len(movements)
+        self.stdout.write(f"libro de stock: {total} movimientos iniciales")
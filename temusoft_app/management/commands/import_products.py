@@ -0,0 +1,35 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from temusoft_app.imports import IMPORT_FORMATS, import_products, read_rows
+from temusoft_app.models import Company
+
+
+class Command(BaseCommand):
+    help = 'Importa (upsert por company + sku) un catálogo de productos desde CSV, NDJSON o JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo a importar')
+        parser.add_argument('--company', type=int, required=True, help='id de la company destino')
+        parser.add_argument('--input', choices=IMPORT_FORMATS, help='Formato; por defecto según la extensión')
+        parser.add_argument('--chunk-size', type=int, default=settings.PRODUCT_IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if not Company.objects.filter(pk=options['company']).exists():
+            raise CommandError(f"No existe la company {options['company']}.")
+        fmt = options['input'] or options['path'].rsplit('.', 1)[-1].lower()
+        if fmt not in IMPORT_FORMATS:
+            raise CommandError(f"Formato no soportado: {fmt}. Usa --input ({', '.join(IMPORT_FORMATS)}).")
+
+        with open(options['path'], 'rb') as fileobj:
+            report = import_products(options['company'], read_rows(fileobj, fmt), chunk_size=options['chunk_size'])
+
+        for error in report['errors']:
+            self.stderr.write(f"fila {error['row']}: {json.dumps(error['errors'], ensure_ascii=False)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['processed']} filas ({report['created']} creadas, {report['updated']} actualizadas, "
+            f"{len(report['errors'])} con errores) en {report['seconds']}s "
+            f"({report['rows_per_second']} filas/s)"
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from temusoft_app.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Borra las Idempotency-Key vencidas (programar periódicamente, p. ej. cada hora con cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Filas por DELETE')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size debe ser mayor que 0.")
+        deleted = purge_expired(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"{deleted} claves vencidas borradas."))
@@ -0,0 +1,79 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from temusoft_app.models import DailySalesRollup, SaleLine
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye DailySalesRollup a partir de SaleLine (por ventanas de días)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', help='Primer día a reconstruir (YYYY-MM-DD). Por defecto, la primera venta.')
+        parser.add_argument('--date-to', help='Último día a reconstruir (YYYY-MM-DD). Por defecto, hoy.')
+        parser.add_argument('--window-days', type=int, default=7, help='Días por transacción.')
+
+    def handle(self, *args, **options):
+        date_from = self._parse(options['date_from'])
+        date_to = self._parse(options['date_to']) or timezone.localdate()
+        if date_from is None:
+            first = SaleLine.objects.order_by('created_at').values_list('created_at', flat=True).first()
+            if first is None:
+                self.stdout.write("No hay ventas para resumir.")
+                return
+            date_from = timezone.localdate(first)
+        if date_from > date_to:
+            raise CommandError("--date-from debe ser anterior o igual a --date-to.")
+
+        window = timedelta(days=options['window_days'])
+        start = date_from
+        total_rows = 0
+        while start <= date_to:
+            end = min(start + window - timedelta(days=1), date_to)
+            total_rows += self._rebuild_window(start, end)
+            self.stdout.write(f"{start} .. {end}: ok")
+            start = end + timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f"Resumen reconstruido: {total_rows} filas."))
+
+    def _rebuild_window(self, start, end):
+        # límites del día en la zona horaria local (TIME_ZONE)
+        lower = timezone.make_aware(datetime.combine(start, time.min))
+        upper = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+        money = DecimalField(max_digits=14, decimal_places=2)
+        aggregates = (
+            SaleLine.objects.filter(
+                created_at__gte=lower, created_at__lt=upper,
+                product__isnull=False, sale__voided_at__isnull=True,
+            )
+            .annotate(day=TruncDate('created_at'))
+            .values('branch_id', 'product_id', 'day')
+            .annotate(
+                total_units=Sum('quantity'),
+                total_revenue=Sum(ExpressionWrapper(F('quantity') * F('unit_price'), output_field=money)),
+                total_cost=Sum(ExpressionWrapper(F('quantity') * F('unit_cost'), output_field=money)),
+            )
+            .order_by()
+        )
+        with transaction.atomic():
+            DailySalesRollup.objects.filter(day__gte=start, day__lte=end).delete()
+            rows = [
+                DailySalesRollup(
+                    branch_id=row['branch_id'], product_id=row['product_id'], day=row['day'],
+                    units=row['total_units'], revenue=row['total_revenue'], cost=row['total_cost'],
+                )
+                for row in aggregates.iterator(chunk_size=2000)
+            ]
+            DailySalesRollup.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    def _parse(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Fecha inválida: {value} (formato YYYY-MM-DD)")
@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from temusoft_app.jobs import claim_jobs, heartbeat, purge_finished, recover_stale, release_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta los trabajos en segundo plano (/api/jobs/) en un pool de procesos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Procesos del pool (trabajos simultáneos). Por defecto, uno por CPU.')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Segundos entre consultas a la cola cuando no hay trabajos.')
+        parser.add_argument('--once', action='store_true',
+                            help='Ejecuta los trabajos pendientes y termina (cron, pruebas).')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        if processes < 1:
+            raise CommandError("--processes debe ser mayor que 0.")
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self._stop)
+
+        pool = self._pool(processes)
+        in_flight = {}  # future -> id del trabajo
+        last_maintenance = 0
+        self.stdout.write(f"Worker {self.worker} con {processes} procesos.")
+        try:
+            while True:
+                now = time.monotonic()
+                if now - last_maintenance >= settings.JOB_HEARTBEAT_INTERVAL:
+                    # solo el padre toca los trabajos en curso: si muere, dejan
+                    # de tener heartbeat y otro worker los retoma
+                    heartbeat(in_flight.values())
+                    recover_stale()
+                    purge_finished(settings.JOB_RETENTION_DAYS)
+                    last_maintenance = now
+
+                if not self.stopping and len(in_flight) < processes:
+                    for job_id in claim_jobs(self.worker, processes - len(in_flight)):
+                        in_flight[self._submit(pool, job_id)] = job_id
+                if not in_flight:
+                    if self.stopping or options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(in_flight, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    job_id = in_flight.pop(future)
+                    try:
+                        future.result()
+                    except BrokenProcessPool:
+                        # un proceso murió (OOM, kill): el pool entero queda inutilizable
+                        broken = True
+                        release_job(job_id, "El proceso que ejecutaba el trabajo terminó inesperadamente.")
+                    except Exception as exc:
+                        release_job(job_id, f"Error del worker: {exc!r}")
+                    else:
+                        self.stdout.write(f"Trabajo {job_id} terminado.")
+                if broken:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = self._pool(processes)
+        finally:
+            pool.shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS(f"Worker {self.worker} detenido."))
+
+    def _pool(self, processes):
+        # spawn: cada proceso arranca limpio (sin las conexiones del padre) y configura Django
+        return ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+        )
+
+    def _submit(self, pool, job_id):
+        # los procesos del pool nacen al enviar trabajos; SIG_IGN se hereda, así
+        # Ctrl+C o un SIGTERM al grupo solo detienen al padre, que deja terminar
+        # los trabajos en curso
+        previous = {signum: signal.signal(signum, signal.SIG_IGN) for signum in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            return pool.submit(run_job, job_id)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+    def _stop(self, signum, frame):
+        if not self.stopping:
+            self.stdout.write("Deteniendo: se terminan los trabajos en curso...")
+        self.stopping = True
@@ -1,17 +1,14 @@
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from temusoft_app.models import User  # reemplaza 'myapp' por tu app
+
 
 class Command(BaseCommand):
-    help = 'Valida usuarios según roles y company'
+    help = 'Valida usuarios según roles y company (atajo de `auditar` con las reglas de usuarios)'
 
     def handle(self, *args, **kwargs):
-        # Script de validación
-        usuarios_sin_company = User.objects.filter(
-            role__in=['admin_cliente', 'gerente', 'vendedor'],
-            company__isnull=True
+        call_command(
+            'auditar',
+            checks=['user_role_invalid', 'user_without_company', 'user_rut_invalid'],
+            stdout=self.stdout,
+            stderr=self.stderr,
         )
-        if usuarios_sin_company.exists():
-            for u in usuarios_sin_company:
-                self.stdout.write(f"Usuario {u.username} ({u.role}) sin company asignada")
-        else:
-            self.stdout.write("[]  <-- Todos los usuarios cumplen con las reglas")
@@ -0,0 +1,84 @@
+import threading
+from bisect import bisect_left
+
+# -----------------------------
+# MÉTRICAS EN PROCESO
+# -----------------------------
+# Histogramas acumulativos al estilo Prometheus guardados en memoria del
+# proceso (cada worker tiene los suyos; Prometheus los suma al hacer scrape
+# de cada uno). Registrar una observación es una búsqueda binaria en los
+# buckets y unas sumas bajo un lock: sin I/O ni consultas.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}  # nombre -> (help, buckets, {labels: Histogram})
+
+    def histogram(self, name, help_text, buckets):
+        self._metrics.setdefault(name, (help_text, buckets, {}))
+
+    def observe(self, name, labels, value):
+        """`labels` es una tupla de pares (clave, valor), ya ordenada."""
+        _, buckets, series = self._metrics[name]
+        with self._lock:
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            for _, _, series in self._metrics.values():
+                series.clear()
+
+    def render(self):
+        """Formato de exposición de texto de Prometheus (versión 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, (help_text, buckets, series) in self._metrics.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for labels, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip((*buckets, '+Inf'), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_labels(labels, le=bound)} {cumulative}')
+                    lines.append(f'{name}_sum{_labels(labels)} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, le=None):
+    pairs = list(labels)
+    if le is not None:
+        pairs.append(('le', le))
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+registry = MetricsRegistry()
+registry.histogram('http_request_duration_seconds', 'Tiempo total del request', DURATION_BUCKETS)
+registry.histogram('http_request_db_queries', 'Consultas SQL por request', QUERY_COUNT_BUCKETS)
+registry.histogram('http_request_db_seconds', 'Tiempo en la base de datos por request', DURATION_BUCKETS)
@@ -0,0 +1,172 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import db_router
+from .metrics import registry
+
+slow_query_logger = logging.getLogger('temusoft_app.slow_queries')
+
+
+class QueryTimer:
+    """execute_wrapper que cuenta las consultas del request y acumula su duración."""
+
+    def __init__(self, request):
+        self.request = request
+        self.count = 0
+        self.seconds = 0.0
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        self.slow_threshold = threshold / 1000 if threshold is not None else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if self.slow_threshold is not None and elapsed >= self.slow_threshold:
+                slow_query_logger.warning(
+                    "consulta lenta (%.1f ms) en %s %s [%s]: %s",
+                    elapsed * 1000, self.request.method, self.request.path,
+                    context['connection'].alias, sql,
+                )
+
+
+class MetricsMiddleware:
+    """
+    Registra por request el tiempo total, la cantidad de consultas y el tiempo
+    en la base de datos, etiquetado por vista y acción del viewset
+    (p. ej. view="SaleViewSet", action="list"). Se expone en /api/_metrics/.
+
+    Funciona en WSGI y en ASGI (las vistas de async_views.py no se ven
+    obligadas a correr en un hilo). En las respuestas en streaming
+    (exportaciones) solo se mide hasta que se entregan los encabezados.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timer = QueryTimer(request)
+        start = time.perf_counter()
+        with self._wrap_connections(timer):
+            response = self.get_response(request)
+        self._record(request, response, timer, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        # las conexiones son por hilo y el ORM async corre en el hilo sync del
+        # request (thread_sensitive): el wrapper se instala en ese hilo
+        timer = QueryTimer(request)
+        start = time.perf_counter()
+        stack = await sync_to_async(self._wrap_connections)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self._record(request, response, timer, time.perf_counter() - start)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # las vistas de DRF guardan la clase en .cls y el mapeo método -> acción en .actions;
+        # las vistas función (async_views) se identifican por el nombre de la URL
+        view_class = getattr(view_func, 'cls', None)
+        actions = getattr(view_func, 'actions', None) or {}
+        if view_class is not None:
+            request._metrics_view = view_class.__name__
+        else:
+            request._metrics_view = request.resolver_match.url_name or getattr(view_func, '__name__', 'unknown')
+        request._metrics_action = actions.get(request.method.lower(), request.method.lower())
+        return None
+
+    @staticmethod
+    def _wrap_connections(timer):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        return stack
+
+    @staticmethod
+    def _record(request, response, timer, seconds):
+        labels = (
+            ('view', getattr(request, '_metrics_view', 'unresolved')),
+            ('action', getattr(request, '_metrics_action', '')),
+            ('status', f'{response.status_code // 100}xx'),
+        )
+        registry.observe('http_request_duration_seconds', labels, seconds)
+        registry.observe('http_request_db_queries', labels, timer.count)
+        registry.observe('http_request_db_seconds', labels, timer.seconds)
+
+
+class ReplicaPinningMiddleware:
+    """
+    Lectura de las propias escrituras con réplicas (ver db_router.py):
+
+    - si la request escribe en la base de datos, la respuesta deja la cookie
+      REPLICA_PIN_COOKIE con el vencimiento now + REPLICA_LAG_TOLERANCE_SECONDS
+      (el retraso de replicación tolerado);
+    - mientras esa cookie esté vigente, todas las lecturas del cliente van al
+      primario.
+
+    Sin réplicas configuradas no hace nada.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not db_router.replica_aliases():
+            return self.get_response(request)
+        token = db_router.start_request(pinned=self._pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = db_router.end_request(token)
+        return self._pin(response, wrote)
+
+    async def __acall__(self, request):
+        if not db_router.replica_aliases():
+            return await self.get_response(request)
+        token = db_router.start_request(pinned=self._pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            wrote = db_router.end_request(token)
+        return self._pin(response, wrote)
+
+    @staticmethod
+    def _pinned(request):
+        try:
+            return float(request.COOKIES.get(settings.REPLICA_PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    @staticmethod
+    def _pin(response, wrote):
+        if wrote:
+            tolerance = settings.REPLICA_LAG_TOLERANCE_SECONDS
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, str(time.time() + tolerance),
+                max_age=tolerance, httponly=True, samesite='Lax',
+            )
+        return response
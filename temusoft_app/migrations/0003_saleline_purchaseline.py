@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('temusoft_app', '0002_alter_user_company_alter_user_role'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchaseLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sku', models.CharField(max_length=100)),
+                ('quantity', models.PositiveIntegerField()),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='temusoft_app.company')),
+                ('product', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='temusoft_app.product')),
+                ('purchase', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='temusoft_app.purchase')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['product', 'created_at'], name='purchline_product_created_idx'), models.Index(fields=['company', 'created_at'], name='purchline_company_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SaleLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sku', models.CharField(max_length=100)),
+                ('quantity', models.PositiveIntegerField()),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='temusoft_app.branch')),
+                ('product', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='temusoft_app.product')),
+                ('sale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='temusoft_app.sale')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['product', 'created_at'], name='saleline_product_created_idx'), models.Index(fields=['branch', 'created_at'], name='saleline_branch_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,136 @@
+import logging
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+from django.utils import timezone
+
+CHUNK_SIZE = 1000
+MAX_AMOUNT = Decimal('1e10')  # max_digits=12, decimal_places=2
+
+logger = logging.getLogger(__name__)
+
+
+def _chunks(queryset):
+    """Recorre el queryset por pk en bloques de CHUNK_SIZE (keyset, sin OFFSET)."""
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:CHUNK_SIZE])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def _resolve_products(Product, pairs):
+    """{(company_id, sku): (product_id, cost)} para los pares pedidos, en una consulta."""
+    skus = {sku for _, sku in pairs}
+    rows = Product.objects.filter(sku__in=skus).values_list('company_id', 'sku', 'pk', 'cost')
+    return {(company_id, sku): (pk, cost) for company_id, sku, pk, cost in rows if (company_id, sku) in pairs}
+
+
+def _lines(items, owner):
+    """
+    (sku, qty, price) de cada ítem válido del JSON antiguo. Los ítems mal
+    formados (sin sku, qty no entero o <= 0, precio no numérico, negativo o
+    fuera de rango) se omiten y quedan en el log: un dato viejo corrupto no
+    debe abortar la migración.
+    """
+    if not isinstance(items, list):
+        if items:
+            logger.warning("%s: items no es una lista, se omite: %r", owner, items)
+        return
+    for item in items:
+        try:
+            sku = str(item['sku']).strip()
+            qty = int(item.get('qty') or 0)
+            price = Decimal(str(item.get('price') or 0))
+            valid = sku and len(sku) <= 100 and qty > 0 and price.is_finite() and 0 <= price < MAX_AMOUNT
+        except (TypeError, KeyError, AttributeError, ValueError, InvalidOperation):
+            valid = False
+        if not valid:
+            logger.warning("%s: ítem inválido omitido: %r", owner, item)
+            continue
+        yield sku, qty, price
+
+
+def sales_forward(apps, schema_editor):
+    Sale = apps.get_model('temusoft_app', 'Sale')
+    SaleLine = apps.get_model('temusoft_app', 'SaleLine')
+    Product = apps.get_model('temusoft_app', 'Product')
+
+    queryset = Sale.objects.select_related('branch').only('items', 'created_at', 'branch__company')
+    for chunk in _chunks(queryset):
+        lines = {sale.pk: list(_lines(sale.items, f'Sale {sale.pk}')) for sale in chunk}
+        pairs = {(sale.branch.company_id, sku) for sale in chunk for sku, _, _ in lines[sale.pk]}
+        products = _resolve_products(Product, pairs)
+        new_lines = []
+        for sale in chunk:
+            for sku, qty, price in lines[sale.pk]:
+                product_id, cost = products.get((sale.branch.company_id, sku), (None, Decimal('0')))
+                new_lines.append(SaleLine(
+                    sale_id=sale.pk, branch_id=sale.branch_id, product_id=product_id, sku=sku,
+                    quantity=qty, unit_price=price, unit_cost=cost, created_at=sale.created_at,
+                ))
+        SaleLine.objects.bulk_create(new_lines, batch_size=CHUNK_SIZE)
+
+
+def purchases_forward(apps, schema_editor):
+    Purchase = apps.get_model('temusoft_app', 'Purchase')
+    PurchaseLine = apps.get_model('temusoft_app', 'PurchaseLine')
+    Product = apps.get_model('temusoft_app', 'Product')
+
+    queryset = Purchase.objects.only('pk', 'company_id', 'items', 'date')
+    for chunk in _chunks(queryset):
+        lines = {purchase.pk: list(_lines(purchase.items, f'Purchase {purchase.pk}')) for purchase in chunk}
+        pairs = {(purchase.company_id, sku) for purchase in chunk for sku, _, _ in lines[purchase.pk]}
+        products = _resolve_products(Product, pairs)
+        new_lines = []
+        for purchase in chunk:
+            created_at = timezone.make_aware(datetime.combine(purchase.date, time.min))
+            for sku, qty, price in lines[purchase.pk]:
+                product_id, _ = products.get((purchase.company_id, sku), (None, None))
+                new_lines.append(PurchaseLine(
+                    purchase_id=purchase.pk, company_id=purchase.company_id, product_id=product_id,
+                    sku=sku, quantity=qty, unit_cost=price, created_at=created_at,
+                ))
+        PurchaseLine.objects.bulk_create(new_lines, batch_size=CHUNK_SIZE)
+
+
+def _rebuild_items(Model, Line, fk_name, price_field):
+    """Reverso: reconstruye el JSON `items` a partir de las líneas."""
+    for chunk in _chunks(Model.objects.only('pk')):
+        items = {}
+        lines = Line.objects.filter(**{f'{fk_name}__in': [obj.pk for obj in chunk]}).order_by('pk')
+        for fk, sku, qty, price in lines.values_list(fk_name, 'sku', 'quantity', price_field):
+            items.setdefault(fk, []).append({'sku': sku, 'qty': qty, 'price': str(price)})
+        for obj in chunk:
+            obj.items = items.get(obj.pk, [])
+        Model.objects.bulk_update(chunk, ['items'], batch_size=CHUNK_SIZE)
+    Line.objects.all().delete()
+
+
+def sales_backward(apps, schema_editor):
+    _rebuild_items(
+        apps.get_model('temusoft_app', 'Sale'), apps.get_model('temusoft_app', 'SaleLine'),
+        'sale_id', 'unit_price',
+    )
+
+
+def purchases_backward(apps, schema_editor):
+    _rebuild_items(
+        apps.get_model('temusoft_app', 'Purchase'), apps.get_model('temusoft_app', 'PurchaseLine'),
+        'purchase_id', 'unit_cost',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('temusoft_app', '0003_saleline_purchaseline'),
+    ]
+
+    operations = [
+        migrations.RunPython(sales_forward, sales_backward),
+        migrations.RunPython(purchases_forward, purchases_backward),
+    ]
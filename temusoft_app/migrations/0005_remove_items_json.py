@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+def fill_empty_items(apps, schema_editor):
+    # reverso: las ventas y compras creadas con esta versión tienen items NULL;
+    # el reverso de 0004 los vuelve a armar desde las líneas
+    for name in ('Sale', 'Purchase'):
+        apps.get_model('temusoft_app', name).objects.filter(items__isnull=True).update(items=[])
+
+
+class Migration(migrations.Migration):
+    """
+    El JSON `items` deja de usarse (ahora son SaleLine/PurchaseLine) pero la
+    columna no se borra en esta versión: queda nullable para que la versión
+    anterior, que todavía la lee, siga funcionando si hay que volver atrás.
+    El DROP COLUMN va en una migración de la versión siguiente.
+    """
+
+    dependencies = [
+        ('temusoft_app', '0004_backfill_lines'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='purchase',
+            name='items',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='items',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, fill_empty_items),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+from temusoft_app.db_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('temusoft_app', '0005_remove_items_json'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='sale',
+            index=models.Index(fields=['created_at'], name='sale_created_at_idx'),
+        ),
+    ]
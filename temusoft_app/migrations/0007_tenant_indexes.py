@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+from temusoft_app.db_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('temusoft_app', '0006_sale_created_at_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='inventory',
+            index=models.Index(fields=['branch', 'id'], name='inventory_branch_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['company', 'id'], name='product_company_id_idx'),
+        ),
+    ]
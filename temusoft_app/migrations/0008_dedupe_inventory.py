@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count, Max, Min, Sum
+
+CHUNK_SIZE = 1000
+
+
+def dedupe_inventory(apps, schema_editor):
+    """
+    Fusiona filas duplicadas de Inventory por (product, branch) antes de crear
+    la restricción única: se conserva la fila de menor id con la suma del
+    stock y el mayor reorder_point, y se eliminan las demás.
+    """
+    Inventory = apps.get_model('temusoft_app', 'Inventory')
+    duplicates = (
+        Inventory.objects.values('product_id', 'branch_id')
+        .annotate(n=Count('id'), keep=Min('id'), stock_total=Sum('stock'), reorder=Max('reorder_point'))
+        .filter(n__gt=1)
+        .order_by()
+    )
+    while True:
+        chunk = list(duplicates[:CHUNK_SIZE])
+        if not chunk:
+            return
+        for row in chunk:
+            Inventory.objects.filter(pk=row['keep']).update(stock=row['stock_total'], reorder_point=row['reorder'])
+            Inventory.objects.filter(
+                product_id=row['product_id'], branch_id=row['branch_id'],
+            ).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('temusoft_app', '0007_tenant_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_inventory, migrations.RunPython.noop),
+    ]
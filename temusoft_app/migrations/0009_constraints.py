@@ -0,0 +1,53 @@
+import importlib
+
+from django.db import migrations, models
+
+from temusoft_app.db_operations import AddIndexConcurrently, AddUniqueConstraintConcurrently
+
+# 0008 ya fusionó los duplicados, pero corre en su propia transacción: se
+# repite justo antes de construir el índice único por si la aplicación escribió
+# duplicados entre ambas. Si aun así entran duplicados durante el CREATE
+# UNIQUE INDEX CONCURRENTLY, el índice queda inválido y basta volver a correr
+# migrate: se borra, se deduplica otra vez y se reconstruye (db_operations.py).
+dedupe_inventory = importlib.import_module('temusoft_app.migrations.0008_dedupe_inventory').dedupe_inventory
+
+
+class Migration(migrations.Migration):
+
+    # en PostgreSQL los índices se crean con CONCURRENTLY para no bloquear
+    # escrituras en tablas vivas, y eso no puede correr dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('temusoft_app', '0008_dedupe_inventory'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_inventory, migrations.RunPython.noop, atomic=True),
+        AddUniqueConstraintConcurrently(
+            model_name='inventory',
+            constraint=models.UniqueConstraint(fields=('product', 'branch'), name='inventory_product_branch_uniq'),
+        ),
+        # el SKU pasa a ser único por company; la restricción nueva se crea antes de soltar la global
+        AddUniqueConstraintConcurrently(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('company', 'sku'), name='product_company_sku_uniq'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(max_length=100),
+        ),
+        AddIndexConcurrently(
+            model_name='sale',
+            index=models.Index(fields=['branch', 'created_at'], name='sale_branch_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='purchase',
+            index=models.Index(fields=['company', 'date'], name='purchase_company_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(fields=['company', 'role'], name='user_company_role_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('temusoft_app', '0009_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='voided_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='temusoft_app.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='temusoft_app.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'day'], name='rollup_product_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('branch', 'day', 'product'), name='rollup_branch_day_product_uniq')],
+            },
+        ),
+    ]
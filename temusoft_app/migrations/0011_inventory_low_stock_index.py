@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+from temusoft_app.db_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('temusoft_app', '0010_daily_sales_rollup'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='inventory',
+            index=models.Index(
+                fields=['branch', 'product'],
+                condition=models.Q(stock__lte=models.F('reorder_point')),
+                name='inventory_low_stock_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Índices GIN trigram para /api/products/search/. Solo aplican a PostgreSQL
+# (en otros motores la búsqueda usa el índice de prefijos en memoria de
+# temusoft_app/search.py). Se indexa UPPER(col::text), que es la expresión
+# que Django genera para icontains/istartswith, y se crean con CONCURRENTLY.
+
+COLUMNS = ('name', 'sku', 'category')
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS product_{column}_trgm_idx '
+            f'ON temusoft_app_product USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in COLUMNS:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS product_{column}_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('temusoft_app', '0011_inventory_low_stock_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+from temusoft_app.db_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('temusoft_app', '0013_updated_at'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='branch',
+            index=models.Index(fields=['company', 'updated_at'], name='branch_company_updated_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='inventory',
+            index=models.Index(fields=['branch', 'updated_at'], name='inventory_branch_updated_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['company', 'updated_at'], name='product_company_updated_idx'),
+        ),
+    ]
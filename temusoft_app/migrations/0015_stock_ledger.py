@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:57
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('temusoft_app', '0014_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('initial', 'Stock inicial'), ('sale', 'Venta'), ('void', 'Anulación de venta'), ('purchase', 'Recepción de compra'), ('adjustment', 'Ajuste'), ('transfer_out', 'Traspaso (salida)'), ('transfer_in', 'Traspaso (entrada)')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='temusoft_app.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='temusoft_app.product')),
+                ('purchase', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='temusoft_app.purchase')),
+                ('sale', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='temusoft_app.sale')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['product', 'branch', 'created_at'], name='stockmov_prod_branch_idx'), models.Index(fields=['branch', 'created_at'], name='stockmov_branch_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('stock', models.IntegerField()),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='temusoft_app.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='temusoft_app.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'branch', 'taken_at'), name='stocksnap_prod_branch_uniq')],
+            },
+        ),
+    ]
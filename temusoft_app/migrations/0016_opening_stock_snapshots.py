@@ -0,0 +1,43 @@
+from django.db import migrations
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+
+
+def forward(apps, schema_editor):
+    """
+    Foto inicial del stock actual de cada Inventory: el libro empieza vacío,
+    así que el stock en fechas posteriores a esta migración es esta foto más
+    los movimientos que se registren desde ahora.
+    """
+    Inventory = apps.get_model('temusoft_app', 'Inventory')
+    StockSnapshot = apps.get_model('temusoft_app', 'StockSnapshot')
+    taken_at = timezone.now()
+    last_pk = 0
+    while True:
+        rows = list(
+            Inventory.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'product_id', 'branch_id', 'stock')[:CHUNK_SIZE]
+        )
+        if not rows:
+            return
+        StockSnapshot.objects.bulk_create([
+            StockSnapshot(product_id=product_id, branch_id=branch_id, taken_at=taken_at, stock=stock)
+            for _, product_id, branch_id, stock in rows
+        ])
+        last_pk = rows[-1][0]
+
+
+def backward(apps, schema_editor):
+    apps.get_model('temusoft_app', 'StockSnapshot').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('temusoft_app', '0015_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward, backward),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('temusoft_app', '0016_opening_stock_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchase',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='temusoft_app.branch'),
+        ),
+        migrations.AddField(
+            model_name='purchase',
+            name='received_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+from temusoft_app.db_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('temusoft_app', '0017_purchase_receiving'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='purchaseline',
+            index=models.Index(fields=['purchase', 'product'], name='purchline_purchase_product_idx'),
+        ),
+    ]
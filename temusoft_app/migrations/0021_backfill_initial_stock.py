@@ -0,0 +1,89 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import migrations
+from django.db.models import DateTimeField, Exists, F, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+LEDGER_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def forward(apps, schema_editor):
+    """
+    Movimiento 'initial' para las filas de Inventory que no lo tienen y cuyo
+    stock no cuadra con el libro (creadas sin pasar por services.py: la
+    importación con ignore_conflicts, fixtures o el shell). Sin él,
+    services.annotate_stock_at parte de 0 y da stock negativo.
+
+    La cantidad es la diferencia entre stock y el libro (última foto más los
+    movimientos posteriores). Se fecha con el primer movimiento de la fila (o
+    ahora, si no tiene), y las fotos tomadas desde esa fecha se corrigen en la
+    misma cantidad.
+    """
+    Inventory = apps.get_model('temusoft_app', 'Inventory')
+    StockMovement = apps.get_model('temusoft_app', 'StockMovement')
+    StockSnapshot = apps.get_model('temusoft_app', 'StockSnapshot')
+    now = timezone.now()
+    pair = {'product_id': OuterRef('product_id'), 'branch_id': OuterRef('branch_id')}
+    snapshots = StockSnapshot.objects.filter(**pair, taken_at__lte=now).order_by('-taken_at')
+    deltas = (
+        StockMovement.objects.filter(
+            **pair, created_at__lte=now,
+            created_at__gt=Coalesce(OuterRef('snapshot_at'), Value(LEDGER_EPOCH, output_field=DateTimeField())),
+        )
+        .order_by().values('product_id').annotate(total=Sum('quantity')).values('total')
+    )
+    first_movement = (
+        StockMovement.objects.filter(**pair).order_by().values('product_id')
+        .annotate(first=Min('created_at')).values('first')
+    )
+
+    last_pk = 0
+    while True:
+        ids = list(Inventory.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:CHUNK_SIZE])
+        if not ids:
+            return
+        last_pk = ids[-1]
+        rows = (
+            Inventory.objects.filter(pk__in=ids)
+            .exclude(Exists(StockMovement.objects.filter(**pair, kind='initial')))
+            .annotate(
+                snapshot_stock=Subquery(snapshots.values('stock')[:1]),
+                snapshot_at=Subquery(snapshots.values('taken_at')[:1]),
+            )
+            .annotate(ledger=Coalesce('snapshot_stock', 0) + Coalesce(Subquery(deltas), 0))
+            .exclude(stock=F('ledger'))
+            .annotate(first_at=Subquery(first_movement))
+            .values_list('product_id', 'branch_id', 'stock', 'ledger', 'first_at')
+        )
+        for product_id, branch_id, stock, ledger, first_at in rows:
+            created_at = first_at or now
+            StockMovement.objects.create(
+                product_id=product_id, branch_id=branch_id, kind='initial', quantity=stock - ledger,
+                note='Stock inicial (migración 0021)', created_at=created_at,
+            )
+            StockSnapshot.objects.filter(
+                product_id=product_id, branch_id=branch_id, taken_at__gte=created_at,
+            ).update(stock=F('stock') + stock - ledger)
+
+
+def backward(apps, schema_editor):
+    StockMovement = apps.get_model('temusoft_app', 'StockMovement')
+    StockSnapshot = apps.get_model('temusoft_app', 'StockSnapshot')
+    for movement in StockMovement.objects.filter(note='Stock inicial (migración 0021)').iterator():
+        StockSnapshot.objects.filter(
+            product_id=movement.product_id, branch_id=movement.branch_id, taken_at__gte=movement.created_at,
+        ).update(stock=F('stock') - movement.quantity)
+        movement.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('temusoft_app', '0020_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward, backward),
+    ]
@@ -0,0 +1,249 @@
+import hashlib
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import SAFE_METHODS
+
+from .db_router import end_replica_reads, start_replica_reads
+from .idempotency import idempotent
+from .models import Company
+
+
+def is_super_admin(user):
+    return getattr(user, 'is_superuser', False) or getattr(user, 'role', None) == 'super_admin'
+
+
+# -----------------------------
+# MULTI-TENANT
+# -----------------------------
+class TenantScopedMixin:
+    """
+    Limita el queryset del viewset a la company del usuario autenticado.
+
+    - `tenant_field` es el lookup hasta el id de la company
+      ('company_id', 'branch__company_id', ...). El filtro va en el SQL, así
+      que un objeto de otra empresa simplemente no existe (404) y los listados
+      solo recorren las filas del tenant.
+    - super_admin ve todo; un usuario sin company no ve nada.
+    - Al crear/actualizar se verifica que las relaciones recibidas
+      (company, branch, product, supplier...) pertenezcan a la company.
+    """
+    tenant_field = 'company_id'
+
+    def get_queryset(self):
+        return self.filter_tenant(super().get_queryset())
+
+    def filter_tenant(self, queryset, tenant_field=None):
+        """Aplica el filtro de company a cualquier queryset (por ejemplo el de líneas)."""
+        user = self.request.user
+        if is_super_admin(user):
+            return queryset
+        if not getattr(user, 'company_id', None):
+            return queryset.none()
+        return queryset.filter(**{tenant_field or self.tenant_field: user.company_id})
+
+    def check_tenant_objects(self, validated_data):
+        user = self.request.user
+        if is_super_admin(user):
+            return
+        for name, value in validated_data.items():
+            if not isinstance(value, models.Model):
+                continue
+            company_id = value.pk if isinstance(value, Company) else getattr(value, 'company_id', None)
+            if company_id is not None and company_id != user.company_id:
+                raise PermissionDenied(f"El campo '{name}' no pertenece a tu empresa.")
+
+    def perform_create(self, serializer):
+        self.check_tenant_objects(serializer.validated_data)
+        super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        self.check_tenant_objects(serializer.validated_data)
+        super().perform_update(serializer)
+
+
+# -----------------------------
+# CAMPOS DINÁMICOS (?fields= / ?expand=)
+# -----------------------------
+class SparseFieldsMixin:
+    """
+    ?fields=id,name,price y ?expand=company en los GET del viewset.
+
+    - El serializer (serializers.SparseFieldsSerializerMixin) solo devuelve los
+      campos pedidos y anida las relaciones expandidas.
+    - En `sparse_actions` el queryset se reduce a lo mismo: only() con las
+      columnas de esos campos, select_related() para las relaciones expandidas
+      y sin los prefetch que ningún campo pedido usa.
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def sparse_param(self, name):
+        value = self.request.query_params.get(name, '') if self.request is not None else ''
+        return [part.strip() for part in value.split(',') if part.strip()]
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request is not None and self.request.method == 'GET':
+            kwargs.setdefault('fields', self.sparse_param('fields'))
+            kwargs.setdefault('expand', self.sparse_param('expand'))
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if (
+            self.request is None or self.request.method != 'GET' or self.action not in self.sparse_actions
+            or not (self.sparse_param('fields') or self.sparse_param('expand'))
+        ):
+            return queryset
+        # valida los parámetros (400 si hay campos desconocidos) y resuelve los campos finales
+        return self.narrow_queryset(queryset, self.get_serializer().fields.values())
+
+    def narrow_queryset(self, queryset, serializer_fields):
+        model = queryset.model
+        columns = {model._meta.pk.name}
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        columns.update(field.lstrip('-') for field in ([ordering] if isinstance(ordering, str) else ordering))
+        relations = set()
+        joins = []
+        for field in serializer_fields:
+            if field.write_only:
+                continue
+            if not field.source_attrs:
+                return queryset  # source='*': no se sabe qué columnas usa
+            source = field.source_attrs[0]
+            try:
+                model_field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                return queryset  # propiedad o método del modelo
+            if model_field.concrete:
+                columns.add(source)
+                if model_field.is_relation and hasattr(field, 'fields'):
+                    joins.append(source)  # relación expandida (serializer anidado)
+            else:
+                relations.add(source)  # relación inversa: se sirve con prefetch
+
+        lookups = [
+            lookup for lookup in queryset._prefetch_related_lookups
+            if getattr(lookup, 'prefetch_through', lookup).split('__')[0] in relations
+        ]
+        queryset = queryset.only(*columns).prefetch_related(None).prefetch_related(*lookups)
+        return queryset.select_related(*joins) if joins else queryset
+
+
+# -----------------------------
+# GET CONDICIONAL (ETag / Last-Modified)
+# -----------------------------
+class ConditionalListMixin:
+    """
+    ETag y Last-Modified en el listado, calculados con un solo
+    SELECT max(updated_at), count(*) sobre el queryset del tenant (índices
+    (company|branch, updated_at)), sin serializar nada. Si el cliente manda
+    If-None-Match / If-Modified-Since y no hubo cambios responde 304 sin
+    cuerpo.
+
+    El 304 se decide solo con el ETag. Last-Modified se envía como dato, pero
+    If-Modified-Since no se evalúa: max(updated_at) no cambia al borrar una fila
+    y las fechas HTTP tienen resolución de un segundo, así que podría dar 304
+    con un listado que sí cambió. Un cliente que solo manda If-Modified-Since
+    recibe el 200 completo.
+
+    count detecta los borrados (que no mueven max(updated_at)); la URL completa
+    y la company entran en el ETag porque cambian el contenido (página,
+    ?fields=, ?expand=...). Con ?expand= también entra el max(updated_at) de
+    cada relación anidada; si alguna no tiene updated_at no hay validador
+    confiable y el listado se responde sin ETag.
+    """
+    updated_field = 'updated_at'
+
+    def validator_fields(self):
+        """Columnas updated_at que validan el listado, o None si no se puede validar."""
+        fields = [self.updated_field]
+        expand = self.sparse_param('expand') if hasattr(self, 'sparse_param') else []
+        for name in expand:
+            try:
+                related = self.queryset.model._meta.get_field(name).related_model
+                related._meta.get_field(self.updated_field)
+            except (AttributeError, FieldDoesNotExist):
+                return None
+            fields.append(f'{name}__{self.updated_field}')
+        return fields
+
+    def list(self, request, *args, **kwargs):
+        fields = self.validator_fields()
+        if fields is None:
+            return self.list_response(request, *args, **kwargs)
+        stats = self.filter_queryset(self.get_queryset()).order_by().aggregate(
+            count=Count('pk'), **{f'last_modified_{i}': Max(field) for i, field in enumerate(fields)},
+        )
+        last_modified = max(
+            (stats[f'last_modified_{i}'] for i in range(len(fields)) if stats[f'last_modified_{i}']), default=None,
+        )
+        digest = hashlib.md5('|'.join(map(str, (
+            self.queryset.model._meta.label, getattr(request.user, 'company_id', None),
+            request.get_full_path(), stats['count'], last_modified and last_modified.isoformat(),
+        ))).encode()).hexdigest()
+        etag = quote_etag(digest)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        # sin last_modified: ver el docstring (RFC 9110 §13.1.3, el ETag manda)
+        response = get_conditional_response(request._request, etag=etag)
+        if response is None:
+            response = self.list_response(request, *args, **kwargs)
+        if 200 <= response.status_code < 300 or response.status_code == 304:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            # cada cliente revalida siempre; el contenido depende del token
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list_response(self, request, *args, **kwargs):
+        """Respuesta 200 del listado; los viewsets pueden sobrescribirla (p. ej. para cachearla)."""
+        return super().list(request, *args, **kwargs)
+
+
+# -----------------------------
+# LECTURAS DESDE RÉPLICAS
+# -----------------------------
+class ReplicaReadMixin:
+    """
+    Las acciones GET de `replica_actions` leen desde una réplica
+    (db_router.ReplicaRouter), salvo que la request esté fijada al primario
+    por una escritura reciente del cliente. La autenticación y los permisos
+    (initial) siguen leyendo del primario.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and self.action in self.replica_actions:
+            self._replica_token = start_replica_reads()
+
+    def dispatch(self, request, *args, **kwargs):
+        # en un finally: si la vista lanza una excepción que DRF no maneja, el
+        # hilo (o la tarea) no debe seguir leyendo de réplicas en la próxima request
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            token = self.__dict__.pop('_replica_token', None)
+            if token is not None:
+                end_replica_reads(token)
+
+
+# -----------------------------
+# IDEMPOTENCY-KEY
+# -----------------------------
+class IdempotentCreateMixin:
+    """
+    POST de creación con header Idempotency-Key opcional (idempotency.py): un
+    reintento con la misma clave devuelve la respuesta original sin crear
+    otro objeto. Las acciones POST adicionales se decoran con @idempotent.
+    """
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
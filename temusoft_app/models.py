@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 
 class Company(models.Model):
@@ -31,6 +32,11 @@ class User(AbstractUser):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['company', 'role'], name='user_company_role_idx'),
+        ]
+
     def clean(self):
         #mValidaciones según el rol del usuario
         if self.role == 'super_admin' and self.company is not None:
@@ -62,6 +68,12 @@ class Branch(models.Model):
     name = models.CharField(max_length=200)
     address = models.CharField(max_length=300)
     phone = models.CharField(max_length=30, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # validador de GET condicional (ETag / Last-Modified)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'updated_at'], name='branch_company_updated_idx'),
+        ]
 
 class Supplier(models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='suppliers')
@@ -71,30 +83,250 @@ class Supplier(models.Model):
 
 class Product(models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='products')
-    sku = models.CharField(max_length=100, unique=True)
+    sku = models.CharField(max_length=100)  # único por company (ver Meta)
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=12, decimal_places=2)
     cost = models.DecimalField(max_digits=12, decimal_places=2)
     category = models.CharField(max_length=100, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # validador de GET condicional (ETag / Last-Modified)
+
+    class Meta:
+        indexes = [
+            # listados por tenant paginados por id
+            models.Index(fields=['company', 'id'], name='product_company_id_idx'),
+            # max(updated_at) por company para el ETag del catálogo
+            models.Index(fields=['company', 'updated_at'], name='product_company_updated_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'sku'], name='product_company_sku_uniq'),
+        ]
 
 class Inventory(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
     stock = models.IntegerField(default=0)
     reorder_point = models.IntegerField(default=0)
+    # auto_now no aplica a QuerySet.update(): services.py lo asigna al mover stock
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['branch', 'id'], name='inventory_branch_id_idx'),
+            models.Index(fields=['branch', 'updated_at'], name='inventory_branch_updated_idx'),
+            # índice parcial: solo las filas bajo el punto de reorden; la base de
+            # datos lo mantiene al cambiar el stock (ver InventoryViewSet.low_stock)
+            models.Index(
+                fields=['branch', 'product'],
+                condition=models.Q(stock__lte=models.F('reorder_point')),
+                name='inventory_low_stock_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'branch'], name='inventory_product_branch_uniq'),
+        ]
 
 class Purchase(models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE)
     supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True)
     date = models.DateField(default=timezone.now)
-    items = models.JSONField()  # para rapidez: list of {sku, qty, price}
+    # obsoleto: las líneas están en PurchaseLine. Queda (vacío en las compras
+    # nuevas) solo para poder volver a la versión anterior; se elimina en la próxima
+    items = models.JSONField(null=True, blank=True, editable=False)
+    # recepción (services.receive_purchase): sucursal que recibió la mercadería
+    branch = models.ForeignKey(Branch, on_delete=models.SET_NULL, null=True, blank=True)
+    received_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'date'], name='purchase_company_date_idx'),
+        ]
 
 class Sale(models.Model):
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
     user = models.ForeignKey('User', on_delete=models.SET_NULL, null=True)
-    items = models.JSONField()
+    items = models.JSONField(null=True, blank=True, editable=False)  # obsoleto, ver Purchase.items
     total = models.DecimalField(max_digits=12, decimal_places=2)
     payment_method = models.CharField(max_length=50)
     created_at = models.DateTimeField(auto_now_add=True)
+    voided_at = models.DateTimeField(null=True, blank=True)  # venta anulada (stock devuelto)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='sale_created_at_idx'),  # orden del listado paginado
+            models.Index(fields=['branch', 'created_at'], name='sale_branch_created_idx'),
+        ]
+
+
+class SaleLine(models.Model):
+    sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='lines')
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)  # copia de sale.branch para reportes por sucursal
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
+    sku = models.CharField(max_length=100)  # se conserva aunque el producto se elimine
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=12, decimal_places=2)
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=2)  # costo del producto al momento de la venta
+    created_at = models.DateTimeField(default=timezone.now)  # copia de sale.created_at
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='saleline_product_created_idx'),
+            models.Index(fields=['branch', 'created_at'], name='saleline_branch_created_idx'),
+        ]
+
+class PurchaseLine(models.Model):
+    purchase = models.ForeignKey(Purchase, on_delete=models.CASCADE, related_name='lines')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE)  # copia de purchase.company
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
+    sku = models.CharField(max_length=100)
+    quantity = models.PositiveIntegerField()
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=2)  # precio pagado al proveedor
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='purchline_product_created_idx'),
+            models.Index(fields=['company', 'created_at'], name='purchline_company_created_idx'),
+            # sumas por producto de una compra al recibirla (services.receive_purchase)
+            models.Index(fields=['purchase', 'product'], name='purchline_purchase_product_idx'),
+        ]
+
+class DailySalesRollup(models.Model):
+    """
+    Resumen diario de ventas por (sucursal, producto, día local). Se mantiene
+    de forma incremental al registrar o anular ventas (services.apply_sales_rollup)
+    y se puede reconstruir con `manage.py rebuild_sales_rollup`.
+    """
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    day = models.DateField()
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # también sirve de índice para rangos de fechas por sucursal
+            models.UniqueConstraint(fields=['branch', 'day', 'product'], name='rollup_branch_day_product_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'day'], name='rollup_product_day_idx'),
+        ]
+
+class StockMovement(models.Model):
+    """
+    Libro de movimientos de stock (solo inserciones). Cada cambio de
+    Inventory.stock que hace services.py deja aquí su delta con signo, de modo
+    que el stock en cualquier fecha es la foto (StockSnapshot) anterior más
+    la suma de los movimientos posteriores (services.annotate_stock_at).
+    """
+    KIND_CHOICES = (
+        ('initial', 'Stock inicial'),
+        ('sale', 'Venta'),
+        ('void', 'Anulación de venta'),
+        ('purchase', 'Recepción de compra'),
+        ('adjustment', 'Ajuste'),
+        ('transfer_out', 'Traspaso (salida)'),
+        ('transfer_in', 'Traspaso (entrada)'),
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField()  # delta: negativo = salida
+    sale = models.ForeignKey(Sale, on_delete=models.SET_NULL, null=True, blank=True)
+    purchase = models.ForeignKey(Purchase, on_delete=models.SET_NULL, null=True, blank=True)
+    user = models.ForeignKey('User', on_delete=models.SET_NULL, null=True, blank=True)
+    note = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # suma acotada de deltas entre la última foto y la fecha pedida
+            models.Index(fields=['product', 'branch', 'created_at'], name='stockmov_prod_branch_idx'),
+            models.Index(fields=['branch', 'created_at'], name='stockmov_branch_created_idx'),
+        ]
+
+class StockSnapshot(models.Model):
+    """
+    Foto del stock de un (producto, sucursal) en `taken_at`, calculada desde
+    el libro por `manage.py compact_stock_ledger`. Acota cuántos movimientos
+    hay que sumar para conocer el stock en una fecha.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    taken_at = models.DateTimeField()
+    stock = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            # también sirve de índice para "la última foto antes de X"
+            models.UniqueConstraint(fields=['product', 'branch', 'taken_at'], name='stocksnap_prod_branch_uniq'),
+        ]
+
+class IdempotencyKey(models.Model):
+    """
+    Header Idempotency-Key de un POST (ver idempotency.py). La fila se inserta
+    en la transacción que procesa la request (la restricción única hace de
+    candado entre reintentos simultáneos) y guarda la respuesta exitosa para
+    repetirla.
+    Se borra al vencer (`manage.py purge_idempotency_keys`).
+    """
+    user = models.ForeignKey('User', on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)  # método, ruta y cuerpo: la clave no se reutiliza con otro request
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # None = en proceso
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    locked_at = models.DateTimeField(default=timezone.now)  # inicio de la request
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='idemkey_expires_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idemkey_user_key_uniq'),
+        ]
+
+
+class Job(models.Model):
+    """
+    Trabajo en segundo plano (exportaciones, importaciones, auditorías...).
+    Lo encola la API (/api/jobs/), lo ejecuta `manage.py run_workers` y los
+    tipos disponibles están registrados en jobs.py.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'En cola'),
+        ('running', 'En ejecución'),
+        ('succeeded', 'Terminado'),
+        ('failed', 'Fallido'),
+        ('cancelled', 'Cancelado'),
+    )
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, null=True, blank=True)  # None = super_admin
+    user = models.ForeignKey('User', on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0)  # 0-100
+    progress_message = models.CharField(max_length=200, blank=True)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    result_file = models.CharField(max_length=255, blank=True)  # nombre dentro de settings.JOB_FILES_DIR
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    cancel_requested = models.BooleanField(default=False)
+    run_after = models.DateTimeField(default=timezone.now)  # reintentos con espera
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # la cola: trabajos pendientes por orden de llegada (y los "running" sin heartbeat)
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+            models.Index(fields=['company', 'id'], name='job_company_id_idx'),
+        ]
@@ -0,0 +1,29 @@
+from rest_framework.pagination import CursorPagination
+
+
+class DefaultCursorPagination(CursorPagination):
+    """
+    Paginación keyset (cursor opaco) para todos los listados.
+
+    La página siguiente se pide con `WHERE id > <último id> ORDER BY id LIMIT n`,
+    así que una página profunda cuesta lo mismo que la primera (no hay OFFSET).
+    El tamaño de página se puede ajustar con ?page_size= hasta max_page_size.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class SaleCursorPagination(DefaultCursorPagination):
+    """
+    Ventas más recientes primero, usando el índice sobre created_at. El
+    cursor de DRF guarda solo el primer campo del ordering (created_at) más
+    un offset para las ventas con el mismo created_at; '-id' únicamente fija
+    el orden dentro de esos empates.
+    """
+    ordering = ('-created_at', '-id')
+
+
+class JobCursorPagination(DefaultCursorPagination):
+    """Trabajos más recientes primero."""
+    ordering = '-id'
@@ -22,4 +22,24 @@ class IsSelfOrSuperAdmin(BasePermission):
             return False
         if request.user.role == 'super_admin':
             return True
-        return obj.pk == request.user.pk
\ No newline at end of file
+        return obj.pk == request.user.pk
+
+class IsManagerOrAbove(BasePermission):
+    """
+    Permite acceso a reportes: super_admin, admin_cliente y gerente.
+    """
+    def has_permission(self, request, view):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        return user.is_superuser or user.role in ('super_admin', 'admin_cliente', 'gerente')
+
+class IsSuperAdmin(BasePermission):
+    """
+    Solo super_admin (endpoints internos como /api/_metrics/).
+    """
+    def has_permission(self, request, view):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        return user.is_superuser or user.role == 'super_admin'
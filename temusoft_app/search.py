@@ -0,0 +1,120 @@
+import bisect
+import re
+import threading
+from collections import OrderedDict
+
+from django.db import connection
+from django.db.models import Case, F, FloatField, Func, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .cache import catalog_version
+from .models import Product
+
+# -----------------------------
+# BÚSQUEDA DE PRODUCTOS
+# -----------------------------
+# En PostgreSQL se usan los índices GIN trigram sobre UPPER(name/sku/category)
+# (migración 0012), que atienden los filtros icontains/istartswith, y se ordena
+# por similitud trigram. En otros motores (SQLite en tests y desarrollo) se
+# usa un índice de prefijos en memoria por company, reconstruido cuando cambia
+# la versión del catálogo (cache.catalog_version).
+
+
+class Similarity(Func):
+    function = 'SIMILARITY'
+    output_field = FloatField()
+
+
+def search_products(queryset, q, limit, company_id=None):
+    """Devuelve hasta `limit` productos del queryset que coinciden con `q`, ordenados por relevancia."""
+    q = q.strip()
+    if not q:
+        return []
+    if connection.vendor == 'postgresql':
+        return list(_trigram_search(queryset, q)[:limit])
+    if company_id is None:
+        return list(queryset.filter(Q(sku__istartswith=q) | Q(name__icontains=q)).order_by('sku')[:limit])
+    ids = _prefix_index(company_id).search(q, limit)
+    products = queryset.in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
+
+
+def _trigram_search(queryset, q):
+    value = Value(q)
+    return (
+        queryset.filter(Q(name__icontains=q) | Q(sku__icontains=q) | Q(category__icontains=q))
+        .annotate(rank=Greatest(
+            Similarity(F('sku'), value),
+            Similarity(F('name'), value),
+            Similarity(F('category'), value) * 0.5,
+        ) + Case(
+            When(sku__iexact=q, then=Value(2.0)),
+            When(sku__istartswith=q, then=Value(1.0)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ))
+        .order_by('-rank', 'id')
+    )
+
+
+# -----------------------------
+# ÍNDICE DE PREFIJOS EN MEMORIA
+# -----------------------------
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# peso de cada tipo de coincidencia
+SKU_EXACT, SKU_PREFIX, NAME_PREFIX, CATEGORY_PREFIX = 4.0, 3.0, 2.0, 1.0
+
+
+class PrefixIndex:
+    """
+    Lista ordenada de (token, peso, product_id). Una búsqueda es un bisect al
+    primer token >= q y un recorrido mientras el token empiece con q.
+    """
+
+    def __init__(self, rows):
+        entries = []
+        for pk, sku, name, category in rows:
+            entries.append((sku.lower(), SKU_PREFIX, pk))
+            entries.extend((word, NAME_PREFIX, pk) for word in WORD_RE.findall(name.lower()))
+            entries.extend((word, CATEGORY_PREFIX, pk) for word in WORD_RE.findall(category.lower()))
+        entries.sort()
+        self.tokens = [token for token, _, _ in entries]
+        self.entries = entries
+
+    def search(self, q, limit):
+        q = q.lower()
+        scores = {}
+        position = bisect.bisect_left(self.tokens, q)
+        while position < len(self.entries) and self.tokens[position].startswith(q):
+            token, weight, pk = self.entries[position]
+            if weight == SKU_PREFIX and token == q:
+                weight = SKU_EXACT
+            scores[pk] = max(scores.get(pk, 0), weight)
+            position += 1
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [pk for pk, _ in ranked[:limit]]
+
+
+PREFIX_INDEX_MAX_COMPANIES = 32
+_prefix_indexes = OrderedDict()
+_prefix_lock = threading.Lock()
+
+
+def _prefix_index(company_id):
+    """Índice de la company para la versión actual del catálogo (LRU acotado por company)."""
+    version = catalog_version(company_id)
+    with _prefix_lock:
+        cached = _prefix_indexes.get(company_id)
+        if cached is not None and cached[0] == version:
+            _prefix_indexes.move_to_end(company_id)
+            return cached[1]
+
+    rows = Product.objects.filter(company_id=company_id).values_list('pk', 'sku', 'name', 'category')
+    index = PrefixIndex(rows.iterator(chunk_size=2000))
+    with _prefix_lock:
+        _prefix_indexes[company_id] = (version, index)
+        _prefix_indexes.move_to_end(company_id)
+        while len(_prefix_indexes) > PREFIX_INDEX_MAX_COMPANIES:
+            _prefix_indexes.popitem(last=False)
+    return index
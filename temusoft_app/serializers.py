@@ -1,14 +1,57 @@
 from rest_framework import serializers
-from .models import User, Product, Branch, Inventory, Supplier, Sale, Purchase, Company
+from rest_framework.exceptions import ValidationError
+from .models import User, Product, Branch, Inventory, Supplier, Sale, Purchase, Company, Job
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from .services import create_purchase, post_sale, set_purchase_lines
+from .audit import AUDIT_CHUNK_SIZE, AUDIT_WORKERS, CHECK_CODES
+from .exports import EXPORT_FORMATS
+from .imports import IMPORT_FORMATS
+from .mixins import is_super_admin
 
 # -----------------------------
-# SERIALIZADOR USER
+# CAMPOS DINÁMICOS (?fields= / ?expand=)
 # -----------------------------
+class SparseFieldsSerializerMixin:
+    """
+    Acepta `fields` (campos a devolver) y `expand` (relaciones a anidar, de
+    las declaradas en `expandable_fields`) al construir el serializer. Los
+    viewsets los toman de ?fields= y ?expand= en los GET (mixins.SparseFieldsMixin).
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in expand or ():
+            if name not in self.expandable_fields:
+                options = ', '.join(self.expandable_fields) or 'ninguna'
+                raise ValidationError({'expand': [f"No se puede expandir '{name}'. Opciones: {options}."]})
+            self.fields[name] = self.expandable_fields[name](read_only=True)
+        if fields:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise ValidationError({'fields': [f"Campos desconocidos: {', '.join(sorted(unknown))}."]})
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 User = get_user_model()
 Company = User._meta.get_field('company').related_model  # referencia dinámica al modelo Company
 
-class UserSerializer(serializers.ModelSerializer):
+# -----------------------------
+# SERIALIZADOR COMPANY
+# (antes que UserSerializer, que lo usa para ?expand=company)
+# -----------------------------
+class CompanySerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Company
+        fields = ['id', 'name', 'rut', 'created_at']
+
+# -----------------------------
+# SERIALIZADOR USER
+# -----------------------------
+class UserSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'company': CompanySerializer}
+
     password = serializers.CharField(write_only=True, required=True, min_length=8)
     company = serializers.PrimaryKeyRelatedField(
         queryset=Company.objects.all(),
@@ -65,18 +108,12 @@ class UserSerializer(serializers.ModelSerializer):
             user.save()
         return user
 
-# -----------------------------
-# SERIALIZADOR COMPANY
-class CompanySerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Company
-        fields = ['id', 'name', 'rut', 'created_at']
-
-
 # -----------------------------
 # SERIALIZADOR PRODUCT
 # -----------------------------
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'company': CompanySerializer}
+
     class Meta:
         model = Product
         fields = '__all__'
@@ -84,7 +121,9 @@ class ProductSerializer(serializers.ModelSerializer):
 # -----------------------------
 # SERIALIZADOR BRANCH
 # -----------------------------
-class BranchSerializer(serializers.ModelSerializer):
+class BranchSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'company': CompanySerializer}
+
     class Meta:
         model = Branch
         fields = '__all__'
@@ -92,15 +131,44 @@ class BranchSerializer(serializers.ModelSerializer):
 # -----------------------------
 # SERIALIZADOR INVENTORY
 # -----------------------------
-class InventorySerializer(serializers.ModelSerializer):
+class InventorySerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'product': ProductSerializer, 'branch': BranchSerializer}
+
     class Meta:
         model = Inventory
         fields = '__all__'
 
+
+class StockAdjustmentSerializer(serializers.Serializer):
+    """Cuerpo de /api/inventory/{id}/adjust/: stock final o delta, uno de los dos."""
+    stock = serializers.IntegerField(min_value=0, required=False)
+    delta = serializers.IntegerField(required=False)
+    note = serializers.CharField(max_length=200, required=False, allow_blank=True, default='')
+
+    def validate(self, data):
+        if ('stock' in data) == ('delta' in data):
+            raise serializers.ValidationError("Indica `stock` o `delta` (solo uno).")
+        return data
+
+
+class StockTransferItemSerializer(serializers.Serializer):
+    sku = serializers.CharField(max_length=100)
+    qty = serializers.IntegerField(min_value=1, source='quantity')
+
+
+class StockTransferSerializer(serializers.Serializer):
+    """Cuerpo de /api/inventory/transfer/."""
+    from_branch = serializers.PrimaryKeyRelatedField(queryset=Branch.objects.all())
+    to_branch = serializers.PrimaryKeyRelatedField(queryset=Branch.objects.all())
+    items = StockTransferItemSerializer(many=True, allow_empty=False)
+    note = serializers.CharField(max_length=200, required=False, allow_blank=True, default='')
+
 # -----------------------------
 # SERIALIZADOR SUPPLIER
 # -----------------------------
-class SupplierSerializer(serializers.ModelSerializer):
+class SupplierSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'company': CompanySerializer}
+
     class Meta:
         model = Supplier
         fields = '__all__'
@@ -108,15 +176,157 @@ class SupplierSerializer(serializers.ModelSerializer):
 # -----------------------------
 # SERIALIZADOR SALE
 # -----------------------------
-class SaleSerializer(serializers.ModelSerializer):
+class SaleItemSerializer(serializers.Serializer):
+    """Línea de venta; mantiene el formato {sku, qty, price} del antiguo JSON `items`."""
+    sku = serializers.CharField(max_length=100)
+    qty = serializers.IntegerField(min_value=1, source='quantity')
+    price = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=0, required=False, source='unit_price')
+
+
+class SaleSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'branch': BranchSerializer, 'user': UserSerializer}
+    items = SaleItemSerializer(many=True, allow_empty=False, source='lines')
+
     class Meta:
         model = Sale
         fields = '__all__'
+        read_only_fields = ['total', 'user', 'voided_at']
+
+    def create(self, validated_data):
+        """
+        La venta se registra a través de services.post_sale, que valida el
+        carrito contra el inventario de la sucursal y descuenta el stock.
+        """
+        return post_sale(
+            branch=validated_data['branch'],
+            items=validated_data['lines'],
+            user=validated_data.get('user'),
+            payment_method=validated_data.get('payment_method', ''),
+        )
+
+    def update(self, instance, validated_data):
+        # el stock ya se descontó al registrar la venta; no se permite cambiar el carrito
+        if 'lines' in validated_data or 'branch' in validated_data:
+            raise serializers.ValidationError("No se pueden modificar los items ni la sucursal de una venta.")
+        return super().update(instance, validated_data)
+
+class SaleBatchRowSerializer(serializers.Serializer):
+    """
+    Fila de /api/sales/batch/. Solo valida la forma (sin consultas); la
+    sucursal y los SKU se resuelven para todo el lote en services.post_sales_batch.
+    """
+    branch = serializers.IntegerField(min_value=1)
+    payment_method = serializers.CharField(max_length=50, required=False, allow_blank=True, default='')
+    items = SaleItemSerializer(many=True, allow_empty=False, source='lines')
 
 # -----------------------------
 # SERIALIZADOR PURCHASE
 # -----------------------------
-class PurchaseSerializer(serializers.ModelSerializer):
+class PurchaseItemSerializer(serializers.Serializer):
+    """Línea de compra; mantiene el formato {sku, qty, price} del antiguo JSON `items`."""
+    sku = serializers.CharField(max_length=100)
+    qty = serializers.IntegerField(min_value=1, source='quantity')
+    price = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=0, source='unit_cost')
+
+
+class PurchaseSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'company': CompanySerializer, 'supplier': SupplierSerializer, 'branch': BranchSerializer}
+    items = PurchaseItemSerializer(many=True, allow_empty=False, source='lines')
+
     class Meta:
         model = Purchase
         fields = '__all__'
+        read_only_fields = ('branch', 'received_at')  # los fija la recepción (/receive/)
+
+    def create(self, validated_data):
+        items = validated_data.pop('lines')
+        return create_purchase(items, **validated_data)
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        items = validated_data.pop('lines', None)
+        if items is not None and instance.received_at:
+            raise ValidationError({'items': ["La compra ya fue recibida; sus líneas no se pueden modificar."]})
+        instance = super().update(instance, validated_data)
+        if items is not None:
+            set_purchase_lines(instance, items)
+        return instance
+
+
+class PurchaseReceiveSerializer(serializers.Serializer):
+    branch = serializers.PrimaryKeyRelatedField(queryset=Branch.objects.all())
+
+# -----------------------------
+# SERIALIZADOR JOB
+# -----------------------------
+class JobSerializer(serializers.ModelSerializer):
+    """
+    Trabajo en segundo plano. Al crearlo solo se indican `kind` y `params`;
+    los params se validan con el serializer del tipo (ver jobs.py).
+    """
+    params = serializers.DictField(required=False, default=dict)
+
+    class Meta:
+        model = Job
+        fields = (
+            'id', 'kind', 'params', 'company', 'user', 'status', 'progress', 'progress_message', 'result',
+            'error', 'attempts', 'max_attempts', 'cancel_requested', 'run_after', 'created_at', 'started_at',
+            'finished_at',
+        )
+        read_only_fields = tuple(name for name in fields if name not in ('kind', 'params'))
+
+
+class ExportJobParamsSerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=EXPORT_FORMATS, default='csv')
+    date_from = serializers.DateField(required=False, allow_null=True)
+    date_to = serializers.DateField(required=False, allow_null=True)
+
+
+class SaleExportJobParamsSerializer(ExportJobParamsSerializer):
+    """Params de 'export_sales' (los mismos filtros que /api/sales/export/)."""
+    branch = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+
+
+class PurchaseExportJobParamsSerializer(ExportJobParamsSerializer):
+    """Params de 'export_purchases' (los mismos filtros que /api/purchases/export/)."""
+    supplier = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+
+
+class ProductImportJobParamsSerializer(serializers.Serializer):
+    """
+    Params de 'import_products'; super_admin debe indicar la company. El
+    archivo lo guarda /api/products/import/?background=1 y llega por el
+    contexto (`upload` = (nombre, formato)): un cliente no puede elegir qué
+    archivo del servidor se importa.
+    """
+    company = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    products = serializers.ListField(child=serializers.DictField(), allow_empty=False, required=False)
+    upload = serializers.CharField(read_only=True)
+    fmt = serializers.ChoiceField(choices=IMPORT_FORMATS, read_only=True)
+
+    def validate(self, data):
+        if is_super_admin(self.context['request'].user):
+            if not data.get('company') or not Company.objects.filter(pk=data['company']).exists():
+                raise ValidationError({'company': ["Indica una company válida."]})
+        else:
+            data['company'] = None  # se usa la company del usuario
+        upload = self.context.get('upload')
+        if upload is not None:
+            data['upload'], data['fmt'] = upload
+        elif 'products' not in data:
+            raise ValidationError({'products': ["Este campo es requerido."]})
+        return data
+
+
+class AuditJobParamsSerializer(serializers.Serializer):
+    """Params de 'audit' (las mismas opciones que manage.py auditar)."""
+    checks = serializers.ListField(child=serializers.ChoiceField(choices=CHECK_CODES), required=False)
+    chunk_size = serializers.IntegerField(min_value=1, default=AUDIT_CHUNK_SIZE)
+    workers = serializers.IntegerField(min_value=1, max_value=16, default=AUDIT_WORKERS)
+
+
+class SalesRollupJobParamsSerializer(serializers.Serializer):
+    """Params de 'rebuild_sales_rollup' (las mismas opciones que el comando)."""
+    date_from = serializers.DateField(required=False, allow_null=True)
+    date_to = serializers.DateField(required=False, allow_null=True)
+    window_days = serializers.IntegerField(min_value=1, default=7)
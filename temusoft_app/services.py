@@ -0,0 +1,576 @@
+from collections import OrderedDict
+from datetime import datetime, time, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import (
+    Case, DateTimeField, DecimalField, ExpressionWrapper, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Greatest, Round
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .cache import bump_catalog_version
+from .models import (
+    Branch, DailySalesRollup, Inventory, Product, Purchase, PurchaseLine, Sale, SaleLine,
+    StockMovement, StockSnapshot,
+)
+
+
+# -----------------------------
+# STOCK
+# -----------------------------
+def decrement_stock(demand):
+    """
+    Descuenta stock de varias filas de Inventory en un solo UPDATE.
+
+    `demand` es un dict {inventory_id: cantidad}. Cada fila solo se actualiza
+    si tiene stock suficiente (condición en el WHERE), así que no hay lectura
+    previa ni bloqueo en Python: la base de datos serializa las cajas que
+    tocan la misma fila. Si alguna fila no alcanza se lanza ValidationError
+    con los SKU faltantes; debe llamarse dentro de transaction.atomic() para
+    que el error deshaga también las filas que sí se descontaron.
+    """
+    if not demand:
+        return
+    condition = Q()
+    whens = []
+    for inventory_id, qty in demand.items():
+        condition |= Q(pk=inventory_id, stock__gte=qty)
+        whens.append(When(pk=inventory_id, then=F('stock') - qty))
+
+    now = timezone.now()
+    updated = Inventory.objects.filter(condition).update(stock=Case(*whens, default=F('stock')), updated_at=now)
+    if updated != len(demand):
+        # las filas descontadas quedaron con updated_at=now (y bloqueadas por
+        # esta transacción): el detalle sale solo de las que el UPDATE saltó
+        short = (
+            Inventory.objects.filter(pk__in=demand.keys()).exclude(updated_at=now)
+            .values_list('pk', 'product__sku', 'stock')
+        )
+        detail = [f"{sku} (stock {stock}, pedido {demand[pk]})" for pk, sku, stock in short]
+        raise ValidationError({'items': [f"Stock insuficiente: {', '.join(detail)}."]})
+
+
+def increment_stock(supply):
+    """
+    Suma stock a varias filas de Inventory en un solo UPDATE.
+    `supply` es un dict {inventory_id: cantidad}.
+    """
+    if not supply:
+        return
+    whens = [When(pk=inventory_id, then=F('stock') + qty) for inventory_id, qty in supply.items()]
+    Inventory.objects.filter(pk__in=supply.keys()).update(
+        stock=Case(*whens, default=F('stock')), updated_at=timezone.now(),
+    )
+
+
+# -----------------------------
+# LIBRO DE MOVIMIENTOS DE STOCK
+# -----------------------------
+LEDGER_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def record_movements(movements):
+    """
+    Inserta los StockMovement (omitiendo deltas en cero) con un bulk_create.
+    Se llama dentro de la misma transacción que cambia Inventory.stock.
+    """
+    StockMovement.objects.bulk_create([m for m in movements if m.quantity], batch_size=1000)
+
+
+def sale_movements(lines, kind, sign, user=None, created_at=None):
+    """Movimientos de las líneas de una venta (sign=-1 al vender, +1 al anular)."""
+    return [
+        StockMovement(
+            product_id=line.product_id, branch_id=line.branch_id, kind=kind, quantity=sign * line.quantity,
+            sale_id=line.sale_id, user=user, created_at=created_at or line.created_at,
+        )
+        for line in lines
+        if line.product_id is not None
+    ]
+
+
+def annotate_stock_at(inventory_qs, at):
+    """
+    Anota `stock_at` (stock a la fecha `at`) en un queryset de Inventory
+    (además de snapshot_stock, snapshot_at y ledger_delta):
+    la última StockSnapshot con taken_at <= at más la suma de los movimientos
+    entre esa foto y `at`. Ambas subconsultas usan índices que empiezan por
+    (product, branch), así que el costo por fila depende de los movimientos
+    desde la última foto y no del tamaño total del libro.
+    """
+    snapshots = StockSnapshot.objects.filter(
+        product_id=OuterRef('product_id'), branch_id=OuterRef('branch_id'), taken_at__lte=at,
+    ).order_by('-taken_at')
+    inventory_qs = inventory_qs.annotate(
+        snapshot_stock=Subquery(snapshots.values('stock')[:1]),
+        snapshot_at=Subquery(snapshots.values('taken_at')[:1]),
+    )
+    deltas = (
+        StockMovement.objects.filter(
+            product_id=OuterRef('product_id'), branch_id=OuterRef('branch_id'), created_at__lte=at,
+            created_at__gt=Coalesce(OuterRef('snapshot_at'), Value(LEDGER_EPOCH, output_field=DateTimeField())),
+        )
+        .order_by()
+        .values('product_id')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return inventory_qs.annotate(ledger_delta=Coalesce(Subquery(deltas), 0)).annotate(
+        stock_at=Coalesce('snapshot_stock', 0) + F('ledger_delta'),
+    )
+
+
+def adjust_stock(inventory, stock=None, delta=None, user=None, note=''):
+    """
+    Ajuste manual (conteo físico, merma...): fija el stock en `stock` o le
+    suma `delta`, y deja el movimiento 'adjustment' en el libro. La fila se
+    bloquea para que el delta registrado sea exacto aunque haya ventas en curso.
+    """
+    with transaction.atomic():
+        current = Inventory.objects.select_for_update().values_list('stock', flat=True).get(pk=inventory.pk)
+        if stock is not None:
+            delta = stock - current
+        if current + delta < 0:
+            raise ValidationError({'stock': [f"El stock no puede quedar negativo (actual {current})."]})
+        now = timezone.now()
+        Inventory.objects.filter(pk=inventory.pk).update(stock=F('stock') + delta, updated_at=now)
+        record_movements([StockMovement(
+            product_id=inventory.product_id, branch_id=inventory.branch_id, kind='adjustment',
+            quantity=delta, user=user, note=note, created_at=now,
+        )])
+    inventory.stock = current + delta
+    inventory.updated_at = now
+    return inventory
+
+
+def record_initial_stock(inventories, user=None):
+    """Movimiento 'initial' para filas de Inventory recién creadas con stock."""
+    record_movements(
+        StockMovement(
+            product_id=inventory.product_id, branch_id=inventory.branch_id, kind='initial',
+            quantity=inventory.stock, user=user,
+        )
+        for inventory in inventories
+    )
+
+
+def transfer_stock(source, target, items, user=None, note=''):
+    """
+    Traspasa stock entre dos sucursales de la misma company. `items` son dicts
+    {sku, quantity}. Descuenta del origen con la misma condición de stock
+    suficiente que una venta, crea las filas de Inventory que falten en el
+    destino y registra los pares transfer_out / transfer_in.
+    """
+    if source.company_id != target.company_id:
+        raise ValidationError({'to_branch': ["Las sucursales deben ser de la misma empresa."]})
+    if source.pk == target.pk:
+        raise ValidationError({'to_branch': ["La sucursal de destino debe ser distinta a la de origen."]})
+    cart = aggregate_items(items)
+    if not cart:
+        raise ValidationError({'items': ["El traspaso debe tener al menos un item."]})
+
+    with transaction.atomic():
+        rows = dict(
+            (sku, (pk, product_id))
+            for pk, product_id, sku in Inventory.objects.filter(
+                branch=source, product__company_id=source.company_id, product__sku__in=cart.keys(),
+            ).values_list('pk', 'product_id', 'product__sku')
+        )
+        missing = [sku for sku in cart if sku not in rows]
+        if missing:
+            raise ValidationError({'items': [f"SKU sin inventario en la sucursal de origen: {', '.join(missing)}."]})
+        decrement_stock({rows[sku][0]: line['quantity'] for sku, line in cart.items()})
+
+        product_ids = {rows[sku][1]: line['quantity'] for sku, line in cart.items()}
+        Inventory.objects.bulk_create(
+            [Inventory(product_id=product_id, branch=target, stock=0) for product_id in product_ids],
+            ignore_conflicts=True,
+        )
+        target_ids = dict(
+            Inventory.objects.filter(branch=target, product_id__in=product_ids).values_list('product_id', 'pk')
+        )
+        increment_stock({target_ids[product_id]: qty for product_id, qty in product_ids.items()})
+
+        now = timezone.now()
+        movements = []
+        for product_id, qty in product_ids.items():
+            for branch, kind, sign in ((source, 'transfer_out', -1), (target, 'transfer_in', 1)):
+                movements.append(StockMovement(
+                    product_id=product_id, branch=branch, kind=kind, quantity=sign * qty,
+                    user=user, note=note, created_at=now,
+                ))
+        record_movements(movements)
+    return [{'sku': sku, 'quantity': line['quantity']} for sku, line in cart.items()]
+
+
+# -----------------------------
+# RESUMEN DIARIO DE VENTAS
+# -----------------------------
+ROLLUP_CHUNK_SIZE = 500
+
+
+def apply_sales_rollup(lines, sign=1):
+    """
+    Suma (sign=1) o resta (sign=-1) líneas de venta en DailySalesRollup.
+
+    Las líneas se agrupan en memoria por (sucursal, producto, día local) y se
+    aplican con un INSERT ... ON CONFLICT DO UPDATE que incrementa los
+    acumulados en la base de datos (PostgreSQL y SQLite lo soportan), así que
+    dos cajas que venden el mismo producto el mismo día no se pisan.
+    Las líneas sin producto (históricas) no se resumen.
+    """
+    totals = {}
+    for line in lines:
+        if line.product_id is None:
+            continue
+        key = (line.branch_id, timezone.localdate(line.created_at), line.product_id)
+        units, revenue, cost = totals.get(key, (0, Decimal('0'), Decimal('0')))
+        totals[key] = (
+            units + sign * line.quantity,
+            revenue + sign * line.quantity * line.unit_price,
+            cost + sign * line.quantity * line.unit_cost,
+        )
+    if not totals:
+        return
+
+    quote = connection.ops.quote_name
+    table = quote(DailySalesRollup._meta.db_table)
+    columns = ('branch_id', 'day', 'product_id', 'units', 'revenue', 'cost')
+    rows = [key + value for key, value in totals.items()]
+    for start in range(0, len(rows), ROLLUP_CHUNK_SIZE):
+        chunk = rows[start:start + ROLLUP_CHUNK_SIZE]
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(chunk))
+        sql = (
+            f"INSERT INTO {table} ({', '.join(quote(c) for c in columns)}) VALUES {placeholders} "
+            f"ON CONFLICT ({quote('branch_id')}, {quote('day')}, {quote('product_id')}) DO UPDATE SET "
+            + ', '.join(f"{quote(c)} = {table}.{quote(c)} + excluded.{quote(c)}" for c in ('units', 'revenue', 'cost'))
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [value for row in chunk for value in row])
+
+
+# -----------------------------
+# VENTAS
+# -----------------------------
+def aggregate_items(items):
+    """
+    Agrupa las líneas de un carrito por SKU sumando cantidades.
+
+    `items` son dicts {sku, quantity, unit_price?} (la forma validada por
+    SaleItemSerializer). Devuelve un OrderedDict
+    {sku: {'quantity': int, 'unit_price': Decimal | None}} respetando el
+    orden de aparición.
+    """
+    cart = OrderedDict()
+    for item in items:
+        line = cart.setdefault(item['sku'], {'quantity': 0, 'unit_price': None})
+        line['quantity'] += item['quantity']
+        if item.get('unit_price') is not None:
+            line['unit_price'] = item['unit_price']
+    return cart
+
+
+def post_sale(branch, items, user=None, payment_method=''):
+    """
+    Registra una venta y descuenta el stock de la sucursal.
+
+    - Resuelve todos los SKU del carrito contra Inventory de la sucursal en
+      una sola consulta (solo productos de la misma company).
+    - Descuenta todas las filas afectadas con un UPDATE basado en F().
+    - Guarda las líneas en SaleLine con un bulk_create.
+    - Si falta algún SKU o no hay stock suficiente, no se guarda nada.
+
+    Si una línea no trae unit_price se usa Product.price. El total se
+    calcula en el servidor.
+    """
+    cart = aggregate_items(items)
+    if not cart:
+        raise ValidationError({'items': ["La venta debe tener al menos un item."]})
+
+    with transaction.atomic():
+        rows = Inventory.objects.filter(
+            branch=branch,
+            product__company_id=branch.company_id,
+            product__sku__in=cart.keys(),
+        ).values_list('pk', 'product_id', 'product__sku', 'product__price', 'product__cost')
+        resolved = {row[2]: row for row in rows}
+
+        missing = [sku for sku in cart if sku not in resolved]
+        if missing:
+            raise ValidationError({'items': [f"SKU sin inventario en la sucursal: {', '.join(missing)}."]})
+
+        demand = {}
+        total = Decimal('0')
+        for sku, line in cart.items():
+            inventory_id, _, _, list_price, _ = resolved[sku]
+            if line['unit_price'] is None:
+                line['unit_price'] = list_price
+            demand[inventory_id] = line['quantity']
+            total += line['unit_price'] * line['quantity']
+
+        decrement_stock(demand)
+        sale = Sale.objects.create(
+            branch=branch,
+            user=user,
+            total=total,
+            payment_method=payment_method,
+        )
+        lines = SaleLine.objects.bulk_create([
+            SaleLine(
+                sale=sale, branch=branch, product_id=resolved[sku][1], sku=sku,
+                quantity=line['quantity'], unit_price=line['unit_price'],
+                unit_cost=resolved[sku][4], created_at=sale.created_at,
+            )
+            for sku, line in cart.items()
+        ])
+        apply_sales_rollup(lines)
+        record_movements(sale_movements(lines, 'sale', -1, user=user))
+    return sale
+
+
+def void_sale(sale, user=None):
+    """
+    Anula una venta: devuelve el stock a la sucursal y la descuenta del
+    resumen diario (en el día original de la venta). La marca de anulación
+    se pone con un UPDATE condicional, así que dos anulaciones simultáneas
+    no devuelven el stock dos veces.
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        if not Sale.objects.filter(pk=sale.pk, voided_at__isnull=True).update(voided_at=now):
+            raise ValidationError("La venta ya está anulada.")
+        sale.voided_at = now
+
+        lines = list(SaleLine.objects.filter(sale=sale))
+        quantities = {}
+        for line in lines:
+            if line.product_id is not None:
+                quantities[line.product_id] = quantities.get(line.product_id, 0) + line.quantity
+        inventory = dict(
+            Inventory.objects.filter(branch_id=sale.branch_id, product_id__in=quantities.keys())
+            .values_list('product_id', 'pk')
+        )
+        increment_stock({inventory[pid]: qty for pid, qty in quantities.items() if pid in inventory})
+        apply_sales_rollup(lines, sign=-1)
+        # solo vuelve stock a los productos que siguen con inventario en la sucursal
+        record_movements(sale_movements(
+            [line for line in lines if line.product_id in inventory], 'void', 1, user=user, created_at=now,
+        ))
+    return sale
+
+
+def post_sales_batch(rows, user=None, company_id=None, chunk_size=500):
+    """
+    Registra un lote de ventas (sincronización de cajas offline).
+
+    `rows` es una lista de dicts ya validados por SaleBatchRowSerializer
+    ({branch, payment_method, lines}) o None para filas que no pasaron la
+    validación. Si se indica `company_id`, las sucursales de otras empresas se
+    tratan como inexistentes. Todo el lote usa un número fijo de consultas:
+
+    - una para las sucursales y otra (con select_for_update) para todas las
+      filas de Inventory involucradas;
+    - la asignación de stock se hace en memoria, fila por fila y en orden,
+      así que una venta sin stock se rechaza sin afectar a las demás;
+    - las ventas y sus líneas se insertan con bulk_create en bloques de
+      `chunk_size` y el stock se descuenta con un solo UPDATE agregado por
+      (producto, sucursal).
+
+    Devuelve una lista con un resultado por fila: {'id', 'total'} o {'errors'}.
+    """
+    results = [None] * len(rows)
+    carts = {}
+    for index, row in enumerate(rows):
+        if row is not None:
+            carts[index] = aggregate_items(row['lines'])
+
+    branch_ids = {rows[index]['branch'] for index in carts}
+    skus = {sku for cart in carts.values() for sku in cart}
+
+    with transaction.atomic():
+        branches = Branch.objects.filter(pk__in=branch_ids)
+        if company_id is not None:
+            branches = branches.filter(company_id=company_id)
+        branches = dict(branches.values_list('pk', 'company_id'))
+        inventory = {}
+        stock = {}
+        rows_qs = Inventory.objects.select_for_update(of=('self',)).filter(
+            branch_id__in=branches.keys(),
+            product__sku__in=skus,
+        ).values_list('pk', 'branch_id', 'product_id', 'product__company_id', 'product__sku',
+                      'product__price', 'product__cost', 'stock')
+        for inventory_id, branch_id, product_id, product_company_id, sku, price, cost, on_hand in rows_qs:
+            if product_company_id != branches[branch_id]:
+                continue
+            inventory[(branch_id, sku)] = (inventory_id, product_id, price, cost)
+            stock[inventory_id] = on_hand
+
+        demand = {}
+        accepted = []
+        for index, cart in carts.items():
+            branch_id = rows[index]['branch']
+            if branch_id not in branches:
+                results[index] = {'errors': {'branch': ["Sucursal inexistente."]}}
+                continue
+            missing = [sku for sku in cart if (branch_id, sku) not in inventory]
+            if missing:
+                results[index] = {'errors': {'items': [f"SKU sin inventario en la sucursal: {', '.join(missing)}."]}}
+                continue
+            short = [
+                sku for sku, line in cart.items()
+                if stock[inventory[(branch_id, sku)][0]] < line['quantity']
+            ]
+            if short:
+                results[index] = {'errors': {'items': [f"Stock insuficiente: {', '.join(short)}."]}}
+                continue
+
+            total = Decimal('0')
+            for sku, line in cart.items():
+                inventory_id, _, list_price, _ = inventory[(branch_id, sku)]
+                if line['unit_price'] is None:
+                    line['unit_price'] = list_price
+                stock[inventory_id] -= line['quantity']
+                demand[inventory_id] = demand.get(inventory_id, 0) + line['quantity']
+                total += line['unit_price'] * line['quantity']
+            accepted.append((index, Sale(
+                branch_id=branch_id, user=user, total=total,
+                payment_method=rows[index].get('payment_method', ''),
+            )))
+
+        sales = Sale.objects.bulk_create([sale for _, sale in accepted], batch_size=chunk_size)
+        lines = []
+        for (index, _), sale in zip(accepted, sales):
+            for sku, line in carts[index].items():
+                _, product_id, _, cost = inventory[(sale.branch_id, sku)]
+                lines.append(SaleLine(
+                    sale=sale, branch_id=sale.branch_id, product_id=product_id, sku=sku,
+                    quantity=line['quantity'], unit_price=line['unit_price'],
+                    unit_cost=cost, created_at=sale.created_at,
+                ))
+            results[index] = {'id': sale.pk, 'total': sale.total}
+        SaleLine.objects.bulk_create(lines, batch_size=chunk_size)
+        decrement_stock(demand)
+        apply_sales_rollup(lines)
+        record_movements(sale_movements(lines, 'sale', -1, user=user))
+    return results
+
+
+# -----------------------------
+# COMPRAS
+# -----------------------------
+def set_purchase_lines(purchase, items):
+    """
+    Reemplaza las líneas de una compra. Todos los SKU se resuelven contra los
+    productos de la company de la compra en una sola consulta.
+    `items` son dicts {sku, quantity, unit_cost} (PurchaseItemSerializer).
+    """
+    skus = {item['sku'] for item in items}
+    products = dict(
+        Product.objects.filter(company_id=purchase.company_id, sku__in=skus).values_list('sku', 'pk')
+    )
+    missing = sorted(skus - products.keys())
+    if missing:
+        raise ValidationError({'items': [f"SKU inexistente en la empresa: {', '.join(missing)}."]})
+
+    purchase.lines.all().delete()
+    created_at = timezone.make_aware(datetime.combine(purchase.date, time.min))
+    PurchaseLine.objects.bulk_create([
+        PurchaseLine(
+            purchase=purchase, company_id=purchase.company_id, product_id=products[item['sku']],
+            sku=item['sku'], quantity=item['quantity'], unit_cost=item['unit_cost'], created_at=created_at,
+        )
+        for item in items
+    ])
+
+
+def create_purchase(items, **fields):
+    """Crea una compra con sus líneas en una sola transacción."""
+    # el default del modelo (timezone.now) deja un datetime en la instancia
+    fields.setdefault('date', timezone.localdate())
+    with transaction.atomic():
+        purchase = Purchase.objects.create(**fields)
+        set_purchase_lines(purchase, items)
+    return purchase
+
+
+def receive_purchase(purchase, branch, user=None):
+    """
+    Recibe una compra en una sucursal: suma las cantidades al stock y
+    actualiza el costo promedio ponderado de cada producto.
+
+    Todo se calcula en SQL a partir de PurchaseLine, con un número fijo de
+    consultas sin importar la cantidad de líneas:
+
+    - un UPDATE condicional marca la compra como recibida, así que dos
+      recepciones simultáneas no suman el stock dos veces;
+    - un UPDATE de Product fija
+      costo = (existencias * costo + valor recibido) / (existencias + unidades),
+      con las existencias de todas las sucursales antes de la recepción
+      (los productos se bloquean antes, para que dos compras del mismo
+      producto no lean las mismas existencias);
+    - las filas de Inventory que falten en la sucursal se crean con
+      bulk_create y todas se incrementan con un UPDATE;
+    - cada producto deja su movimiento 'purchase' en el libro.
+
+    Las líneas cuyo producto ya no existe no mueven stock.
+    """
+    if branch.company_id != purchase.company_id:
+        raise ValidationError({'branch': ["La sucursal no pertenece a la empresa de la compra."]})
+
+    with transaction.atomic():
+        now = timezone.now()
+        if not Purchase.objects.filter(pk=purchase.pk, received_at__isnull=True).update(received_at=now, branch=branch):
+            raise ValidationError("La compra ya fue recibida.")
+        purchase.received_at = now
+        purchase.branch = branch
+
+        lines = PurchaseLine.objects.filter(purchase=purchase, product__isnull=False, quantity__gt=0).order_by()
+        received = dict(lines.values('product_id').annotate(units=Sum('quantity')).values_list('product_id', 'units'))
+        if not received:
+            return purchase
+        list(Product.objects.select_for_update().filter(pk__in=received.keys()).values_list('pk'))
+
+        # subconsultas por producto sobre las líneas de esta compra (índice por purchase_id)
+        per_product = lines.filter(product_id=OuterRef('pk')).values('product_id')
+        units = Subquery(per_product.annotate(total=Sum('quantity')).values('total'))
+        value = Subquery(per_product.annotate(total=Sum(F('quantity') * F('unit_cost'))).values('total'))
+        on_hand = Greatest(Coalesce(Subquery(
+            Inventory.objects.filter(product_id=OuterRef('pk')).order_by().values('product_id')
+            .annotate(total=Sum('stock')).values('total')
+        ), 0), 0)
+        divisor = on_hand + units
+        if connection.vendor != 'postgresql':
+            # SQLite guarda los decimales enteros como INTEGER y dividiría en enteros
+            divisor = Cast(divisor, FloatField())
+        Product.objects.filter(pk__in=received.keys()).update(
+            cost=Round(ExpressionWrapper(
+                (on_hand * F('cost') + value) / divisor,
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ), 2),
+            updated_at=now,
+        )
+
+        Inventory.objects.bulk_create(
+            [Inventory(product_id=product_id, branch=branch, stock=0) for product_id in received],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+        Inventory.objects.filter(branch=branch, product_id__in=received.keys()).update(
+            stock=F('stock') + Subquery(
+                lines.filter(product_id=OuterRef('product_id')).values('product_id')
+                .annotate(total=Sum('quantity')).values('total')
+            ),
+            updated_at=now,
+        )
+        record_movements(
+            StockMovement(
+                product_id=product_id, branch=branch, kind='purchase', quantity=qty,
+                purchase=purchase, user=user, created_at=now,
+            )
+            for product_id, qty in received.items()
+        )
+        # el costo es parte del catálogo cacheado
+        transaction.on_commit(lambda: bump_catalog_version(purchase.company_id))
+    return purchase
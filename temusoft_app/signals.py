@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
+from .cache import bump_catalog_version, invalidate_auth_user, invalidate_company_plan
+from .models import Company, Product, Subscription
+
 User = get_user_model()
 
 @receiver(post_save, sender=User)
@@ -19,3 +23,42 @@ def set_role_for_superuser(sender, instance, created, **kwargs):
     except Exception:
         # no romper el flujo por un error ocasional
         pass
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_catalog(sender, instance, **kwargs):
+    """
+    Cualquier cambio en un producto invalida el catálogo cacheado de su company.
+    Se hace al confirmar la transacción para que nadie vuelva a cachear
+    datos anteriores bajo la versión nueva.
+    """
+    company_id = instance.company_id
+    transaction.on_commit(lambda: bump_catalog_version(company_id))
+
+
+@receiver(post_save, sender=Company)
+def invalidate_catalog_company(sender, instance, **kwargs):
+    """El catálogo cacheado incluye la company con ?expand=company."""
+    company_id = instance.pk
+    transaction.on_commit(lambda: bump_catalog_version(company_id))
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Borra el usuario de la caché de autenticación (authentication.py) para que
+    cambios de rol, company o is_active se apliquen en el siguiente request.
+    Se borra también al confirmar la transacción, por si otro request volvió
+    a cachear la versión anterior mientras tanto.
+    """
+    user_id = instance.pk
+    invalidate_auth_user(user_id)
+    transaction.on_commit(lambda: invalidate_auth_user(user_id))
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def invalidate_plan(sender, instance, **kwargs):
+    """El plan cacheado de la company (throttling.py) se vuelve a leer en el siguiente request."""
+    company_id = instance.company_id
+    invalidate_company_plan(company_id)
+    transaction.on_commit(lambda: invalidate_company_plan(company_id))
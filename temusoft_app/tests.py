@@ -1,3 +1,1309 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, migrations, transaction
+from django.db.models import F, Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import db_router
+from .benchmarks import compare, percentile
+from .cache import auth_user_key
+from .db_operations import AddIndexConcurrently
+from .idempotency import request_fingerprint, run_idempotent
+from .jobs import claim_jobs, enqueue, run_job, save_upload
+from .metrics import MetricsRegistry, registry as metrics_registry
+from .models import (
+    Branch, Company, DailySalesRollup, IdempotencyKey, Inventory, Job, Product, PurchaseLine, Sale, SaleLine,
+    StockMovement, Supplier, User,
+)
+from .services import annotate_stock_at, record_initial_stock
+from .throttling import PlanRateThrottle, company_plan
+
+
+@override_settings(PLAN_THROTTLE_ENABLED=False)
+class TenantAPITestCase(APITestCase):
+    """
+    Base de los tests de la API: una company con una sucursal, un
+    admin_cliente autenticado y tres productos (s0, s1, s2) con stock 10.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Empresa A', rut='11111111-1')
+        cls.branch = Branch.objects.create(company=cls.company, name='Centro', address='Calle 1')
+        cls.user = cls.make_user('admin', 'admin_cliente', cls.company)
+        cls.products = [
+            Product.objects.create(company=cls.company, sku=f's{i}', name=f'Producto {i}', price=10 + i, cost=5)
+            for i in range(3)
+        ]
+        cls.inventories = [
+            Inventory.objects.create(product=product, branch=cls.branch, stock=10, reorder_point=2)
+            for product in cls.products
+        ]
+
+    @staticmethod
+    def make_user(username, role, company=None):
+        return User.objects.create_user(username=username, password='clave12345', role=role, company=company)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def stock(self, inventory):
+        return Inventory.objects.values_list('stock', flat=True).get(pk=inventory.pk)
+
+    def sell(self, items, **extra):
+        body = {'branch': self.branch.pk, 'payment_method': 'efectivo', 'items': items, **extra}
+        return self.client.post('/api/sales/', body, format='json')
+
+
+# -----------------------------
+# VENTAS (services.post_sale)
+# -----------------------------
+class SaleStockTests(TenantAPITestCase):
+
+    def test_sale_decrements_stock_and_totals_lines(self):
+        response = self.sell([{'sku': 's0', 'qty': 3}, {'sku': 's1', 'qty': 1}])
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.stock(self.inventories[0]), 7)
+        self.assertEqual(self.stock(self.inventories[1]), 9)
+        self.assertEqual(Decimal(response.data['total']), Decimal('41.00'))  # 3 * 10 + 1 * 11
+
+    def test_oversell_is_rejected_without_side_effects(self):
+        response = self.sell([{'sku': 's0', 'qty': 11}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(self.inventories[0]), 10)
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(SaleLine.objects.exists())
+
+    def test_shortage_message_lists_only_short_skus(self):
+        response = self.sell([{'sku': 's0', 'qty': 6}, {'sku': 's1', 'qty': 20}])
+        self.assertEqual(response.status_code, 400)
+        message = str(response.data['items'][0])
+        self.assertIn('s1 (stock 10, pedido 20)', message)
+        self.assertNotIn('s0', message)
+        # el descuento de s0 se deshizo junto con el error
+        self.assertEqual(self.stock(self.inventories[0]), 10)
+
+    def test_unknown_sku_is_rejected(self):
+        response = self.sell([{'sku': 'nope', 'qty': 1}])
+        self.assertEqual(response.status_code, 400)
+
+
+# -----------------------------
+# LÍNEAS DE VENTA Y COMPRA
+# -----------------------------
+class LineTablesTests(TenantAPITestCase):
+
+    def test_sale_lines_keep_price_and_cost(self):
+        response = self.sell([{'sku': 's0', 'qty': 2}, {'sku': 's2', 'qty': 1, 'price': '9.50'}])
+        self.assertEqual(response.status_code, 201, response.data)
+        lines = {line.sku: line for line in SaleLine.objects.filter(sale_id=response.data['id'])}
+        self.assertEqual(lines['s0'].quantity, 2)
+        self.assertEqual(lines['s0'].unit_price, Decimal('10.00'))
+        self.assertEqual(lines['s0'].unit_cost, Decimal('5.00'))
+        self.assertEqual(lines['s2'].unit_price, Decimal('9.50'))
+        self.assertEqual(lines['s0'].branch_id, self.branch.pk)
+        self.assertEqual(response.data['items'][0]['sku'], 's0')
+
+    def test_purchase_lines_replace_items(self):
+        body = {'company': self.company.pk, 'items': [{'sku': 's1', 'qty': 4, 'price': '3.00'}]}
+        response = self.client.post('/api/purchases/', body, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        purchase_id = response.data['id']
+        body['items'] = [{'sku': 's2', 'qty': 1, 'price': '2.00'}]
+        response = self.client.put(f'/api/purchases/{purchase_id}/', body, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            list(PurchaseLine.objects.filter(purchase_id=purchase_id).values_list('sku', 'quantity')), [('s2', 1)],
+        )
+
+    def test_purchase_with_unknown_sku_is_rejected(self):
+        body = {'company': self.company.pk, 'items': [{'sku': 'nope', 'qty': 1, 'price': '1.00'}]}
+        self.assertEqual(self.client.post('/api/purchases/', body, format='json').status_code, 400)
+
+
+class BackfillLinesTests(SimpleTestCase):
+    """El backfill de 0004 omite los ítems mal formados en vez de abortar."""
+
+    def test_malformed_items_are_skipped(self):
+        migration = importlib.import_module('temusoft_app.migrations.0004_backfill_lines')
+        items = [
+            {'sku': 'a', 'qty': 2, 'price': '3.5'},
+            {'sku': 'b', 'qty': -1, 'price': '1'},
+            {'sku': 'c', 'qty': 'x'},
+            {'sku': 'd', 'qty': 1, 'price': 'abc'},
+            {'sku': 'e', 'qty': 1, 'price': '-2'},
+            'basura',
+            {'qty': 1},
+        ]
+        with self.assertLogs(migration.logger, 'WARNING') as logs:
+            lines = list(migration._lines(items, 'Sale 1'))
+        self.assertEqual(lines, [('a', 2, Decimal('3.5'))])
+        self.assertEqual(len(logs.records), 6)
+        with self.assertLogs(migration.logger, 'WARNING'):
+            self.assertEqual(list(migration._lines({'sku': 'a'}, 'Sale 2')), [])
+        self.assertEqual(list(migration._lines(None, 'Sale 3')), [])
+
+
+# -----------------------------
+# LOTES DE VENTAS (/api/sales/batch/)
+# -----------------------------
+class SalesBatchTests(TenantAPITestCase):
+
+    def batch(self, sales):
+        return self.client.post('/api/sales/batch/', {'sales': sales}, format='json')
+
+    def row(self, *items, branch=None):
+        return {'branch': branch or self.branch.pk, 'items': [{'sku': sku, 'qty': qty} for sku, qty in items]}
+
+    def test_partial_failure_keeps_valid_rows(self):
+        response = self.batch([
+            self.row(('s0', 2)),
+            self.row(('nope', 1)),
+            {'branch': self.branch.pk, 'items': []},
+            self.row(('s1', 1)),
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'error', 'error', 'created'])
+        self.assertEqual(self.stock(self.inventories[0]), 8)
+        self.assertEqual(self.stock(self.inventories[1]), 9)
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_rows_compete_for_stock_in_order(self):
+        response = self.batch([self.row(('s0', 7)), self.row(('s0', 7)), self.row(('s0', 3))])
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'error', 'created'])
+        self.assertEqual(self.stock(self.inventories[0]), 0)
+
+    def test_other_company_branch_is_unknown(self):
+        other = Company.objects.create(name='Empresa B', rut='22222222-2')
+        other_branch = Branch.objects.create(company=other, name='Norte', address='Calle 2')
+        response = self.batch([self.row(('s0', 1), branch=other_branch.pk)])
+        self.assertEqual(response.data['results'][0]['errors'], {'branch': ['Sucursal inexistente.']})
+        self.assertFalse(Sale.objects.exists())
+
+    def test_body_must_be_a_list(self):
+        self.assertEqual(self.batch({'not': 'a list'}).status_code, 400)
+
+
+# -----------------------------
+# PAGINACIÓN POR CURSOR
+# -----------------------------
+class CursorPaginationTests(TenantAPITestCase):
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_sales_pages_cover_ties_on_created_at(self):
+        for _ in range(5):
+            self.assertEqual(self.sell([{'sku': 's0', 'qty': 1}]).status_code, 201)
+        ids = list(Sale.objects.values_list('pk', flat=True))
+        # tres ventas con el mismo created_at: el cursor las separa con offset
+        Sale.objects.filter(pk__in=ids[1:4]).update(created_at=Sale.objects.get(pk=ids[1]).created_at)
+        walked = self.walk('/api/sales/?page_size=2')
+        self.assertEqual(sorted(walked), sorted(ids))
+        self.assertEqual(len(walked), len(set(walked)))
+
+    def test_products_are_ordered_by_id(self):
+        self.assertEqual(self.walk('/api/products/?page_size=2'), [p.pk for p in self.products])
+
+
+# -----------------------------
+# MULTI-TENANT
+# -----------------------------
+class TenantScopeTests(TenantAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = Company.objects.create(name='Empresa B', rut='22222222-2')
+        cls.other_branch = Branch.objects.create(company=cls.other, name='Norte', address='Calle 2')
+        cls.other_product = Product.objects.create(company=cls.other, sku='s0', name='Ajeno', price=1, cost=1)
+        cls.other_supplier = Supplier.objects.create(company=cls.other, name='Proveedor B', rut='33333333-3')
+
+    def test_lists_only_show_own_company(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual({row['id'] for row in response.data['results']}, {p.pk for p in self.products})
+        response = self.client.get('/api/companies/')
+        self.assertEqual([row['id'] for row in response.data['results']], [self.company.pk])
+
+    def test_other_company_objects_are_not_found(self):
+        self.assertEqual(self.client.get(f'/api/products/{self.other_product.pk}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/branches/{self.other_branch.pk}/').status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/products/{self.other_product.pk}/').status_code, 404)
+        self.assertTrue(Product.objects.filter(pk=self.other_product.pk).exists())
+
+    def test_relations_to_other_company_are_forbidden(self):
+        body = {'company': self.company.pk, 'supplier': self.other_supplier.pk,
+                'items': [{'sku': 's0', 'qty': 1, 'price': '1.00'}]}
+        self.assertEqual(self.client.post('/api/purchases/', body, format='json').status_code, 403)
+        body = {'company': self.other.pk, 'sku': 'x1', 'name': 'X', 'price': 1, 'cost': 1}
+        self.assertEqual(self.client.post('/api/products/', body, format='json').status_code, 403)
+
+    def test_sale_in_other_company_branch_is_rejected(self):
+        response = self.client.post('/api/sales/', {
+            'branch': self.other_branch.pk, 'payment_method': 'efectivo', 'items': [{'sku': 's0', 'qty': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_user_without_company_sees_nothing(self):
+        self.client.force_authenticate(self.make_user('suelto', 'cliente_final'))
+        self.assertEqual(self.client.get('/api/products/').data['results'], [])
+
+
+# -----------------------------
+# RESTRICCIONES ÚNICAS (0008/0009)
+# -----------------------------
+class UniqueConstraintTests(TenantAPITestCase):
+
+    def test_inventory_is_unique_per_product_and_branch(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Inventory.objects.create(product=self.products[0], branch=self.branch, stock=1)
+
+    def test_sku_is_unique_per_company(self):
+        body = {'company': self.company.pk, 'sku': 's0', 'name': 'Repetido', 'price': 1, 'cost': 1}
+        self.assertEqual(self.client.post('/api/products/', body, format='json').status_code, 400)
+        other = Company.objects.create(name='Empresa B', rut='22222222-2')
+        Product.objects.create(company=other, sku='s0', name='Mismo SKU', price=1, cost=1)
+        self.assertEqual(Product.objects.filter(sku='s0').count(), 2)
+
+    def test_constraint_migration_dedupes_again_before_building(self):
+        migration = importlib.import_module('temusoft_app.migrations.0009_constraints').Migration
+        first = migration.operations[0]
+        self.assertFalse(migration.atomic)
+        self.assertIsInstance(first, migrations.RunPython)
+        self.assertEqual(first.code.__name__, 'dedupe_inventory')
+
+
+
+class IndexMigrationTests(SimpleTestCase):
+    """Los índices sobre tablas con escrituras se crean con CREATE INDEX CONCURRENTLY."""
+
+    def assert_concurrent(self, name, index_names):
+        migration = importlib.import_module(f'temusoft_app.migrations.{name}').Migration
+        self.assertFalse(migration.atomic)
+        self.assertTrue(all(isinstance(op, AddIndexConcurrently) for op in migration.operations))
+        self.assertEqual([op.index.name for op in migration.operations], index_names)
+
+    def test_sale_created_at_index(self):
+        self.assert_concurrent('0006_sale_created_at_index', ['sale_created_at_idx'])
+
+    def test_tenant_indexes(self):
+        self.assert_concurrent('0007_tenant_indexes', ['inventory_branch_id_idx', 'product_company_id_idx'])
+
+
+# -----------------------------
+# REPORTES (/api/reports/sales/)
+# -----------------------------
+class SalesReportTests(TenantAPITestCase):
+
+    def report(self, **params):
+        return self.client.get('/api/reports/sales/', params)
+
+    def test_rollup_follows_sales_and_voids(self):
+        self.sell([{'sku': 's0', 'qty': 2}, {'sku': 's1', 'qty': 1}])
+        voided = self.sell([{'sku': 's0', 'qty': 1}]).data['id']
+        response = self.report(group_by='product')
+        rows = {row['product_sku']: row for row in response.data['results']}
+        self.assertEqual(rows['s0']['units'], 3)
+        self.assertEqual(rows['s0']['revenue'], '30.00')
+        self.assertEqual(rows['s0']['margin'], '15.00')
+
+        self.client.post(f'/api/sales/{voided}/void/')
+        rows = {row['product_sku']: row for row in self.report(group_by='product').data['results']}
+        self.assertEqual(rows['s0']['units'], 2)
+        self.assertEqual(rows['s1']['revenue'], '11.00')
+
+    def test_only_managers_can_void(self):
+        sale_id = self.sell([{'sku': 's0', 'qty': 1}]).data['id']
+        self.client.force_authenticate(self.make_user('vendedor', 'vendedor', self.company))
+        self.assertEqual(self.client.post(f'/api/sales/{sale_id}/void/').status_code, 403)
+        self.assertEqual(self.stock(self.inventories[0]), 9)
+        self.client.force_authenticate(self.make_user('gerente', 'gerente', self.company))
+        self.assertEqual(self.client.post(f'/api/sales/{sale_id}/void/').status_code, 200)
+        self.assertEqual(self.stock(self.inventories[0]), 10)
+
+    def test_filters_and_grouping(self):
+        self.sell([{'sku': 's0', 'qty': 1}, {'sku': 's2', 'qty': 1}])
+        response = self.report(group_by='branch', product=self.products[2].pk)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['revenue'], '12.00')
+        self.assertEqual(self.report(group_by='week').status_code, 400)
+        self.assertEqual(self.report(date_from='2030-01-02', date_to='2030-01-01').status_code, 400)
+
+    def test_non_numeric_ids_are_rejected(self):
+        for param in ('branch', 'product'):
+            response = self.report(**{param: 'abc'})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(param, response.data)
+
+
+# -----------------------------
+# STOCK BAJO (/api/inventory/low-stock/)
+# -----------------------------
+class LowStockTests(TenantAPITestCase):
+
+    def test_suggests_purchase_grouped_by_last_supplier(self):
+        supplier = Supplier.objects.create(company=self.company, name='Proveedor A', rut='44444444-4')
+        body = {'company': self.company.pk, 'supplier': supplier.pk,
+                'items': [{'sku': 's0', 'qty': 5, 'price': '4.00'}]}
+        self.assertEqual(self.client.post('/api/purchases/', body, format='json').status_code, 201)
+        Inventory.objects.filter(pk__in=[self.inventories[0].pk, self.inventories[1].pk]).update(stock=1)
+
+        data = self.client.get('/api/inventory/low-stock/').data
+        self.assertEqual([item['sku'] for item in data['branches'][0]['items']], ['s0', 's1'])
+        groups = {group['supplier']: group for group in data['suggested_purchase']}
+        self.assertEqual(set(groups), {supplier.pk, None})
+        # objetivo = reorder_point * LOW_STOCK_TARGET_FACTOR (2 * 2) - stock (1)
+        self.assertEqual(groups[supplier.pk]['items'], [{'product': self.products[0].pk, 'sku': 's0', 'qty': 3,
+                                                         'unit_cost': '5.00'}])
+        self.assertEqual(groups[supplier.pk]['total'], '15.00')
+
+    def test_branch_filter(self):
+        Inventory.objects.filter(pk=self.inventories[0].pk).update(stock=0)
+        other = Branch.objects.create(company=self.company, name='Sur', address='Calle 3')
+        self.assertEqual(self.client.get('/api/inventory/low-stock/', {'branch': other.pk}).data['branches'], [])
+        response = self.client.get('/api/inventory/low-stock/', {'branch': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('branch', response.data)
+
+
+# -----------------------------
+# EXPORTACIONES (/api/sales/export/, /api/purchases/export/)
+# -----------------------------
+class ExportTests(TenantAPITestCase):
+
+    def content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_sales_csv_has_one_row_per_line(self):
+        self.sell([{'sku': 's0', 'qty': 2}, {'sku': 's1', 'qty': 1}])
+        response = self.client.get('/api/sales/export/', {'branch': self.branch.pk})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = self.content(response).strip().splitlines()
+        self.assertEqual(len(rows), 3)
+        self.assertIn('s0', rows[1])
+
+    def test_purchases_ndjson_filters_by_supplier(self):
+        supplier = Supplier.objects.create(company=self.company, name='Proveedor A', rut='44444444-4')
+        for supplier_id in (supplier.pk, None):
+            body = {'company': self.company.pk, 'supplier': supplier_id,
+                    'items': [{'sku': 's0', 'qty': 1, 'price': '4.00'}]}
+            self.client.post('/api/purchases/', body, format='json')
+        response = self.client.get('/api/purchases/export/', {'output': 'ndjson', 'supplier': supplier.pk})
+        self.assertEqual(len(self.content(response).strip().splitlines()), 1)
+
+    def test_invalid_params_are_rejected_before_streaming(self):
+        for url, param in (('/api/sales/export/', 'branch'), ('/api/purchases/export/', 'supplier')):
+            response = self.client.get(url, {param: 'abc'})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(param, response.data)
+        self.assertEqual(self.client.get('/api/sales/export/', {'output': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/sales/export/', {'date_from': '01/02/2024'}).status_code, 400)
+
+
+# -----------------------------
+# CACHÉ DEL CATÁLOGO
+# -----------------------------
+class CatalogCacheTests(TenantAPITestCase):
+
+    def names(self):
+        return {row['sku']: row['name'] for row in self.client.get('/api/products/').data['results']}
+
+    def test_list_is_served_from_cache_until_a_product_changes(self):
+        self.assertEqual(self.names()['s0'], 'Producto 0')
+        # update() no dispara señales: la respuesta cacheada sigue vigente
+        Product.objects.filter(pk=self.products[0].pk).update(name='Sin invalidar')
+        self.assertEqual(self.names()['s0'], 'Producto 0')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/products/{self.products[1].pk}/', {'name': 'Nuevo'}, format='json')
+        names = self.names()
+        self.assertEqual((names['s0'], names['s1']), ('Sin invalidar', 'Nuevo'))
+
+    def test_companies_do_not_share_entries(self):
+        self.names()
+        other = Company.objects.create(name='Empresa B', rut='22222222-2')
+        Product.objects.create(company=other, sku='b0', name='Ajeno', price=1, cost=1)
+        self.client.force_authenticate(self.make_user('admin_b', 'admin_cliente', other))
+        self.assertEqual(self.names(), {'b0': 'Ajeno'})
+
+
+# -----------------------------
+# AUTENTICACIÓN JWT CON CACHÉ
+# -----------------------------
+class CachedAuthenticationTests(TenantAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+        token = self.client.post('/api/token/', {'username': 'admin', 'password': 'clave12345'}).data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_cache_keeps_only_authorization_fields(self):
+        self.assertEqual(self.client.get('/api/branches/').status_code, 200)
+        entry = caches['default'].get(auth_user_key(self.user.pk))
+        self.assertEqual(entry, {'id': self.user.pk, 'role': 'admin_cliente', 'company_id': self.company.pk,
+                                 'is_active': True, 'is_superuser': False})
+        # /me/ sigue devolviendo el usuario completo y el usuario armado desde
+        # la caché sirve como FK
+        self.assertEqual(self.client.get('/api/users/me/').data['username'], 'admin')
+        self.assertEqual(self.sell([{'sku': 's0', 'qty': 1}]).status_code, 201)
+        self.assertEqual(Sale.objects.get().user_id, self.user.pk)
+
+    def test_cached_user_keeps_role_and_company(self):
+        other = Company.objects.create(name='Empresa B', rut='22222222-2')
+        Product.objects.create(company=other, sku='b0', name='Ajeno', price=1, cost=1)
+        for _ in range(2):  # el segundo request usa la caché
+            response = self.client.get('/api/products/search/', {'q': 'b0'})
+            self.assertEqual(response.data, [])
+        self.assertEqual(self.client.get('/api/_metrics/').status_code, 403)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get('/api/branches/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get('/api/branches/').status_code, 401)
+
+    def test_cached_inactive_entry_is_rejected(self):
+        self.client.get('/api/branches/')
+        entry = caches['default'].get(auth_user_key(self.user.pk))
+        caches['default'].set(auth_user_key(self.user.pk), {**entry, 'is_active': False})
+        self.assertEqual(self.client.get('/api/branches/').status_code, 401)
+
+    def test_async_me_reads_the_full_user(self):
+        for _ in range(2):  # el segundo request resuelve el usuario desde la caché
+            response = self.client.get('/api/async/users/me/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual((response.json()['username'], response.json()['company']), ('admin', self.company.pk))
+
+    def test_role_change_applies_on_next_request(self):
+        self.assertEqual(self.client.get('/api/reports/sales/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.role = 'vendedor'
+            self.user.save()
+        self.assertEqual(self.client.get('/api/reports/sales/').status_code, 403)
+
+
+# -----------------------------
+# BÚSQUEDA (/api/products/search/)
+# -----------------------------
+class ProductSearchTests(TenantAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Product.objects.create(company=cls.company, sku='lap-1', name='Lápiz grafito', category='Escritura',
+                               price=1, cost=1)
+        Product.objects.create(company=cls.company, sku='cua-1', name='Cuaderno lapicera', category='Papel',
+                               price=1, cost=1)
+        Product.objects.create(company=cls.company, sku='lap', name='Goma', category='Lápices', price=1, cost=1)
+        other = Company.objects.create(name='Empresa B', rut='22222222-2')
+        Product.objects.create(company=other, sku='lap-9', name='Lápiz ajeno', price=1, cost=1)
+
+    def search(self, **params):
+        return self.client.get('/api/products/search/', params)
+
+    def test_ranks_sku_then_name_then_category(self):
+        skus = [row['sku'] for row in self.search(q='lap').data]
+        self.assertEqual(skus, ['lap', 'lap-1', 'cua-1'])
+        self.assertEqual([row['sku'] for row in self.search(q='escri').data], ['lap-1'])
+        self.assertEqual(self.search(q='  ').data, [])
+
+    def test_limit(self):
+        self.assertEqual(len(self.search(q='lap', limit=1).data), 1)
+        for limit in ('x', '0', '-3'):
+            self.assertEqual(self.search(q='lap', limit=limit).status_code, 400)
+
+    def test_index_follows_catalog_changes(self):
+        self.search(q='lap')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/products/', {'company': self.company.pk, 'sku': 'lapx', 'name': 'Nuevo',
+                                                'price': 1, 'cost': 1}, format='json')
+        self.assertIn('lapx', [row['sku'] for row in self.search(q='lapx').data])
+
+
+# -----------------------------
+# IMPORTACIÓN DEL CATÁLOGO (/api/products/import/)
+# -----------------------------
+class ProductImportTests(TenantAPITestCase):
+
+    def upload(self, content, name='catalogo.csv', **params):
+        upload = SimpleUploadedFile(name, content.encode())
+        query = '&'.join(f'{key}={value}' for key, value in params.items())
+        return self.client.post(f'/api/products/import/?{query}', {'file': upload}, format='multipart')
+
+    def test_upsert_counts_and_initial_inventory(self):
+        response = self.client.post('/api/products/import/', {'products': [
+            {'sku': 's0', 'name': 'Renombrado', 'price': '20', 'cost': '6', 'stock': 99},
+            {'sku': 'n1', 'name': 'Nuevo', 'price': '3.50', 'cost': '1', 'stock': 7, 'reorder_point': 2},
+            {'sku': '', 'name': 'Sin SKU', 'price': '1', 'cost': '1'},
+        ]}, format='json')
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.assertEqual(response.data['errors'], [{'row': 3, 'errors': {'sku': ["Este campo es requerido."]}}])
+        self.assertEqual(Product.objects.get(sku='s0').name, 'Renombrado')
+        # el stock de un inventario existente no se toca
+        self.assertEqual(self.stock(self.inventories[0]), 10)
+        movement = StockMovement.objects.get(product__sku='n1')
+        self.assertEqual((movement.kind, movement.quantity), ('initial', 7))
+
+    def test_existing_products_get_inventory_in_new_branches(self):
+        branch = Branch.objects.create(company=self.company, name='Sur', address='Calle 3')
+        self.client.post('/api/products/import/', {'products': [
+            {'sku': 's1', 'name': 'Producto 1', 'price': '11', 'cost': '5', 'stock': 4},
+        ]}, format='json')
+        inventory = Inventory.objects.get(product=self.products[1], branch=branch)
+        self.assertEqual(inventory.stock, 4)
+        self.assertEqual(
+            list(StockMovement.objects.filter(branch=branch).values_list('kind', 'quantity')), [('initial', 4)],
+        )
+        self.assertFalse(StockMovement.objects.filter(branch=self.branch).exists())
+
+    @override_settings(PRODUCT_IMPORT_CHUNK_SIZE=1)
+    def test_read_error_reports_rows_already_imported(self):
+        response = self.upload('{"sku": "n1", "name": "Uno", "price": 1, "cost": 1}\n{roto\n', name='c.ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertIn('fila 1', response.data['error'])
+        self.assertTrue(Product.objects.filter(sku='n1').exists())
+
+    def test_negative_or_fractional_quantities_are_row_errors(self):
+        response = self.client.post('/api/products/import/', {'products': [
+            {'sku': 'n1', 'name': 'Uno', 'price': '1', 'cost': '1', 'stock': '-5', 'reorder_point': -3},
+            {'sku': 'n2', 'name': 'Dos', 'price': '1', 'cost': '1', 'stock': 2.7},
+            {'sku': 'n3', 'name': 'Tres', 'price': '1', 'cost': '1', 'stock': '4.0'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        errors = {row['row']: row['errors'] for row in response.data['errors']}
+        self.assertEqual(set(errors[1]), {'stock', 'reorder_point'})
+        self.assertEqual(errors[2], {'stock': ["Debe ser un número entero."]})
+        self.assertEqual(list(Product.objects.filter(sku__startswith='n').values_list('sku', flat=True)), ['n3'])
+        self.assertFalse(StockMovement.objects.filter(quantity__lt=0).exists())
+        self.assertEqual(Inventory.objects.get(product__sku='n3').stock, 4)
+
+    def test_super_admin_company_must_be_numeric(self):
+        self.client.force_authenticate(self.make_user('root', 'super_admin'))
+        rows = {'products': [{'sku': 'n1', 'name': 'Uno', 'price': '1', 'cost': '1'}]}
+        response = self.client.post('/api/products/import/?company=abc', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('company', response.data)
+        response = self.client.post(f'/api/products/import/?company={self.company.pk}', rows, format='json')
+        self.assertEqual(response.data['created'], 1)
+
+    def test_unreadable_file_is_rejected(self):
+        response = self.upload('{roto\n', name='c.ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('file', response.data)
+        self.assertEqual(self.upload('sku,name\n', name='c.xml').status_code, 400)
+
+    def test_csv_upload(self):
+        response = self.upload('sku,name,price,cost,stock\nc1,Desde CSV,2.5,1,3\n')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(Inventory.objects.get(product__sku='c1').stock, 3)
+
+
+# -----------------------------
+# LECTURAS ASYNC (/api/async/...)
+# -----------------------------
+class AsyncReadTests(TenantAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_branch = Branch.objects.create(company=cls.company, name='Sur', address='Calle 3')
+        for product in cls.products:
+            Inventory.objects.create(product=product, branch=cls.other_branch, stock=1)
+
+    def setUp(self):
+        super().setUp()
+        # las vistas async autentican con el JWT, no con force_authenticate
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_same_pages_as_the_drf_lists(self):
+        for sync_url, async_url in (
+            ('/api/products/?page_size=2', '/api/async/products/?page_size=2'),
+            (f'/api/inventory/?page_size=2&branch={self.other_branch.pk}',
+             f'/api/async/inventory/?page_size=2&branch={self.other_branch.pk}'),
+        ):
+            sync_page, async_page = self.client.get(sync_url).json(), self.client.get(async_url).json()
+            self.assertEqual(list(async_page), ['next', 'previous', 'results'])
+            self.assertEqual(async_page['results'], sync_page['results'])
+            # los cursores son intercambiables entre ambos listados
+            second = self.client.get(async_page['next']).json()
+            self.assertEqual(second['results'], self.client.get(sync_page['next']).json()['results'])
+            self.assertIsNone(second['next'])
+            back = self.client.get(second['previous']).json()
+            self.assertEqual(back['results'], async_page['results'])
+
+    def test_branch_filter_on_the_drf_list(self):
+        response = self.client.get('/api/inventory/', {'branch': self.other_branch.pk})
+        self.assertEqual({row['branch'] for row in response.data['results']}, {self.other_branch.pk})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(self.client.get('/api/inventory/', {'branch': 'abc'}).status_code, 400)
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get('/api/async/inventory/', {'branch': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/async/products/', {'cursor': 'basura'}).status_code, 404)
+        self.client.credentials()
+        self.assertEqual(self.client.get('/api/async/products/').status_code, 401)
+
+
+# -----------------------------
+# AUDITORÍA (manage.py auditar)
+# -----------------------------
+class AuditCommandTests(TransactionTestCase):
+    """Las reglas corren en hilos con su propia conexión: los datos deben estar confirmados."""
+
+    def setUp(self):
+        company = Company.objects.create(name='Empresa A', rut='11111111-1')
+        other = Company.objects.create(name='Empresa B', rut='12345678-5')
+        branch = Branch.objects.create(company=company, name='Centro', address='Calle 1')
+        products = [
+            Product.objects.create(company=owner, sku=f's{i}', name='P', price=1, cost=1)
+            for i, owner in enumerate((company, company, other))
+        ]
+        self.negative = Inventory.objects.create(product=products[0], branch=branch, stock=-3)
+        Inventory.objects.create(product=products[1], branch=branch, stock=5)
+        self.orphan = Inventory.objects.create(product=products[2], branch=branch, stock=1)
+
+    def audit(self, *checks, **options):
+        out = io.StringIO()
+        call_command('auditar', checks=list(checks), chunk_size=1, workers=2, stdout=out, **options)
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_findings_and_summary(self):
+        records = self.audit('inventory_negative_stock', 'inventory_orphan', 'company_rut_invalid')
+        *findings, summary = records
+        self.assertEqual(
+            sorted((row['check'], row['id']) for row in findings),
+            [('inventory_negative_stock', self.negative.pk), ('inventory_orphan', self.orphan.pk)],
+        )
+        self.assertEqual(summary['findings'], 2)
+        self.assertEqual(summary['summary']['inventory_orphan'], {'chunks': 3, 'findings': 1})
+        self.assertEqual(summary['summary']['company_rut_invalid']['findings'], 0)
+
+    def test_fail_on_findings_raises_command_error(self):
+        with self.assertRaises(CommandError):
+            self.audit('inventory_negative_stock', fail_on_findings=True)
+        self.assertEqual(self.audit('company_rut_invalid', fail_on_findings=True)[-1]['findings'], 0)
+        with self.assertRaises(CommandError):
+            call_command('auditar', chunk_size=0, stdout=io.StringIO())
+
+
+# -----------------------------
+# MÉTRICAS (MetricsMiddleware, /api/_metrics/)
+# -----------------------------
+class HistogramTests(SimpleTestCase):
+
+    def test_render_is_cumulative_and_escaped(self):
+        registry = MetricsRegistry()
+        registry.histogram('demo', 'Ayuda', (1, 5))
+        labels = (('view', 'a"b'),)
+        for value in (0, 3, 3, 9):
+            registry.observe('demo', labels, value)
+        lines = registry.render().splitlines()
+        self.assertEqual(lines[:2], ['# HELP demo Ayuda', '# TYPE demo histogram'])
+        self.assertEqual(lines[2:], [
+            'demo_bucket{view="a\\"b",le="1"} 1',
+            'demo_bucket{view="a\\"b",le="5"} 3',
+            'demo_bucket{view="a\\"b",le="+Inf"} 4',
+            'demo_sum{view="a\\"b"} 15.000000',
+            'demo_count{view="a\\"b"} 4',
+        ])
+
+
+class MetricsMiddlewareTests(TenantAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics_registry.reset()
+
+    def test_requests_are_labeled_by_view_and_action(self):
+        self.client.get('/api/branches/')
+        self.client.get(f'/api/branches/{self.branch.pk}/')
+        self.client.get('/api/branches/999999/')
+        text = metrics_registry.render()
+        self.assertIn('http_request_duration_seconds_count{view="BranchViewSet",action="list",status="2xx"} 1', text)
+        self.assertIn('http_request_db_queries_count{view="BranchViewSet",action="retrieve",status="2xx"} 1', text)
+        self.assertIn('http_request_db_seconds_count{view="BranchViewSet",action="retrieve",status="4xx"} 1', text)
+
+    def test_async_views_use_the_url_name(self):
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.client.get('/api/async/products/')
+        self.assertIn('{view="async-products",action="get",status="2xx"}', metrics_registry.render())
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_queries_are_logged(self):
+        with self.assertLogs('temusoft_app.slow_queries', 'WARNING') as logs:
+            self.client.get('/api/branches/')
+        self.assertIn('GET /api/branches/', logs.output[0])
+
+    def test_endpoint_is_for_super_admin(self):
+        self.assertEqual(self.client.get('/api/_metrics/').status_code, 403)
+        self.client.force_authenticate(self.make_user('root', 'super_admin'))
+        self.client.get('/api/branches/')
+        response = self.client.get('/api/_metrics/')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn(b'# TYPE http_request_db_queries histogram', response.content)
+
+
+# -----------------------------
+# DATASET SINTÉTICO Y BENCHMARK (generate_dataset, benchmark_api)
+# -----------------------------
+class DatasetAndBenchmarkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_dataset', companies=2, branches=2, products=20, sales=60, purchases=3, days=10,
+            batch_size=7, prefix='t', stdout=io.StringIO(),
+        )
+
+    def test_dataset_is_consistent(self):
+        self.assertEqual(Company.objects.count(), 2)
+        self.assertEqual(Sale.objects.count(), 60)
+        # el libro de movimientos reproduce el stock actual
+        mismatched = annotate_stock_at(Inventory.objects.all(), timezone.now()).exclude(stock_at=F('stock'))
+        self.assertFalse(mismatched.exists())
+        # el resumen diario coincide con las líneas de venta
+        self.assertEqual(
+            DailySalesRollup.objects.aggregate(units=Sum('units'))['units'],
+            SaleLine.objects.aggregate(units=Sum('quantity'))['units'],
+        )
+        with self.assertRaises(CommandError):
+            call_command('generate_dataset', prefix='t', stdout=io.StringIO())
+
+    def test_benchmark_writes_and_compares_results(self):
+        user = User.objects.filter(username__startswith='t_c', role='admin_cliente').first()
+        with tempfile.TemporaryDirectory() as tmp:
+            first = os.path.join(tmp, 'a.json')
+            options = {'user': user.username, 'repeat': 2, 'warmup': 0, 'stdout': io.StringIO()}
+            call_command('benchmark_api', scenario=['products_list', 'inventory_branch'], output=first, **options)
+            with open(first, encoding='utf-8') as fileobj:
+                report = json.load(fileobj)
+            self.assertEqual(set(report['scenarios']), {'products_list', 'inventory_branch'})
+            self.assertEqual(report['scenarios']['inventory_branch']['statuses'], {'200': 2})
+            self.assertEqual(report['meta']['dataset']['sales'], 60)
+
+            # contra una versión "anterior" mucho más rápida hay regresión
+            for stats in report['scenarios'].values():
+                stats['p95_ms'] = 0.001
+            with open(first, 'w', encoding='utf-8') as fileobj:
+                json.dump(report, fileobj)
+            with self.assertRaises(CommandError):
+                call_command('benchmark_api', scenario=['products_list'], compare=first, **options)
+        with self.assertRaises(CommandError):
+            call_command('benchmark_api', scenario=['nope'], **options)
+
+
+class BenchmarkHelpersTests(SimpleTestCase):
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual((percentile(samples, 50), percentile(samples, 95), percentile(samples, 100)), (50, 95, 100))
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_compare_flags_p95_and_query_regressions(self):
+        baseline = {'scenarios': {'a': {'p95_ms': 10.0, 'queries_max': 3}, 'b': {'p95_ms': 10.0, 'queries_max': 3}}}
+        current = {'scenarios': {
+            'a': {'p95_ms': 11.0, 'queries_max': 3},
+            'b': {'p95_ms': 10.0, 'queries_max': 4},
+            'nuevo': {'p95_ms': 1.0, 'queries_max': 1},
+        }}
+        rows = {row['scenario']: row for row in compare(baseline, current, tolerance=0.15)}
+        self.assertEqual(set(rows), {'a', 'b'})
+        self.assertFalse(rows['a']['regression'])
+        self.assertTrue(rows['b']['regression'])
+        self.assertTrue(compare(baseline, current, tolerance=0.05)[0]['regression'])
+
+
+# -----------------------------
+# ?fields= Y ?expand=
+# -----------------------------
+class SparseFieldsTests(TenantAPITestCase):
+
+    def test_fields_limits_the_output(self):
+        response = self.client.get('/api/inventory/', {'fields': 'id,stock'})
+        self.assertEqual(response.data['results'][0], {'id': self.inventories[0].pk, 'stock': 10})
+        response = self.client.get(f'/api/branches/{self.branch.pk}/', {'fields': 'name'})
+        self.assertEqual(response.data, {'name': 'Centro'})
+
+    def test_expand_nests_relations_without_extra_queries(self):
+        def list_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/inventory/', {'expand': 'product,branch', 'fields': 'id,product,branch'})
+            return response, len(queries)
+
+        response, before = list_queries()
+        row = response.data['results'][0]
+        self.assertEqual(row['product']['sku'], 's0')
+        self.assertEqual(row['branch']['name'], 'Centro')
+        product = Product.objects.create(company=self.company, sku='s9', name='Otro', price=1, cost=1)
+        Inventory.objects.create(product=product, branch=self.branch, stock=1)
+        response, after = list_queries()
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertEqual(after, before)
+
+    def test_unknown_fields_or_relations_are_rejected(self):
+        self.assertEqual(self.client.get('/api/inventory/', {'fields': 'id,nope'}).status_code, 400)
+        response = self.client.get('/api/branches/', {'expand': 'inventory'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('expand', response.data)
+
+
+# -----------------------------
+# GET CONDICIONAL (ETag / Last-Modified)
+# -----------------------------
+class ConditionalListTests(TenantAPITestCase):
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_unchanged_list_returns_304(self):
+        response = self.client.get('/api/branches/')
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(self.revalidate('/api/branches/', response['ETag']), 304)
+        Branch.objects.create(company=self.company, name='Sur', address='Calle 3')
+        self.assertEqual(self.revalidate('/api/branches/', response['ETag']), 200)
+
+    def test_deletes_change_the_etag(self):
+        url = '/api/inventory/'
+        etag = self.client.get(url)['ETag']
+        Inventory.objects.filter(pk=self.inventories[2].pk).delete()
+        self.assertEqual(self.revalidate(url, etag), 200)
+
+    def test_if_modified_since_alone_never_returns_304(self):
+        url = '/api/inventory/'
+        response = self.client.get(url)
+        last_modified = response['Last-Modified']
+        # borrar no mueve max(updated_at): con la fecha sola el listado parecería igual
+        Inventory.objects.filter(pk=self.inventories[2].pk).delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        # con If-None-Match manda el ETag, aunque If-Modified-Since diga otra cosa
+        response = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'], HTTP_IF_MODIFIED_SINCE='Thu, 01 Jan 1970 00:00:00 GMT',
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_expanded_relations_are_part_of_the_validator(self):
+        plain, expanded = '/api/inventory/', '/api/inventory/?expand=product'
+        etags = {url: self.client.get(url)['ETag'] for url in (plain, expanded)}
+        product = self.products[0]
+        product.name = 'Renombrado'
+        product.save()
+        self.assertEqual(self.revalidate(plain, etags[plain]), 304)
+        self.assertEqual(self.revalidate(expanded, etags[expanded]), 200)
+
+    def test_relations_without_updated_at_skip_the_etag(self):
+        response = self.client.get('/api/products/?expand=company')
+        self.assertNotIn('ETag', response)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.company.name = 'Renombrada'
+            self.company.save()
+        response = self.client.get('/api/products/?expand=company')
+        self.assertEqual(response.data['results'][0]['company']['name'], 'Renombrada')
+
+
+# -----------------------------
+# LIBRO DE STOCK (/api/inventory/stock-at/)
+# -----------------------------
+class StockLedgerTests(TenantAPITestCase):
+
+    def stock_at(self, inventory):
+        row = annotate_stock_at(Inventory.objects.filter(pk=inventory.pk), timezone.now()).get()
+        return row.stock_at
+
+    def test_patch_stock_writes_an_adjustment(self):
+        record_initial_stock(self.inventories)
+        inventory = self.inventories[0]
+        response = self.client.patch(f'/api/inventory/{inventory.pk}/', {'stock': 50}, format='json')
+        self.assertEqual(response.status_code, 200)
+        movement = StockMovement.objects.filter(kind='adjustment').get()
+        self.assertEqual(movement.quantity, 40)
+        response = self.client.get('/api/inventory/stock-at/', {'at': timezone.localdate().isoformat()})
+        stocks = {row['inventory']: row['stock'] for row in response.data['results']}
+        self.assertEqual(stocks, {inv.pk: self.stock(inv) for inv in self.inventories})
+
+    def test_backfill_migration_adds_the_missing_initial_movement(self):
+        # las filas de la base se crean con el ORM, sin movimiento 'initial'
+        record_initial_stock(self.inventories[1:])
+        inventory = self.inventories[0]
+        self.assertEqual(self.sell([{'sku': 's0', 'qty': 4}]).status_code, 201)
+        self.assertEqual(self.stock_at(inventory), -4)
+
+        migration = importlib.import_module('temusoft_app.migrations.0021_backfill_initial_stock')
+        migration.forward(apps, None)
+        initial = StockMovement.objects.get(product=inventory.product, branch=self.branch, kind='initial')
+        self.assertEqual(initial.quantity, 10)
+        sale = StockMovement.objects.get(product=inventory.product, kind='sale')
+        self.assertEqual(initial.created_at, sale.created_at)
+        for inv in self.inventories:
+            self.assertEqual(self.stock_at(inv), self.stock(inv))
+
+        migration.forward(apps, None)
+        self.assertEqual(StockMovement.objects.filter(kind='initial').count(), 3)
+
+
+# -----------------------------
+# RECEPCIÓN DE COMPRAS (/api/purchases/{id}/receive/)
+# -----------------------------
+class PurchaseReceiveTests(TenantAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        body = {'company': self.company.pk, 'items': [
+            {'sku': 's0', 'qty': 6, 'price': '7.00'}, {'sku': 's0', 'qty': 4, 'price': '7.00'},
+            {'sku': 's1', 'qty': 5, 'price': '2.00'},
+        ]}
+        response = self.client.post('/api/purchases/', body, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.purchase_id = response.data['id']
+        self.other_branch = Branch.objects.create(company=self.company, name='Norte', address='Calle 2')
+
+    def receive(self, branch):
+        return self.client.post(f'/api/purchases/{self.purchase_id}/receive/', {'branch': branch.pk}, format='json')
+
+    def test_receive_adds_stock_and_recomputes_weighted_average_cost(self):
+        response = self.receive(self.other_branch)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertIsNotNone(response.data['received_at'])
+        received = dict(
+            Inventory.objects.filter(branch=self.other_branch).values_list('product__sku', 'stock')
+        )
+        self.assertEqual(received, {'s0': 10, 's1': 5})
+        # (10 en Centro * 5 + 10 * 7) / 20 y (10 * 5 + 5 * 2) / 15
+        costs = dict(Product.objects.filter(sku__in=('s0', 's1')).values_list('sku', 'cost'))
+        self.assertEqual(costs, {'s0': Decimal('6.00'), 's1': Decimal('4.00')})
+        movements = StockMovement.objects.filter(kind='purchase', branch=self.other_branch)
+        self.assertEqual(
+            dict(movements.values_list('product__sku', 'quantity')), {'s0': 10, 's1': 5},
+        )
+
+    def test_purchase_is_received_once(self):
+        self.assertEqual(self.receive(self.branch).status_code, 200)
+        self.assertEqual(self.receive(self.branch).status_code, 400)
+        self.assertEqual(self.stock(self.inventories[0]), 20)
+
+    def test_received_purchase_cannot_be_deleted_or_edited(self):
+        self.assertEqual(self.receive(self.branch).status_code, 200)
+        self.assertEqual(self.client.delete(f'/api/purchases/{self.purchase_id}/').status_code, 400)
+        body = {'items': [{'sku': 's2', 'qty': 1, 'price': '1.00'}]}
+        response = self.client.patch(f'/api/purchases/{self.purchase_id}/', body, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_sellers_cannot_receive(self):
+        self.client.force_authenticate(self.make_user('vendedor', 'vendedor', self.company))
+        self.assertEqual(self.receive(self.branch).status_code, 403)
+
+
+# -----------------------------
+# RÉPLICAS DE LECTURA (db_router.ReplicaRouter)
+# -----------------------------
+@override_settings(REPLICA_DATABASES=['replica1'])
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = db_router.ReplicaRouter()
+        self.request_token = db_router.start_request()
+        self.addCleanup(db_router.end_request, self.request_token)
+
+    def test_reads_use_the_replica_only_when_the_view_opts_in(self):
+        self.assertIsNone(self.router.db_for_read(Product))
+        token = db_router.start_replica_reads()
+        try:
+            self.assertEqual(self.router.db_for_read(Product), 'replica1')
+        finally:
+            db_router.end_replica_reads(token)
+        self.assertIsNone(self.router.db_for_read(Product))
+
+    def test_writes_pin_the_rest_of_the_request_to_the_primary(self):
+        token = db_router.start_replica_reads()
+        try:
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+            self.assertIsNone(self.router.db_for_read(Product))
+        finally:
+            db_router.end_replica_reads(token)
+
+    def test_pinned_requests_read_from_the_primary(self):
+        token = db_router.start_request(pinned=True)
+        reads = db_router.start_replica_reads()
+        try:
+            self.assertIsNone(self.router.db_for_read(Product))
+        finally:
+            db_router.end_replica_reads(reads)
+            self.assertFalse(db_router.end_request(token))
+
+    def test_replica_reads_decorator_supports_async_views(self):
+        @db_router.replica_reads
+        async def view():
+            return self.router.db_for_read(Product)
+
+        self.assertEqual(async_to_sync(view)(), 'replica1')
+        self.assertIsNone(self.router.db_for_read(Product))
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'temusoft_app'))
+        self.assertIsNone(self.router.allow_migrate('default', 'temusoft_app'))
+
+
+@override_settings(REPLICA_DATABASES=['replica1'])
+class ReplicaPinningTests(TenantAPITestCase):
+
+    def test_writes_set_the_pin_cookie(self):
+        response = self.sell([{'sku': 's0', 'qty': 1}])
+        self.assertEqual(response.status_code, 201)
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertGreater(float(cookie.value), time.time())
+        self.assertEqual(cookie['max-age'], settings.REPLICA_LAG_TOLERANCE_SECONDS)
+
+    def test_pinned_client_reads_from_the_primary(self):
+        # 'replica1' no existe: la lista solo responde si lee del primario
+        self.client.cookies[settings.REPLICA_PIN_COOKIE] = str(time.time() + 60)
+        response = self.client.get('/api/inventory/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_unhandled_errors_do_not_leak_replica_reads(self):
+        # sin la cookie la lista intenta leer de 'replica1', que no existe
+        with self.assertRaises(Exception):
+            self.client.get('/api/inventory/')
+        # las escrituras de setUpTestData dejaron fijado el primario fuera de las requests
+        token = db_router.start_request()
+        try:
+            self.assertIsNone(db_router.ReplicaRouter().db_for_read(Product))
+        finally:
+            db_router.end_request(token)
+
+
+# -----------------------------
+# LÍMITES POR PLAN (throttling.PlanRateThrottle)
+# -----------------------------
+THROTTLE_RATES = {'basico': {'read': '4/min', 'write': '2/min', 'bulk': '1/min'}}
+
+
+@override_settings(PLAN_THROTTLE_ENABLED=True, PLAN_THROTTLE_RATES=THROTTLE_RATES)
+class PlanThrottleTests(TenantAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def throttle_at(self, now):
+        throttle = PlanRateThrottle()
+        throttle.timer = lambda: now
+        return throttle
+
+    def allowed(self, now, times):
+        request = SimpleNamespace(user=self.user, method='GET')
+        return [self.throttle_at(now).allow_request(request, None) for _ in range(times)]
+
+    def test_drf_and_async_views_share_the_read_limit(self):
+        for url in ('/api/products/', '/api/async/products/', '/api/inventory/', '/api/async/inventory/'):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for url in ('/api/products/', '/api/async/products/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 429)
+            self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_previous_window_counts_in_proportion(self):
+        start = 600 * 60
+        self.assertEqual(self.allowed(start + 30, 5), [True] * 4 + [False])
+        # a mitad de la ventana siguiente, las 4 anteriores cuentan como 2
+        request = SimpleNamespace(user=self.user, method='GET')
+        throttle = self.throttle_at(start + 90)
+        self.assertEqual([throttle.allow_request(request, None) for _ in range(3)], [True, True, False])
+        self.assertEqual(throttle.wait(), 15)
+        self.assertEqual(self.allowed(start + 105, 2), [True, False])
+
+    def test_concurrent_requests_do_not_exceed_the_limit(self):
+        company_plan(self.company.pk)  # el plan queda en caché: los hilos no consultan
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: self.allowed(600 * 60, 1)[0], range(40)))
+        self.assertEqual(results.count(True), 4)
+
+
+# -----------------------------
+# IDEMPOTENCY-KEY (idempotency.py)
+# -----------------------------
+class IdempotencyTests(TenantAPITestCase):
+
+    def sell_with_key(self, key, qty=1):
+        return self.client.post(
+            '/api/sales/', {'branch': self.branch.pk, 'payment_method': 'efectivo', 'items': [{'sku': 's0', 'qty': qty}]},
+            format='json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.sell_with_key('caja-1')
+        self.assertEqual(first.status_code, 201)
+        retry = self.sell_with_key('caja-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(self.stock(self.inventories[0]), 9)
+
+    def test_same_key_with_another_body_is_rejected(self):
+        self.assertEqual(self.sell_with_key('caja-1').status_code, 201)
+        self.assertEqual(self.sell_with_key('caja-1', qty=2).status_code, 422)
+
+    def test_errors_release_the_key(self):
+        self.assertEqual(self.sell_with_key('caja-1', qty=99).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.sell_with_key('caja-1').status_code, 201)
+
+    def test_exceptions_roll_back_the_key_with_the_request(self):
+        request = Request(APIRequestFactory().post('/api/sales/', {}, format='json', HTTP_IDEMPOTENCY_KEY='caja-1'),
+                          parsers=[JSONParser()])
+        request.user = self.user
+
+        def handler():
+            Sale.objects.create(branch=self.branch, user=self.user, payment_method='efectivo', total=1)
+            raise RuntimeError('el worker se cayó')
+
+        with self.assertRaises(RuntimeError):
+            run_idempotent(request, handler)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertFalse(Sale.objects.exists())
+
+    def test_keys_without_response_are_never_taken_over(self):
+        # fila de una versión anterior, que confirmaba la clave antes de procesar
+        IdempotencyKey.objects.create(
+            user=self.user, key='caja-1', request_hash='x', locked_at=timezone.now() - timedelta(hours=1),
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        response = self.client.post('/api/sales/', {}, format='json', HTTP_IDEMPOTENCY_KEY='caja-1')
+        self.assertEqual(response.status_code, 422)
+        IdempotencyKey.objects.update(request_hash=request_fingerprint(Request(
+            APIRequestFactory().post('/api/sales/', {}, format='json'), parsers=[JSONParser()],
+        )))
+        response = self.client.post('/api/sales/', {}, format='json', HTTP_IDEMPOTENCY_KEY='caja-1')
+        self.assertEqual(response.status_code, 409)
+
+
+# -----------------------------
+# TRABAJOS EN SEGUNDO PLANO (/api/jobs/, jobs.py)
+# -----------------------------
+class JobApiTests(TenantAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.files_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(JOB_FILES_DIR=self.files_dir))
+
+    def test_background_import_goes_through_the_params_serializer(self):
+        rows = [{'sku': 'n1', 'name': 'Nuevo', 'price': '1', 'cost': '1'}]
+        response = self.client.post('/api/products/import/?background=1', {'products': rows}, format='json')
+        self.assertEqual(response.status_code, 202)
+        job = Job.objects.get(pk=response.data['id'])
+        self.assertTrue(response['Location'].endswith(f'/api/jobs/{job.pk}/'))
+        self.assertEqual((job.kind, job.company_id, job.status), ('import_products', self.company.pk, 'queued'))
+        # la company sale del usuario, no de los params
+        self.assertEqual(job.params, {'company': None, 'products': rows})
+
+    def test_background_file_import_keeps_the_upload(self):
+        upload = SimpleUploadedFile('catalogo.csv', b'sku,name,price,cost\nn1,Nuevo,1,1\n')
+        response = self.client.post('/api/products/import/?background=1', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        params = Job.objects.get(pk=response.data['id']).params
+        self.assertEqual(params['fmt'], 'csv')
+        self.assertTrue(os.path.exists(os.path.join(self.files_dir, params['upload'])))
+
+    def test_clients_cannot_choose_the_upload(self):
+        body = {'kind': 'import_products', 'params': {'upload': '../../etc/passwd', 'fmt': 'csv'}}
+        response = self.client.post('/api/jobs/', body, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('products', response.data)
+        self.assertFalse(Job.objects.exists())
+
+    def test_job_kind_permissions(self):
+        self.client.force_authenticate(self.make_user('gerente', 'gerente', self.company))
+        rows = [{'sku': 'n1', 'name': 'Nuevo', 'price': '1', 'cost': '1'}]
+        self.assertEqual(self.client.post('/api/products/import/?background=1', {'products': rows},
+                                          format='json').status_code, 403)
+        body = {'kind': 'import_products', 'params': {'products': rows}}
+        self.assertEqual(self.client.post('/api/jobs/', body, format='json').status_code, 403)
+        body = {'kind': 'export_sales', 'params': {'output': 'csv'}}
+        self.assertEqual(self.client.post('/api/jobs/', body, format='json').status_code, 201)
+        self.client.force_authenticate(self.make_user('vendedor', 'vendedor', self.company))
+        self.assertEqual(self.client.post('/api/jobs/', body, format='json').status_code, 403)
+
+    def test_cancel_a_queued_job(self):
+        job = self.client.post('/api/jobs/', {'kind': 'export_sales', 'params': {}}, format='json').data
+        response = self.client.post(f"/api/jobs/{job['id']}/cancel/")
+        self.assertEqual(response.data['status'], 'cancelled')
+        self.assertEqual(self.client.post(f"/api/jobs/{job['id']}/cancel/").status_code, 400)
+
+
+class JobRunTests(TransactionTestCase):
+    """run_job cierra las conexiones al terminar: necesita transacciones reales."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Empresa A', rut='11111111-1')
+        Branch.objects.create(company=self.company, name='Centro', address='Calle 1')
+        self.user = User.objects.create_user(
+            username='admin', password='clave12345', role='admin_cliente', company=self.company,
+        )
+        self.files_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(JOB_FILES_DIR=self.files_dir))
+
+    def run_next(self):
+        (job_id,) = claim_jobs('test', 1)
+        run_job(job_id)
+        return Job.objects.get(pk=job_id)
+
+    def test_file_import_runs_and_removes_the_upload(self):
+        name = save_upload(SimpleUploadedFile('c.csv', b'sku,name,price,cost,stock\nn1,Nuevo,1,1,5\n'), 'csv')
+        enqueue('import_products', {'company': None, 'upload': name, 'fmt': 'csv'},
+                user=self.user, company_id=self.company.pk)
+        job = self.run_next()
+        self.assertEqual(job.status, 'succeeded', job.error)
+        self.assertEqual(job.result['created'], 1)
+        self.assertEqual(Inventory.objects.get(product__sku='n1').stock, 5)
+        self.assertFalse(os.path.exists(os.path.join(self.files_dir, name)))
+
+    def test_failures_are_retried_then_marked_failed(self):
+        enqueue('import_products', {'company': None, 'upload': 'no-existe.csv', 'fmt': 'csv'},
+                user=self.user, company_id=self.company.pk)
+        job = self.run_next()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('FileNotFoundError', job.error)
+        Job.objects.update(run_after=timezone.now(), attempts=job.max_attempts - 1)
+        self.assertEqual(self.run_next().status, 'failed')
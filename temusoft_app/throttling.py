@@ -0,0 +1,126 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from .cache import plan_cache, plan_key, throttle_cache
+from .mixins import is_super_admin
+from .models import Subscription
+
+# -----------------------------
+# LÍMITES POR PLAN DE SUSCRIPCIÓN
+# -----------------------------
+# Cada company tiene un límite por tipo de request (read, write, bulk) según
+# su plan (settings.PLAN_THROTTLE_RATES), contado en una ventana deslizante:
+# contadores por ventana fija de `period` segundos y, como estimación de la
+# ventana que termina ahora, el contador actual más la parte proporcional del
+# anterior. Así un tenant que satura la API agota solo sus propios límites.
+# El plan se lee de una caché que se invalida al guardar una Subscription
+# (signals.py) y los contadores viven en la caché THROTTLE_CACHE_ALIAS
+# (compartida entre procesos si es Redis/Memcached). Se incrementan con
+# cache.add + cache.incr, que son atómicos en esos backends (y en locmem):
+# requests simultáneas de una company no se pueden colar entre la lectura y
+# la escritura. El costo por request son unas pocas operaciones de caché,
+# sin consultas.
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'300/min' -> (300, 60): requests permitidas y segundos de la ventana."""
+    try:
+        num, period = rate.split('/')
+        return int(num), PERIODS[period[0]]
+    except (ValueError, KeyError):
+        raise ImproperlyConfigured(f"Tasa de throttling inválida: {rate!r} (formato '<n>/<s|min|hour|day>').")
+
+
+def company_plan(company_id):
+    """
+    plan_name de la Subscription activa y vigente de la company (None si no
+    tiene). Se cachea también la ausencia de plan, para no consultar en cada
+    request; el TTL acota cuánto sigue vigente un plan vencido.
+    """
+    cache = plan_cache()
+    key = plan_key(company_id)
+    plan = cache.get(key)
+    if plan is None:
+        today = timezone.localdate()
+        plan = (
+            Subscription.objects.filter(company_id=company_id, active=True, start_date__lte=today, end_date__gte=today)
+            .order_by('-end_date')
+            .values_list('plan_name', flat=True)
+            .first()
+        ) or ''
+        cache.set(key, plan, settings.PLAN_CACHE_TIMEOUT)
+    return plan or None
+
+
+class PlanRateThrottle(BaseThrottle):
+    """
+    Throttle de DRF por company según su plan.
+
+    - Límite 'bulk' para las acciones que la vista declara en `bulk_actions`
+      (importaciones, lotes, exportaciones), 'read' para los métodos seguros y
+      'write' para el resto.
+    - Companies sin suscripción vigente usan PLAN_THROTTLE_DEFAULT_PLAN.
+    - super_admin y usuarios sin company no se limitan.
+    - PLAN_THROTTLE_ENABLED=False lo desactiva (los comandos de benchmark).
+
+    También lo aplican las vistas async (async_views.async_jwt_required),
+    con `view=None`: cuentan como 'read'.
+    """
+    timer = time.time
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_bucket(self, request, view):
+        if getattr(view, 'action', None) in getattr(view, 'bulk_actions', ()):
+            return 'bulk'
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def allow_request(self, request, view):
+        if not settings.PLAN_THROTTLE_ENABLED:
+            return True
+        user = request.user
+        company_id = getattr(user, 'company_id', None)
+        if not company_id or is_super_admin(user):
+            return True
+
+        plan = company_plan(company_id) or settings.PLAN_THROTTLE_DEFAULT_PLAN
+        bucket = self.get_bucket(request, view)
+        limit, period = parse_rate(settings.PLAN_THROTTLE_RATES[plan][bucket])
+
+        cache = throttle_cache()
+        now = self.timer()
+        window, elapsed = divmod(now, period)
+        key = f'throttle:{company_id}:{bucket}:{int(window)}'
+        # la clave vive dos ventanas: la actual y la siguiente, donde es la anterior
+        cache.add(key, 0, timeout=2 * period)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            # la caché descartó la clave entre add e incr (locmem al llenarse)
+            cache.set(key, 1, timeout=2 * period)
+            count = 1
+        previous = cache.get(f'throttle:{company_id}:{bucket}:{int(window) - 1}', 0)
+        weight = 1 - elapsed / period
+        if previous * weight + count <= limit:
+            return True
+        # las rechazadas no cuentan, como en SimpleRateThrottle de DRF
+        cache.decr(key)
+        count -= 1
+        # hasta que el aporte de la ventana anterior baje lo suficiente, o
+        # como mucho hasta que empiece la siguiente
+        remaining = period - elapsed
+        if previous:
+            remaining = min(remaining, max(0, previous * weight + count + 1 - limit) * period / previous)
+        self.retry_after = remaining
+        return False
+
+    def wait(self):
+        return self.retry_after
@@ -1,8 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
     UserViewSet, ProductViewSet, BranchViewSet, CompanyViewSet,
-    InventoryViewSet, SupplierViewSet, SaleViewSet, PurchaseViewSet
+    InventoryViewSet, SupplierViewSet, SaleViewSet, PurchaseViewSet, ReportViewSet, JobViewSet, MetricsView
 )
 
 
@@ -15,8 +16,17 @@ router.register(r'inventory', InventoryViewSet)
 router.register(r'suppliers', SupplierViewSet)
 router.register(r'sales', SaleViewSet)
 router.register(r'purchases', PurchaseViewSet)
+router.register(r'reports', ReportViewSet, basename='report')
+router.register(r'jobs', JobViewSet)
 
 urlpatterns = [
+    # lecturas async (ASGI)
+    path('async/products/', async_views.products, name='async-products'),
+    path('async/inventory/', async_views.inventory, name='async-inventory'),
+    path('async/users/me/', async_views.me, name='async-user-me'),
+
+    path('_metrics/', MetricsView.as_view(), name='metrics'),
+
     path('', include(router.urls)),
 
 ]
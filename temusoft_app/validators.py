@@ -2,11 +2,11 @@ def clean_rut(rut: str) -> str:
     return ''.join(ch for ch in rut if ch.isalnum()).upper()
 
 def valid_rut(rut: str) -> bool:
-    r = clean_rut(r)
+    r = clean_rut(rut or '')
     if len(r) < 2: return False
     body, dv = r[:-1], r[-1]
     try:
-        reversed_digits = map(int, reversed(body))
+        reversed_digits = list(map(int, reversed(body)))
     except ValueError:
         return False
     factors = [2,3,4,5,6,7]
@@ -1,39 +1,117 @@
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
-from .models import User, Product, Branch, Inventory, Supplier, Sale, Purchase, Company
+from .models import User, Product, Branch, Inventory, Supplier, Sale, Purchase, Company, DailySalesRollup, PurchaseLine, SaleLine, Job
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from .serializers import (
     UserSerializer, ProductSerializer, BranchSerializer,
     InventorySerializer, SupplierSerializer, SaleSerializer,
-    PurchaseSerializer, CompanySerializer
+    PurchaseSerializer, CompanySerializer, SaleBatchRowSerializer,
+    StockAdjustmentSerializer, StockTransferSerializer, PurchaseReceiveSerializer, JobSerializer,
 )
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.conf import settings
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+import os
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from .services import (
+    adjust_stock, annotate_stock_at, post_sales_batch, receive_purchase, record_initial_stock, transfer_stock,
+    void_sale,
+)
+from .pagination import JobCursorPagination, SaleCursorPagination
+from .idempotency import idempotent
+from .mixins import (
+    ConditionalListMixin, IdempotentCreateMixin, ReplicaReadMixin, SparseFieldsMixin, TenantScopedMixin,
+    is_super_admin,
+)
+from .permissions import IsManagerOrAbove, IsSuperAdmin, IsSuperAdminOrAdminCliente
+from .cache import catalog_cache, catalog_key
+from .search import search_products
+from .imports import IMPORT_FORMATS, import_products, read_rows
+from .exports import (
+    EXPORT_FORMATS, PURCHASE_COLUMNS, SALE_COLUMNS, date_bounds, export_response, filter_export_lines,
+)
+from .jobs import cancel_job, remove_job_file, save_upload, submit_job
+from .metrics import registry as metrics_registry
+from django.http import FileResponse, HttpResponse
+from rest_framework.views import APIView
 
-# -----------------------------
-# VIEWSETS
-# -----------------------------
-class CompanyViewSet(viewsets.ModelViewSet):
-    queryset = Company.objects.all()
-    serializer_class = CompanySerializer
-    permission_classes = [permissions.IsAuthenticated]  # luego puedes ajustar a super_admin
+def parse_date_param(value, name):
+    """Fecha YYYY-MM-DD de un query param (None si no viene)."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValidationError({name: ["Formato de fecha inválido (YYYY-MM-DD)."]})
+
+
+def parse_id_param(value, name):
+    """Id numérico de un query param (None si no viene)."""
+    if not value:
+        return None
+    if not value.isdigit():
+        raise ValidationError({name: ["Debe ser un id numérico."]})
+    return int(value)
+
+
+def parse_datetime_param(value, name):
+    """Fecha y hora ISO de un query param (None si no viene). Una fecha sola equivale al cierre de ese día."""
+    if not value:
+        return None
+    if len(value) == 10:
+        # parse_datetime acepta '2024-05-01' como medianoche; aquí es el fin del día
+        day = parse_date_param(value, name)
+        return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min)) - timedelta(microseconds=1)
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: ["Fecha u hora inválida (YYYY-MM-DD o ISO 8601)."]})
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+def export_params(request):
+    """Formato y rango de fechas (límites en hora local) para los endpoints de exportación."""
+    output = request.query_params.get('output', 'csv')
+    if output not in EXPORT_FORMATS:
+        raise ValidationError({'output': [f"Valores permitidos: {', '.join(EXPORT_FORMATS)}."]})
+    date_from = parse_date_param(request.query_params.get('date_from'), 'date_from')
+    date_to = parse_date_param(request.query_params.get('date_to'), 'date_to')
+    return (output, *date_bounds(date_from, date_to))
+
+
+def job_accepted(request, job):
+    """202 con el trabajo encolado; el cliente sigue su avance en /api/jobs/{id}/."""
+    location = reverse('job-detail', args=[job.pk], request=request)
+    return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED, headers={'Location': location})
+
+
+def background_response(request, view, kind, params):
+    """Con ?background=1 un endpoint pesado encola el trabajo `kind` en vez de responder en línea."""
+    return job_accepted(request, submit_job(request, kind, params, view))
 
-# -----------------------------
-# UserViewSet (con reglas)
 # -----------------------------
 # VIEWSETS
 # -----------------------------
-class CompanyViewSet(viewsets.ModelViewSet):
+class CompanyViewSet(SparseFieldsMixin, TenantScopedMixin, viewsets.ModelViewSet):
     queryset = Company.objects.all()
     serializer_class = CompanySerializer
     permission_classes = [permissions.IsAuthenticated]  # ajustar a super_admin si se desea
+    tenant_field = 'pk'
 
 # -----------------------------
 # UserViewSet (con reglas y endpoint /me/)
 # -----------------------------
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """
     Comportamiento:
     - create: solo super_admin o admin_cliente pueden crear.
@@ -79,41 +157,35 @@ class UserViewSet(viewsets.ModelViewSet):
         # otros roles no pueden crear
         raise PermissionDenied("No tienes permisos para crear usuarios.")
 
+    def get_queryset(self):
+        """
+        El alcance de cada rol se aplica en el SQL: un usuario fuera de ese
+        alcance no se carga nunca (get_object responde 404).
+        """
+        qs = super().get_queryset()
+        yo = self.request.user
+        if is_super_admin(yo):
+            return qs
+        if getattr(yo, "role", None) == "admin_cliente":
+            return qs.filter(company_id=yo.company_id)
+        return qs.filter(pk=yo.pk)
+
     def list(self, request, *args, **kwargs):
         yo = request.user
-        if getattr(yo, "is_superuser", False) or (getattr(yo, "role", None) == "super_admin"):
+        if is_super_admin(yo) or getattr(yo, "role", None) == "admin_cliente":
             return super().list(request, *args, **kwargs)
 
-        if getattr(yo, "role", None) == "admin_cliente":
-            qs = self.get_queryset().filter(company_id=yo.company_id)
-            page = self.paginate_queryset(qs)
-            if page is not None:
-                serializer = self.get_serializer(page, many=True)
-                return self.get_paginated_response(serializer.data)
-            serializer = self.get_serializer(qs, many=True)
-            return Response(serializer.data)
-
         raise PermissionDenied("No tienes permisos para listar usuarios.")
 
     def get_object(self):
         """
-        Reglas por objeto (retrieve/update/destroy).
+        Reglas por objeto (retrieve/update/destroy). La pertenencia a la
+        empresa (admin_cliente) o al propio usuario (gerente/vendedor) ya
+        viene filtrada en get_queryset.
         """
-        obj = super().get_object()
         yo = self.request.user
-
-        if getattr(yo, "is_superuser", False) or (getattr(yo, "role", None) == "super_admin"):
-            return obj
-
-        if getattr(yo, "role", None) == "admin_cliente":
-            if obj.company_id != yo.company_id:
-                raise PermissionDenied("Ese usuario no pertenece a tu empresa.")
-            return obj
-
-        if getattr(yo, "role", None) in ["gerente", "vendedor"]:
-            if obj.id != yo.id:
-                raise PermissionDenied("No puedes acceder a otros usuarios.")
-            return obj
+        if is_super_admin(yo) or getattr(yo, "role", None) in ["admin_cliente", "gerente", "vendedor"]:
+            return super().get_object()
 
         raise PermissionDenied("No tienes permisos para esto.")
 
@@ -126,35 +198,558 @@ class UserViewSet(viewsets.ModelViewSet):
         Devuelve los datos del usuario autenticado.
         GET /api/users/me/
         """
-        serializer = self.get_serializer(request.user)
+        # request.user puede venir de la caché de autenticación con solo
+        # algunos campos cargados: se lee completo en una consulta
+        serializer = self.get_serializer(User.objects.get(pk=request.user.pk))
         return Response(serializer.data)
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(SparseFieldsMixin, ConditionalListMixin, TenantScopedMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
+    sparse_actions = ('list', 'retrieve', 'search')
+    bulk_actions = ('import_catalog',)  # bucket 'bulk' de PlanRateThrottle
+
+    def list_response(self, request, *args, **kwargs):
+        """
+        El catálogo de la company se sirve desde caché (temusoft_app/cache.py):
+        ni la consulta ni ProductSerializer se repiten mientras no cambie
+        ningún producto. super_admin (sin company) no usa caché. Antes de
+        llegar aquí ConditionalListMixin ya respondió 304 si el cliente tenía
+        la versión vigente.
+        """
+        company_id = getattr(request.user, 'company_id', None)
+        if is_super_admin(request.user) or not company_id:
+            return super().list_response(request, *args, **kwargs)
+
+        cache = catalog_cache()
+        key = catalog_key(company_id, request.build_absolute_uri())
+        data = cache.get(key)
+        if data is None:
+            response = super().list_response(request, *args, **kwargs)
+            cache.set(key, response.data, timeout=settings.CATALOG_CACHE_TIMEOUT)
+            return response
+        return Response(data)
+
+    # -------------------------
+    # Endpoint adicional: /api/products/import/
+    # -------------------------
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsSuperAdminOrAdminCliente])
+    def import_catalog(self, request):
+        """
+        Carga masiva del catálogo con upsert por (company, sku).
+        POST /api/products/import/
+          - multipart con `file` (CSV o NDJSON; el formato se toma de ?input= o de la extensión), o
+          - JSON {"products": [{sku, name, price, cost, ...}, ...]}
+        super_admin debe indicar ?company=<id>. Responde un reporte con errores por fila.
+        Con ?background=1 responde 202 y la importación corre como trabajo (/api/jobs/).
+        """
+        company_id = request.user.company_id
+        if is_super_admin(request.user):
+            company_id = parse_id_param(request.query_params.get('company'), 'company')
+            if not company_id or not Company.objects.filter(pk=company_id).exists():
+                raise ValidationError({'company': ["Indica una company válida con ?company=<id>."]})
+
+        upload = request.FILES.get('file')
+        if upload is not None:
+            fmt = request.query_params.get('input') or upload.name.rsplit('.', 1)[-1].lower()
+            if fmt not in IMPORT_FORMATS:
+                raise ValidationError({'input': [f"Valores permitidos: {', '.join(IMPORT_FORMATS)}."]})
+            if request.query_params.get('background'):
+                return self.import_in_background(request, company_id, upload=(save_upload(upload, fmt), fmt))
+            rows = read_rows(upload, fmt)
+        else:
+            rows = request.data.get('products') if isinstance(request.data, dict) else request.data
+            if not isinstance(rows, list):
+                raise ValidationError({'products': ["Se espera una lista de productos o un archivo en `file`."]})
+            if request.query_params.get('background'):
+                return self.import_in_background(request, company_id, products=rows)
+
+        report = import_products(company_id, rows, chunk_size=settings.PRODUCT_IMPORT_CHUNK_SIZE)
+        if 'error' in report and not report['processed']:
+            raise ValidationError({'file': [report['error']]})
+        # si falló a mitad de archivo, lo anterior ya quedó importado: 200 con el error en el reporte
+        return Response(report)
+
+    def import_in_background(self, request, company_id, products=None, upload=None):
+        """Encola 'import_products' con las mismas validaciones que POST /api/jobs/."""
+        params = {'company': company_id}
+        if products is not None:
+            params['products'] = products
+        try:
+            job = submit_job(request, 'import_products', params, self, upload=upload)
+        except Exception:
+            if upload is not None:
+                remove_job_file(upload[0])
+            raise
+        return job_accepted(request, job)
+
+    # -------------------------
+    # Endpoint adicional: /api/products/search/
+    # -------------------------
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        """
+        Búsqueda type-ahead por nombre, SKU o categoría dentro de la company.
+        GET /api/products/search/?q=<texto>&limit=20
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 100)
+        except ValueError:
+            raise ValidationError({'limit': ["Debe ser un número entero."]})
+        if limit < 1:
+            raise ValidationError({'limit': ["Debe ser mayor que 0."]})
+        company_id = None if is_super_admin(request.user) else request.user.company_id
+        products = search_products(self.get_queryset(), request.query_params.get('q', ''), limit, company_id)
+        serializer = self.get_serializer(products, many=True)
+        return Response(serializer.data)
 
-class BranchViewSet(viewsets.ModelViewSet):
+class BranchViewSet(SparseFieldsMixin, ConditionalListMixin, TenantScopedMixin, viewsets.ModelViewSet):
     queryset = Branch.objects.all()
     serializer_class = BranchSerializer
     permission_classes = [IsAuthenticated]
 
-class InventoryViewSet(viewsets.ModelViewSet):
+class InventoryViewSet(
+    ReplicaReadMixin, SparseFieldsMixin, ConditionalListMixin, TenantScopedMixin, viewsets.ModelViewSet,
+):
     queryset = Inventory.objects.all()
     serializer_class = InventorySerializer
     permission_classes = [IsAuthenticated]
+    tenant_field = 'branch__company_id'
+    replica_actions = ('list', 'retrieve', 'stock_at', 'low_stock')
+
+    def filter_queryset(self, queryset):
+        # GET /api/inventory/?branch=<id>; también lo ve el ETag de ConditionalListMixin
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list':
+            branch = parse_id_param(self.request.query_params.get('branch'), 'branch')
+            if branch:
+                queryset = queryset.filter(branch_id=branch)
+        return queryset
+
+    # los cambios de stock pasan por services.py para quedar en el libro de movimientos
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            super().perform_create(serializer)
+            record_initial_stock([serializer.instance], user=self.request.user)
+
+    def perform_update(self, serializer):
+        stock = serializer.validated_data.pop('stock', None)
+        with transaction.atomic():
+            super().perform_update(serializer)
+            if stock is not None:
+                adjust_stock(serializer.instance, stock=stock, user=self.request.user, note="Edición de inventario")
+
+    # -------------------------
+    # Endpoint adicional: /api/inventory/{id}/adjust/
+    # -------------------------
+    @action(detail=True, methods=['post'], url_path='adjust', permission_classes=[IsManagerOrAbove])
+    def adjust(self, request, pk=None):
+        """
+        Ajuste manual de stock (conteo físico, merma...).
+        POST /api/inventory/{id}/adjust/  {"stock": 40} o {"delta": -3}, "note" opcional
+        """
+        serializer = StockAdjustmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        inventory = adjust_stock(self.get_object(), user=request.user, **serializer.validated_data)
+        return Response(InventorySerializer(inventory).data)
+
+    # -------------------------
+    # Endpoint adicional: /api/inventory/transfer/
+    # -------------------------
+    @action(detail=False, methods=['post'], url_path='transfer', permission_classes=[IsManagerOrAbove])
+    def transfer(self, request):
+        """
+        Traspaso de stock entre sucursales de la empresa.
+        POST /api/inventory/transfer/  {"from_branch": 1, "to_branch": 2, "items": [{"sku", "qty"}], "note"}
+        """
+        serializer = StockTransferSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        self.check_tenant_objects(data)
+        items = transfer_stock(data['from_branch'], data['to_branch'], data['items'], user=request.user, note=data['note'])
+        return Response({'from_branch': data['from_branch'].pk, 'to_branch': data['to_branch'].pk, 'items': items})
+
+    # -------------------------
+    # Endpoint adicional: /api/inventory/stock-at/
+    # -------------------------
+    @action(detail=False, methods=['get'], url_path='stock-at')
+    def stock_at(self, request):
+        """
+        Stock en una fecha pasada, desde el libro de movimientos.
+        GET /api/inventory/stock-at/?at=YYYY-MM-DD[THH:MM[:SS]]&branch=<id>&product=<id>
+        Con solo fecha se usa el cierre de ese día (hora local).
+        """
+        at = parse_datetime_param(request.query_params.get('at'), 'at')
+        if at is None:
+            raise ValidationError({'at': ["Este parámetro es obligatorio."]})
+        queryset = self.filter_tenant(Inventory.objects.all())
+        for param in ('branch', 'product'):
+            value = parse_id_param(request.query_params.get(param), param)
+            if value:
+                queryset = queryset.filter(**{f'{param}_id': value})
+        queryset = annotate_stock_at(queryset, at).values(
+            'id', 'branch_id', 'product_id', 'product__sku', 'stock_at',
+        )
+        page = self.paginate_queryset(queryset)
+        rows = [
+            {'inventory': row['id'], 'branch': row['branch_id'], 'product': row['product_id'],
+             'sku': row['product__sku'], 'stock': row['stock_at']}
+            for row in page
+        ]
+        response = self.get_paginated_response(rows)
+        response.data['at'] = at
+        return response
+
+    # -------------------------
+    # Endpoint adicional: /api/inventory/low-stock/
+    # -------------------------
+    @action(detail=False, methods=['get'], url_path='low-stock')
+    def low_stock(self, request):
+        """
+        Productos en o bajo su punto de reorden, agrupados por sucursal, y una
+        compra sugerida agrupada por proveedor (el de la última compra del
+        producto). GET /api/inventory/low-stock/?branch=<id>
 
-class SupplierViewSet(viewsets.ModelViewSet):
+        Es una sola consulta: el filtro stock <= reorder_point coincide con el
+        índice parcial inventory_low_stock_idx y el proveedor se obtiene con
+        una subconsulta sobre el índice (product, created_at) de PurchaseLine.
+        """
+        last_purchase = PurchaseLine.objects.filter(
+            product_id=OuterRef('product_id'),
+            purchase__supplier__isnull=False,
+        ).order_by('-created_at', '-id')
+        qs = (
+            self.get_queryset()
+            .filter(stock__lte=F('reorder_point'))
+            .annotate(
+                supplier_id=Subquery(last_purchase.values('purchase__supplier_id')[:1]),
+                supplier_name=Subquery(last_purchase.values('purchase__supplier__name')[:1]),
+            )
+            .values(
+                'id', 'stock', 'reorder_point', 'branch_id', 'branch__name',
+                'product_id', 'product__sku', 'product__name', 'product__cost',
+                'supplier_id', 'supplier_name',
+            )
+            .order_by('branch_id', 'product_id')
+        )
+        branch = parse_id_param(request.query_params.get('branch'), 'branch')
+        if branch:
+            qs = qs.filter(branch_id=branch)
+
+        factor = settings.LOW_STOCK_TARGET_FACTOR
+        branches = {}
+        suppliers = {}
+        for row in qs:
+            suggested = max(row['reorder_point'] * factor - row['stock'], 0)
+            branches.setdefault(row['branch_id'], {
+                'branch': row['branch_id'], 'branch_name': row['branch__name'], 'items': [],
+            })['items'].append({
+                'inventory': row['id'],
+                'product': row['product_id'],
+                'sku': row['product__sku'],
+                'name': row['product__name'],
+                'stock': row['stock'],
+                'reorder_point': row['reorder_point'],
+                'suggested_qty': suggested,
+            })
+            if not suggested:
+                continue
+            group = suppliers.setdefault(row['supplier_id'], {
+                'supplier': row['supplier_id'], 'supplier_name': row['supplier_name'], 'items': {}, 'total': Decimal('0'),
+            })
+            # el mismo producto puede faltar en varias sucursales: se pide una sola línea
+            item = group['items'].setdefault(row['product_id'], {
+                'product': row['product_id'], 'sku': row['product__sku'], 'qty': 0, 'unit_cost': row['product__cost'],
+            })
+            item['qty'] += suggested
+            group['total'] += suggested * row['product__cost']
+
+        suggested_purchase = []
+        for group in suppliers.values():
+            items = list(group['items'].values())
+            for item in items:
+                item['unit_cost'] = str(item['unit_cost'])
+            suggested_purchase.append({**group, 'items': items, 'total': str(group['total'])})
+        return Response({'branches': list(branches.values()), 'suggested_purchase': suggested_purchase})
+
+class SupplierViewSet(SparseFieldsMixin, TenantScopedMixin, viewsets.ModelViewSet):
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
     permission_classes = [IsAuthenticated]
 
-class SaleViewSet(viewsets.ModelViewSet):
-    queryset = Sale.objects.all()
+class SaleViewSet(
+    IdempotentCreateMixin, ReplicaReadMixin, SparseFieldsMixin, TenantScopedMixin, viewsets.ModelViewSet,
+):
+    queryset = Sale.objects.prefetch_related('lines')
     serializer_class = SaleSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = SaleCursorPagination
+    tenant_field = 'branch__company_id'
+    replica_actions = ('list', 'retrieve', 'export')
+    bulk_actions = ('batch', 'export')
+
+    def perform_create(self, serializer):
+        # el vendedor es el usuario autenticado; el stock se descuenta en services.post_sale
+        self.check_tenant_objects(serializer.validated_data)
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        # si la venta sigue vigente se anula primero para devolver el stock y corregir el resumen
+        if instance.voided_at is None:
+            void_sale(instance, user=self.request.user)
+        instance.delete()
+
+    # -------------------------
+    # Endpoint adicional: /api/sales/{id}/void/
+    # -------------------------
+    @action(detail=True, methods=['post'], url_path='void', permission_classes=[IsManagerOrAbove])
+    def void(self, request, pk=None):
+        """
+        Anula una venta: devuelve el stock a la sucursal y la descuenta del
+        resumen diario. POST /api/sales/{id}/void/
+        """
+        sale = void_sale(self.get_object(), user=request.user)
+        return Response(self.get_serializer(sale).data)
 
-class PurchaseViewSet(viewsets.ModelViewSet):
-    queryset = Purchase.objects.all()
+    # -------------------------
+    # Endpoint adicional: /api/sales/export/
+    # -------------------------
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        """
+        Exporta las líneas de venta en streaming (memoria constante).
+        GET /api/sales/export/?output=csv|ndjson&branch=<id>&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD
+        Con ?background=1 responde 202 y el archivo se genera como trabajo (/api/jobs/).
+        """
+        if request.query_params.get('background'):
+            return background_response(request, self, 'export_sales', request.query_params.dict())
+        output, lower, upper = export_params(request)
+        # se valida antes de empezar el streaming: después ya no se puede responder 400
+        branch = parse_id_param(request.query_params.get('branch'), 'branch')
+        lines = filter_export_lines(self.filter_tenant(SaleLine.objects.all()), lower, upper, branch_id=branch)
+        return export_response(lines, SALE_COLUMNS, output, 'ventas')
+
+    # -------------------------
+    # Endpoint adicional: /api/sales/batch/
+    # -------------------------
+    @action(detail=False, methods=['post'], url_path='batch')
+    @idempotent
+    def batch(self, request):
+        """
+        Sincroniza un lote de ventas de una caja que estuvo offline.
+        POST /api/sales/batch/  {"sales": [{branch, payment_method, items}, ...]}
+
+        Cada fila se valida por separado y el resultado es por fila, así que
+        una venta inválida o sin stock no bloquea al resto del lote. Con el
+        header Idempotency-Key, reenviar el mismo lote no lo registra dos veces.
+        """
+        rows = request.data.get('sales') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list):
+            raise ValidationError({'sales': ["Se espera una lista de ventas."]})
+        if len(rows) > settings.SALES_BATCH_MAX_SIZE:
+            raise ValidationError({'sales': [f"Máximo {settings.SALES_BATCH_MAX_SIZE} ventas por lote."]})
+
+        validated = []
+        errors = {}
+        for index, row in enumerate(rows):
+            serializer = SaleBatchRowSerializer(data=row)
+            if serializer.is_valid():
+                validated.append(serializer.validated_data)
+            else:
+                validated.append(None)
+                errors[index] = serializer.errors
+
+        posted = post_sales_batch(
+            validated,
+            user=request.user,
+            company_id=None if is_super_admin(request.user) else request.user.company_id,
+            chunk_size=settings.SALES_BATCH_CHUNK_SIZE,
+        )
+
+        results = []
+        for index, result in enumerate(posted):
+            if index in errors:
+                results.append({'index': index, 'status': 'error', 'errors': errors[index]})
+            elif 'errors' in result:
+                results.append({'index': index, 'status': 'error', 'errors': result['errors']})
+            else:
+                results.append({'index': index, 'status': 'created', 'id': result['id'], 'total': str(result['total'])})
+        created = sum(1 for r in results if r['status'] == 'created')
+        return Response({'created': created, 'failed': len(results) - created, 'results': results})
+
+class PurchaseViewSet(
+    IdempotentCreateMixin, ReplicaReadMixin, SparseFieldsMixin, TenantScopedMixin, viewsets.ModelViewSet,
+):
+    queryset = Purchase.objects.prefetch_related('lines')
     serializer_class = PurchaseSerializer
     permission_classes = [IsAuthenticated]
+    replica_actions = ('list', 'retrieve', 'export')
+    bulk_actions = ('export',)
+
+    def perform_destroy(self, instance):
+        if instance.received_at:
+            raise ValidationError("La compra ya fue recibida; su stock ya está en el inventario.")
+        super().perform_destroy(instance)
+
+    # -------------------------
+    # Endpoint adicional: /api/purchases/{id}/receive/
+    # -------------------------
+    @action(detail=True, methods=['post'], url_path='receive', permission_classes=[IsManagerOrAbove])
+    def receive(self, request, pk=None):
+        """
+        Recibe la compra en una sucursal: suma el stock y recalcula el costo
+        promedio ponderado de los productos. POST /api/purchases/{id}/receive/  {"branch": 1}
+        """
+        serializer = PurchaseReceiveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.check_tenant_objects(serializer.validated_data)
+        purchase = receive_purchase(self.get_object(), serializer.validated_data['branch'], user=request.user)
+        return Response(self.get_serializer(purchase).data)
+
+    # -------------------------
+    # Endpoint adicional: /api/purchases/export/
+    # -------------------------
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        """
+        Exporta las líneas de compra en streaming (memoria constante).
+        GET /api/purchases/export/?output=csv|ndjson&supplier=<id>&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD
+        Con ?background=1 responde 202 y el archivo se genera como trabajo (/api/jobs/).
+        """
+        if request.query_params.get('background'):
+            return background_response(request, self, 'export_purchases', request.query_params.dict())
+        output, lower, upper = export_params(request)
+        supplier = parse_id_param(request.query_params.get('supplier'), 'supplier')
+        lines = filter_export_lines(
+            self.filter_tenant(PurchaseLine.objects.all()), lower, upper, purchase__supplier_id=supplier,
+        )
+        return export_response(lines, PURCHASE_COLUMNS, output, 'compras')
+
+
+# -----------------------------
+# REPORTES
+# -----------------------------
+class ReportViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    """
+    Reportes de gestión. Se responden desde DailySalesRollup, así que el
+    costo depende de la cantidad de días (y productos) del rango y no de la
+    cantidad de ventas.
+    """
+    permission_classes = [IsManagerOrAbove]
+    replica_actions = ('sales',)
+
+    GROUP_FIELDS = {
+        'day': ['day'],
+        'branch': ['branch_id', 'branch__name'],
+        'product': ['product_id', 'product__sku', 'product__name'],
+    }
+    DEFAULT_RANGE_DAYS = 30
+
+    @action(detail=False, methods=['get'], url_path='sales')
+    def sales(self, request):
+        """
+        GET /api/reports/sales/?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD&group_by=day,branch,product
+        Filtros opcionales: branch, product.
+        """
+        date_to = parse_date_param(request.query_params.get('date_to'), 'date_to') or timezone.localdate()
+        date_from = parse_date_param(request.query_params.get('date_from'), 'date_from') or (
+            date_to - timedelta(days=self.DEFAULT_RANGE_DAYS - 1)
+        )
+        if date_from > date_to:
+            raise ValidationError({'date_from': ["Debe ser anterior o igual a date_to."]})
+
+        group_by = [g for g in request.query_params.get('group_by', 'day').split(',') if g]
+        invalid = [g for g in group_by if g not in self.GROUP_FIELDS]
+        if invalid:
+            raise ValidationError({'group_by': [f"Valores permitidos: {', '.join(self.GROUP_FIELDS)}."]})
+
+        qs = DailySalesRollup.objects.filter(day__gte=date_from, day__lte=date_to)
+        if not is_super_admin(request.user):
+            qs = qs.filter(branch__company_id=request.user.company_id)
+        for param in ('branch', 'product'):
+            value = parse_id_param(request.query_params.get(param), param)
+            if value:
+                qs = qs.filter(**{f'{param}_id': value})
+
+        fields = [f for g in group_by for f in self.GROUP_FIELDS[g]]
+        rows = (
+            qs.values(*fields)
+            .annotate(units=Sum('units'), revenue=Sum('revenue'), cost=Sum('cost'))
+            .order_by(*fields)
+        )
+        results = []
+        for row in rows:
+            row['margin'] = row['revenue'] - row['cost']
+            for key in ('revenue', 'cost', 'margin'):
+                row[key] = str(row[key].quantize(Decimal('0.01')))
+            results.append({key.replace('__', '_'): value for key, value in row.items()})
+        return Response({
+            'date_from': date_from,
+            'date_to': date_to,
+            'group_by': group_by,
+            'results': results,
+        })
+
+
+# -----------------------------
+# TRABAJOS EN SEGUNDO PLANO
+# -----------------------------
+class JobViewSet(TenantScopedMixin, viewsets.ModelViewSet):
+    """
+    Trabajos que ejecuta manage.py run_workers (ver jobs.py).
+    POST /api/jobs/  {"kind": "export_sales", "params": {"output": "csv", "date_from": "2024-05-01"}}
+    El avance se consulta con GET /api/jobs/{id}/ (status, progress, progress_message).
+    """
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [IsManagerOrAbove]
+    pagination_class = JobCursorPagination
+    http_method_names = ['get', 'post', 'head', 'options']
+    bulk_actions = ('create',)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = submit_job(request, serializer.validated_data['kind'], serializer.validated_data['params'], view=self)
+        return Response(self.get_serializer(job).data, status=status.HTTP_201_CREATED)
+
+    # -------------------------
+    # Endpoint adicional: /api/jobs/{id}/cancel/
+    # -------------------------
+    @action(detail=True, methods=['post'], url_path='cancel')
+    def cancel(self, request, pk=None):
+        """Cancela un trabajo en cola, o pide detener uno en ejecución."""
+        return Response(self.get_serializer(cancel_job(self.get_object())).data)
+
+    # -------------------------
+    # Endpoint adicional: /api/jobs/{id}/result/
+    # -------------------------
+    @action(detail=True, methods=['get'], url_path='result')
+    def result(self, request, pk=None):
+        """Descarga el archivo generado por el trabajo o, si no generó uno, su resultado en JSON."""
+        job = self.get_object()
+        if job.status != 'succeeded':
+            return Response({'detail': f"El trabajo no terminó con éxito (status: {job.status})."},
+                            status=status.HTTP_409_CONFLICT)
+        if not job.result_file:
+            return Response(job.result)
+        path = os.path.join(settings.JOB_FILES_DIR, job.result_file)
+        if not os.path.exists(path):
+            return Response({'detail': "El archivo del resultado ya no existe."}, status=status.HTTP_410_GONE)
+        filename = (job.result or {}).get('filename') or job.result_file
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
+
+
+# -----------------------------
+# MÉTRICAS
+# -----------------------------
+class MetricsView(APIView):
+    """
+    GET /api/_metrics/ — histogramas de MetricsMiddleware en formato de texto
+    de Prometheus. Son del proceso que atiende el request.
+    """
+    permission_classes = [IsSuperAdmin]
+
+    def get(self, request):
+        return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')